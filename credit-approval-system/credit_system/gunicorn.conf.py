@@ -0,0 +1,43 @@
+"""
+Gunicorn settings for serving credit_system.wsgi in production.
+
+    gunicorn -c credit_system/gunicorn.conf.py credit_system.wsgi
+
+Send SIGHUP to the master for a graceful reload: new workers import the
+current code and start before old ones finish their in-flight requests. Run
+migrations as a separate one-shot step, never from here.
+"""
+import multiprocessing
+# Gunicorn reads every module-level name as a setting, and 'config' is one
+from decouple import config as env
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{env('PORT', default=8000, cast=int)}"
+
+# Prefork workers, each with enough threads that requests waiting on
+# Postgres don't idle a whole process and each admission class gets a
+# budget of its own. cpu_count() sees the host's CPUs, not
+# the container's share, so the default is capped; set WEB_CONCURRENCY to
+# size larger containers. Admission budgets are derived from GUNICORN_THREADS
+# in credit_system/settings.py, which reads the same variable and default
+worker_class = 'gthread'
+workers = env('WEB_CONCURRENCY', default=min(cpu_count + 1, 4), cast=int)
+threads = env('GUNICORN_THREADS', default=8, cast=int)
+
+# Not preloaded: each worker imports the app itself, so a SIGHUP reload
+# picks up new code (a preloaded master would fork workers from the old code)
+preload_app = False
+
+# Recycle workers periodically to bound memory growth; jitter avoids all
+# workers restarting at the same time
+max_requests = env('GUNICORN_MAX_REQUESTS', default=2000, cast=int)
+max_requests_jitter = env('GUNICORN_MAX_REQUESTS_JITTER', default=200, cast=int)
+
+timeout = env('GUNICORN_TIMEOUT', default=30, cast=int)
+graceful_timeout = env('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = env('GUNICORN_LOG_LEVEL', default='info')
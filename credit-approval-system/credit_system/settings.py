@@ -28,8 +28,11 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'loans.middleware.AdmissionControlMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Last, as it calls the view itself when profiling a request
+    'loans.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'credit_system.urls'
@@ -55,7 +58,7 @@ WSGI_APPLICATION = 'credit_system.wsgi.application'
 # Database
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': config('DB_ENGINE', default='django.db.backends.postgresql'),
         'NAME': config('DB_NAME', default='credit_approval'),
         'USER': config('DB_USER', default='postgres'),
         'PASSWORD': config('DB_PASSWORD', default='password'),
@@ -64,17 +67,197 @@ DATABASES = {
     }
 }
 
-# Redis and RQ
-RQ_QUEUES = {
+# Read replica (optional): enabled when DB_REPLICA_HOST or DB_REPLICA_NAME is set
+REPLICA_DATABASE_ALIAS = 'replica'
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+DB_REPLICA_NAME = config('DB_REPLICA_NAME', default='')
+if DB_REPLICA_HOST or DB_REPLICA_NAME:
+    DATABASES[REPLICA_DATABASE_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_NAME or DATABASES['default']['NAME'],
+        'HOST': DB_REPLICA_HOST or DATABASES['default']['HOST'],
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Sharding (optional): enabled when DB_SHARD_NAMES is set. Customers, their
+# loans and every other loans table are spread over shard_0..shard_N-1 by
+# customer_id; auth, sessions and admin stay on 'default'. Shards use the
+# primary's engine and credentials; DB_SHARD_HOSTS optionally places each on
+# its own server. The shard count can't change once data is written. Run
+# `manage.py migrate_shards`, not `migrate`, to create the tables on every shard
+DB_SHARD_NAMES = config(
+    'DB_SHARD_NAMES', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]
+)
+DB_SHARD_HOSTS = config(
+    'DB_SHARD_HOSTS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]
+)
+SHARD_DATABASE_ALIASES = [f'shard_{index}' for index in range(len(DB_SHARD_NAMES))]
+for index, alias in enumerate(SHARD_DATABASE_ALIASES):
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': DB_SHARD_NAMES[index],
+        'HOST': DB_SHARD_HOSTS[index] if index < len(DB_SHARD_HOSTS) else DATABASES['default']['HOST'],
+    }
+# IDs each process reserves at a time from a shard's ID sequence
+SHARD_ID_BLOCK_SIZE = config('SHARD_ID_BLOCK_SIZE', default=100, cast=int)
+
+DATABASE_ROUTERS = ['loans.routers.PrimaryReplicaRouter']
+if SHARD_DATABASE_ALIASES:
+    DATABASE_ROUTERS.insert(0, 'loans.sharding.ShardRouter')
+
+# Seconds a customer's reads stay on the primary after one of their writes
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+# Seconds the next incremental export's watermark is set back, so rows written
+# by transactions still open when the snapshot started are exported again
+# rather than skipped (consumers upsert on the primary key)
+EXPORT_WATERMARK_SAFETY_SECONDS = config('EXPORT_WATERMARK_SAFETY_SECONDS', default=300, cast=int)
+
+# Seconds rendered view_loan/view_customer_loans bodies are shared through the
+# cache, keyed by ETag (0 disables it; conditional GET works either way)
+RESPONSE_CACHE_SECONDS = config('RESPONSE_CACHE_SECONDS', default=0, cast=int)
+
+# Cache (shared through Redis by default so replica stickiness holds across workers)
+CACHES = {
     'default': {
-        'HOST': config('REDIS_HOST', default='redis'),
-        'PORT': config('REDIS_PORT', default=6379),
-        'DB': 0,
-        'PASSWORD': '',
-        'DEFAULT_TIMEOUT': 360,
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config(
+            'CACHE_LOCATION',
+            default=f"redis://{config('REDIS_HOST', default='redis')}:{config('REDIS_PORT', default=6379)}/1"
+        ),
+    }
+}
+
+# Redis and RQ. Tasks are routed to a queue by loans/queues.py: 'high' for
+# jobs a client waits on, 'default' for maintenance, 'bulk' for file loads
+# and long scans; each queue has its own job timeout (seconds)
+RQ_CONNECTION = {
+    'HOST': config('REDIS_HOST', default='redis'),
+    'PORT': config('REDIS_PORT', default=6379),
+    'DB': 0,
+    'PASSWORD': '',
+}
+RQ_QUEUES = {
+    'high': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': config('RQ_HIGH_TIMEOUT', default=120, cast=int)},
+    'default': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': config('RQ_DEFAULT_TIMEOUT', default=600, cast=int)},
+    'bulk': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': config('RQ_BULK_TIMEOUT', default=3600, cast=int)},
+}
+
+# Worker processes started by `manage.py run_workers` (0: one per CPU), and
+# how many of them also take bulk jobs (0: a quarter, at least one)
+RQ_WORKER_PROCESSES = config('RQ_WORKER_PROCESSES', default=0, cast=int)
+RQ_BULK_WORKERS = config('RQ_BULK_WORKERS', default=0, cast=int)
+# Excel rows per ingestion job, so bulk workers return to the queues between chunks
+INGESTION_CHUNK_SIZE = config('INGESTION_CHUNK_SIZE', default=2000, cast=int)
+
+# Threads per gunicorn worker; must match credit_system/gunicorn.conf.py.
+# Below about 8 the admission budgets round to the same few slots
+GUNICORN_THREADS = config('GUNICORN_THREADS', default=8, cast=int)
+
+
+def admission_concurrency(share):
+    """
+    Concurrency budget for a share of a worker's threads, kept below the
+    thread count so a saturated class queues in the limiter and is shed
+    instead of queueing unseen in gunicorn
+    """
+    return max(1, min(GUNICORN_THREADS - 1, int(GUNICORN_THREADS * share)))
+
+
+# Admission control for the decision endpoints: per-client token buckets
+# (RATE tokens/second up to BURST) and per-worker-process concurrency budgets.
+# Requests that wait longer than QUEUE_TIMEOUT_MS for a slot get a 503
+ADMISSION_CONTROL = {
+    'ENABLED': config('ADMISSION_CONTROL_ENABLED', default=True, cast=bool),
+    'QUEUE_TIMEOUT_MS': config('ADMISSION_QUEUE_TIMEOUT_MS', default=250, cast=int),
+    'RATE_LIMIT_BACKEND': config('RATE_LIMIT_BACKEND', default='local'),  # 'local' or 'redis'
+    'REDIS_URL': config(
+        'RATE_LIMIT_REDIS_URL',
+        default=f"redis://{config('REDIS_HOST', default='redis')}:{config('REDIS_PORT', default=6379)}/2"
+    ),
+    # Header carrying the client address when behind a proxy, e.g. 'HTTP_X_FORWARDED_FOR',
+    # and how many proxies append to it: the client is that many entries from
+    # the right, as anything further left was sent by the client itself
+    'CLIENT_IP_HEADER': config('ADMISSION_CLIENT_IP_HEADER', default=''),
+    'TRUSTED_PROXIES': config('ADMISSION_TRUSTED_PROXIES', default=1, cast=int),
+    'BUDGETS': {
+        'read': {'CONCURRENCY': admission_concurrency(0.75), 'RATE': 50, 'BURST': 100},
+        'eligibility': {'CONCURRENCY': admission_concurrency(0.5), 'RATE': 10, 'BURST': 20},
+        'create': {'CONCURRENCY': admission_concurrency(0.25), 'RATE': 2, 'BURST': 5},
+        # /create-loan/?async=1: one INSERT and an enqueue per request
+        'submit': {'CONCURRENCY': admission_concurrency(0.375), 'RATE': 20, 'BURST': 50},
     },
 }
 
+# On-demand request profiling; see loans/middleware.py ProfilingMiddleware
+PROFILING = {
+    'ENABLED': config('PROFILING_ENABLED', default=False, cast=bool),
+    # URL names to sample, e.g. 'check_eligibility,create_loan'
+    'ENDPOINTS': config(
+        'PROFILING_ENDPOINTS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]
+    ),
+    'SAMPLE_RATE': config('PROFILING_SAMPLE_RATE', default=0.01, cast=float),
+    'MODE': config('PROFILING_MODE', default='cprofile'),  # 'cprofile' (pstats) or 'sampling' (collapsed stacks)
+    'SAMPLE_INTERVAL_MS': config('PROFILING_SAMPLE_INTERVAL_MS', default=5, cast=float),
+    'OUTPUT_DIR': config('PROFILING_OUTPUT_DIR', default='profiles'),
+    'DUMP_EVERY': config('PROFILING_DUMP_EVERY', default=50, cast=int),
+    # Lifetime of X-Profile-Token headers made with `manage.py profile_token`
+    'TOKEN_MAX_AGE': config('PROFILING_TOKEN_MAX_AGE', default=3600, cast=int),
+}
+
+# Asynchronous loan applications (POST /create-loan/?async=1)
+LOAN_APPLICATION_BATCH_SIZE = config('LOAN_APPLICATION_BATCH_SIZE', default=200, cast=int)
+# Applications stuck in processing this long (e.g. after a worker crash) are retried
+LOAN_APPLICATION_STALE_SECONDS = config('LOAN_APPLICATION_STALE_SECONDS', default=600, cast=int)
+# Pending applications this old get a new job from `requeue_loan_applications`
+# (their enqueue failed or the job was lost)
+LOAN_APPLICATION_REQUEUE_SECONDS = config('LOAN_APPLICATION_REQUEUE_SECONDS', default=60, cast=int)
+LOAN_CALLBACK_ALLOWED_HOSTS = config(
+    'LOAN_CALLBACK_ALLOWED_HOSTS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]
+)
+LOAN_CALLBACK_TIMEOUT = config('LOAN_CALLBACK_TIMEOUT', default=5, cast=int)
+
+# Credit score history: every decision's score is buffered in memory and
+# bulk inserted by a background thread (0 seconds writes synchronously)
+SCORE_HISTORY_ENABLED = config('SCORE_HISTORY_ENABLED', default=True, cast=bool)
+SCORE_HISTORY_BATCH_SIZE = config('SCORE_HISTORY_BATCH_SIZE', default=500, cast=int)
+SCORE_HISTORY_FLUSH_SECONDS = config('SCORE_HISTORY_FLUSH_SECONDS', default=2.0, cast=float)
+
+# Decision audit log: every eligibility decision, buffered and bulk inserted
+# the same way (0 seconds writes synchronously). On Postgres the table is
+# partitioned by month; create_audit_partitions makes this many months ahead
+DECISION_AUDIT_BATCH_SIZE = config('DECISION_AUDIT_BATCH_SIZE', default=500, cast=int)
+DECISION_AUDIT_FLUSH_SECONDS = config('DECISION_AUDIT_FLUSH_SECONDS', default=2.0, cast=float)
+DECISION_AUDIT_PARTITION_MONTHS_AHEAD = config('DECISION_AUDIT_PARTITION_MONTHS_AHEAD', default=3, cast=int)
+
+# EMI repayment feed: events applied per transaction, largest JSON upload to
+# POST /repayments/, and how long event IDs are kept to detect replays
+REPAYMENT_BATCH_SIZE = config('REPAYMENT_BATCH_SIZE', default=50000, cast=int)
+REPAYMENT_MAX_REQUEST_EVENTS = config('REPAYMENT_MAX_REQUEST_EVENTS', default=10000, cast=int)
+REPAYMENT_EVENT_RETENTION_DAYS = config('REPAYMENT_EVENT_RETENTION_DAYS', default=90, cast=int)
+
+# Payroll salary refresh: customers updated per transaction, and the most
+# rows one JSON request may carry (larger refreshes are posted as CSV)
+SALARY_REFRESH_BATCH_SIZE = config('SALARY_REFRESH_BATCH_SIZE', default=10000, cast=int)
+SALARY_REFRESH_MAX_REQUEST_ROWS = config('SALARY_REFRESH_MAX_REQUEST_ROWS', default=10000, cast=int)
+
+# Pre-approved offers: the standard tenures (months) an offer is computed
+# for, the annual rate before the score-based floors, and customers per
+# write in the batch refresh
+OFFER_TENURES = config('OFFER_TENURES', default='12,24,36,60', cast=lambda v: [int(s) for s in v.split(',') if s.strip()])
+OFFER_BASE_INTEREST_RATE = config('OFFER_BASE_INTEREST_RATE', default='10.00')
+OFFER_REFRESH_BATCH_SIZE = config('OFFER_REFRESH_BATCH_SIZE', default=5000, cast=int)
+
+# Most IDs accepted by /view-loans/bulk/ and /customers/bulk/ in one request
+BULK_LOOKUP_MAX_IDS = config('BULK_LOOKUP_MAX_IDS', default=1000, cast=int)
+
+# Seconds /portfolio/stats/ responses are shared through the cache
+PORTFOLIO_STATS_CACHE_SECONDS = config('PORTFOLIO_STATS_CACHE_SECONDS', default=5, cast=int)
+# Rows each portfolio counter is striped over; each worker thread writes one
+# of them, so loan writes only contend with threads sharing its slot
+PORTFOLIO_COUNTER_STRIPES = config('PORTFOLIO_COUNTER_STRIPES', default=16, cast=int)
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -87,14 +270,19 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# REST Framework
+# REST Framework. JSON stays the default; partners can negotiate MessagePack
+# (see loans/renderers.py for how Decimals are encoded)
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'loans.renderers.JSONRenderer',
+        'loans.renderers.MessagePackRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
+        'loans.parsers.MessagePackParser',
     ],
+    # Serializers hand Decimals to the renderer, which picks their encoding
+    'COERCE_DECIMAL_TO_STRING': False,
 }
 
 # Security Settings
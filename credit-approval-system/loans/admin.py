@@ -1,14 +1,137 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from .models import Customer, Loan
+from .portfolio import close_loans
+from .sharding import find_shard, on_shard, shard_aliases, sharding_enabled
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the Postgres planner estimate (pg_class.reltuples)
+    instead of COUNT(*) for unfiltered changelists on large tables
+    """
+    # Below this many rows an exact count is cheap enough to keep
+    ESTIMATE_THRESHOLD = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                        [queryset.model._meta.db_table]
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= self.ESTIMATE_THRESHOLD:
+                    return row[0]
+        return super().count
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """
+    Shard a changelist shows, the first one unless picked; the querysets are
+    bound to it by ShardedModelAdmin
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shard_aliases()]
+
+    def choices(self, changelist):
+        selected = self.value() or shard_aliases()[0]
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == selected,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset
+
+
+class ShardedModelAdmin(admin.ModelAdmin):
+    """
+    Runs every admin page on a single shard: the one picked in the
+    changelist's shard filter, or the shard holding an object on its own
+    pages. Without sharding this is a plain ModelAdmin
+    """
+
+    def get_shard(self, request):
+        if not sharding_enabled():
+            return None
+        alias = request.GET.get(ShardListFilter.parameter_name)
+        if alias in shard_aliases():
+            return alias
+        object_id = request.resolver_match.kwargs.get('object_id') if request.resolver_match else None
+        if object_id and object_id.isdigit():
+            # Looked up once per request: loans loaded before sharding may be off their home shard
+            if not hasattr(request, '_admin_shard'):
+                request._admin_shard = find_shard(self.model, object_id)
+            return request._admin_shard
+        return shard_aliases()[0]
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        return [ShardListFilter, *list_filter] if sharding_enabled() else list_filter
+
+    def get_queryset(self, request):
+        # Bound now, as changelists are evaluated when the template renders
+        return super().get_queryset(request).using(self.get_shard(request))
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        return super().formfield_for_foreignkey(db_field, request, using=self.get_shard(request), **kwargs)
+
+    def changelist_view(self, request, extra_context=None):
+        with on_shard(self.get_shard(request)):
+            return super().changelist_view(request, extra_context)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        with on_shard(self.get_shard(request)):
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        with on_shard(self.get_shard(request)):
+            return super().delete_view(request, object_id, extra_context)
+
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
-    list_display = ['customer_id', 'first_name', 'last_name', 'monthly_salary', 'approved_limit']
-    search_fields = ['first_name', 'last_name', 'phone_number']
-    list_filter = ['created_at']
+class CustomerAdmin(ShardedModelAdmin):
+    list_display = ['customer_id', 'first_name', 'last_name', 'monthly_salary', 'approved_limit', 'over_limit']
+    # Exact/prefix lookups only, so searches hit indexes instead of '%term%' scans
+    search_fields = ['=customer_id', '=phone_number', '^last_name', '^first_name']
+    list_filter = ['over_limit', 'created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 @admin.register(Loan)
-class LoanAdmin(admin.ModelAdmin):
+class LoanAdmin(ShardedModelAdmin):
     list_display = ['loan_id', 'customer', 'loan_amount', 'interest_rate', 'tenure', 'is_active']
+    list_select_related = ['customer']
     list_filter = ['is_active', 'start_date']
-    search_fields = ['customer__first_name', 'customer__last_name']
\ No newline at end of file
+    search_fields = ['=loan_id', '=customer__customer_id', '^customer__last_name']
+    raw_id_fields = ['customer']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['deactivate_loans']
+
+    def get_queryset(self, request):
+        # The change page title shows the customer's name (Loan.__str__)
+        return super().get_queryset(request).select_related('customer')
+
+    @admin.action(description='Deactivate selected loans')
+    def deactivate_loans(self, request, queryset):
+        """
+        Deactivate the selected loans in batches, keeping the portfolio
+        counters in step
+        """
+        updated = close_loans(queryset)
+        self.message_user(request, f"{updated} loan(s) deactivated", messages.SUCCESS)
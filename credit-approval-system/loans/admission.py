@@ -0,0 +1,194 @@
+import math
+import threading
+import time
+from django.conf import settings
+
+# URL names of the endpoints under admission control and the budget they draw from
+ADMISSION_CLASSES = {
+    'view_loan': 'read',
+    'view_customer_loans': 'read',
+    'bulk_view_loans': 'read',
+    'bulk_view_customers': 'read',
+    'view_offers': 'read',
+    'portfolio_stats': 'read',
+    'check_eligibility': 'eligibility',
+    'create_loan': 'create',
+}
+# Budgets of endpoints called with ?async=1, which only store and enqueue the
+# work instead of doing it in the request
+ASYNC_ADMISSION_CLASSES = {
+    'create_loan': 'submit',
+}
+
+
+def admission_class(request):
+    """
+    Name of the budget a resolved request draws from, or None if it is not
+    under admission control
+    """
+    url_name = request.resolver_match.url_name
+    if request.GET.get('async') == '1' and url_name in ASYNC_ADMISSION_CLASSES:
+        return ASYNC_ADMISSION_CLASSES[url_name]
+    return ADMISSION_CLASSES.get(url_name)
+
+
+class ConcurrencyLimiter:
+    """
+    Bounded in-flight counter for one worker process. Callers wait up to a
+    timeout for a slot; the number waiting is the queue depth
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        return False
+                    self._condition.wait(remaining)
+                self.in_flight += 1
+                self.admitted += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def stats(self):
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'queue_depth': self.waiting,
+            'admitted': self.admitted,
+            'shed_overload': self.shed,
+        }
+
+
+class LocalTokenBuckets:
+    """
+    Per-client token buckets held in this process's memory
+    """
+    MAX_CLIENTS = 100000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """
+        Take one token; returns (allowed, seconds until a token is available)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if len(self._buckets) >= self.MAX_CLIENTS and key not in self._buckets:
+                self._prune(now)
+            self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def _prune(self, now):
+        # Drop buckets idle long enough to have refilled completely
+        for key, (tokens, updated) in list(self._buckets.items()):
+            if now - updated > 60:
+                del self._buckets[key]
+
+
+class RedisTokenBuckets:
+    """
+    Per-client token buckets shared by every worker through Redis
+    """
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self):
+        import redis
+
+        self._redis = redis.Redis.from_url(settings.ADMISSION_CONTROL['REDIS_URL'])
+        self._script = self._redis.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, tokens = self._script(keys=[f"loans:rate:{key}"], args=[rate, burst, time.time()])
+        tokens = float(tokens)
+        return bool(allowed), 0 if allowed else (1 - tokens) / rate
+
+
+class AdmissionController:
+    """
+    Applies the per-client rate limit and then the per-class concurrency
+    budget configured in settings.ADMISSION_CONTROL
+    """
+
+    def __init__(self, config):
+        self.queue_timeout = config['QUEUE_TIMEOUT_MS'] / 1000
+        self.budgets = config['BUDGETS']
+        self.limiters = {
+            name: ConcurrencyLimiter(budget['CONCURRENCY']) for name, budget in self.budgets.items()
+        }
+        self.rate_limited = {name: 0 for name in self.budgets}
+        if config['RATE_LIMIT_BACKEND'] == 'redis':
+            self.buckets = RedisTokenBuckets()
+        else:
+            self.buckets = LocalTokenBuckets()
+
+    def check_rate(self, budget_name, client):
+        """
+        Returns None if the client may proceed, else the Retry-After seconds
+        """
+        budget = self.budgets[budget_name]
+        allowed, wait = self.buckets.take(f"{budget_name}:{client}", budget['RATE'], budget['BURST'])
+        if allowed:
+            return None
+        self.rate_limited[budget_name] += 1
+        return max(1, math.ceil(wait))
+
+    def stats(self):
+        return {
+            name: {**limiter.stats(), 'shed_rate_limited': self.rate_limited[name]}
+            for name, limiter in self.limiters.items()
+        }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(settings.ADMISSION_CONTROL)
+    return _controller
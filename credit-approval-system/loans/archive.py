@@ -0,0 +1,88 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
+from .models import Customer, Loan, ArchivedLoan
+from .sharding import db_alias, on_shard, shard_aliases
+
+ARCHIVE_FIELDS = [
+    'loan_id', 'customer_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment',
+    'emis_paid_on_time', 'start_date', 'end_date', 'is_active', 'created_at', 'updated_at',
+]
+
+
+def archivable_loans(today=None):
+    """
+    Closed loans that started before the current year. Those no longer affect
+    the current-year activity factor, so once archived their contribution to
+    the credit score is fully captured by the customer's archived_* totals
+    """
+    today = today or date.today()
+    return Loan.objects.filter(is_active=False, start_date__lt=date(today.year, 1, 1))
+
+
+def archive_loan_batch(batch_size=5000, today=None):
+    """
+    Move up to batch_size archivable loans to the archive table and fold them
+    into their customers' archived_* totals, all in one transaction.
+    Returns the number of loans moved
+    """
+    with transaction.atomic(using=db_alias()):
+        rows = list(
+            archivable_loans(today).select_for_update(skip_locked=True)
+            .order_by('loan_id').values(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        # A loan_id already in the archive aborts the batch rather than folding
+        # and deleting a loan that was never copied
+        ArchivedLoan.objects.bulk_create([ArchivedLoan(**row) for row in rows])
+
+        totals = defaultdict(lambda: [0, Decimal(0), 0, 0])
+        for row in rows:
+            customer_totals = totals[row['customer_id']]
+            customer_totals[0] += 1
+            customer_totals[1] += row['loan_amount']
+            customer_totals[2] += row['tenure']
+            customer_totals[3] += row['emis_paid_on_time']
+
+        customers = list(
+            Customer.objects.select_for_update().filter(customer_id__in=totals.keys())
+            .only('customer_id', 'archived_loan_count', 'archived_loan_volume',
+                  'archived_tenure_total', 'archived_emis_paid_on_time')
+        )
+        for customer in customers:
+            count, volume, tenure_total, paid_on_time = totals[customer.customer_id]
+            customer.archived_loan_count += count
+            customer.archived_loan_volume += volume
+            customer.archived_tenure_total += tenure_total
+            customer.archived_emis_paid_on_time += paid_on_time
+        Customer.objects.bulk_update(customers, [
+            'archived_loan_count', 'archived_loan_volume', 'archived_tenure_total',
+            'archived_emis_paid_on_time',
+        ])
+
+        # Raw delete: nothing references loans with a database constraint except
+        # the archive's own rows, which were just copied
+        Loan.objects.filter(loan_id__in=[row['loan_id'] for row in rows])._raw_delete(db_alias())
+    return len(rows)
+
+
+def archive_closed_loans(batch_size=5000, max_batches=None, today=None):
+    """
+    Background task archiving closed loans batch by batch until none are
+    left, one shard after another
+    """
+    moved = 0
+    batches = 0
+    for alias in shard_aliases():
+        with on_shard(alias):
+            while max_batches is None or batches < max_batches:
+                count = archive_loan_batch(batch_size, today=today)
+                if not count:
+                    break
+                moved += count
+                batches += 1
+    return f"Archived {moved} loans"
@@ -0,0 +1,127 @@
+from datetime import datetime, timezone as dt_timezone
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .buffering import BufferedWriter
+from .models import DecisionAuditRecord
+from .money import (
+    MIN_APPROVAL_SCORE, EMI_CAP_PERCENT, RATE_FLOOR_SCORE_ABOVE_30, RATE_FLOOR_SCORE_ABOVE_10,
+    from_basis_points
+)
+from .sharding import shard_aliases
+
+AUDIT_TABLE = DecisionAuditRecord._meta.db_table
+# Catches rows for months without a partition of their own
+DEFAULT_PARTITION = f'{AUDIT_TABLE}_default'
+
+# Thresholds decide_loan() applies, stored with every record
+RULE_THRESHOLDS = {
+    'min_approval_score': MIN_APPROVAL_SCORE,
+    'emi_cap_percent': EMI_CAP_PERCENT,
+    'rate_floor_score_above_30': from_basis_points(RATE_FLOOR_SCORE_ABOVE_30),
+    'rate_floor_score_above_10': from_basis_points(RATE_FLOOR_SCORE_ABOVE_10),
+}
+
+_writer = None
+
+
+def get_decision_audit_writer():
+    global _writer
+    if _writer is None:
+        _writer = BufferedWriter(
+            DecisionAuditRecord,
+            max_batch=settings.DECISION_AUDIT_BATCH_SIZE,
+            flush_interval=settings.DECISION_AUDIT_FLUSH_SECONDS
+        )
+    return _writer
+
+
+def record_decision(source, customer_id, loan_amount, interest_rate, tenure, result, message=None, loan_id=None):
+    """
+    Queue an audit record of a check_loan_eligibility() / decide_loan()
+    result, on the shard selected now. message overrides the result's, e.g.
+    once the loan is created; the INSERT happens in batches off the request
+    thread
+    """
+    credit_score = result.get('credit_score')
+    get_decision_audit_writer().add(DecisionAuditRecord(
+        decided_at=timezone.now(),
+        source=source,
+        customer_id=customer_id,
+        loan_amount=loan_amount,
+        interest_rate=interest_rate,
+        tenure=tenure,
+        credit_score=float(credit_score) if credit_score is not None else None,
+        corrected_interest_rate=result['corrected_interest_rate'],
+        monthly_installment=result['monthly_installment'],
+        approved=result['approval'],
+        message=message or result['message'],
+        loan_id=loan_id,
+        **RULE_THRESHOLDS
+    ))
+
+
+def _month_partitions(months_ahead, now):
+    first = now.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for offset in range(months_ahead + 1):
+        start = first + relativedelta(months=offset)
+        yield f'{AUDIT_TABLE}_{start:%Y_%m}', start, start + relativedelta(months=1)
+
+
+def _existing_partitions(cursor):
+    cursor.execute(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'WHERE parent.relname = %s',
+        [AUDIT_TABLE]
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_audit_partitions(months_ahead=None, now=None):
+    """
+    Create the monthly partitions of the audit table from the current month
+    to months_ahead months out, on every database (shard) that is Postgres;
+    elsewhere the table is not partitioned. Rows the default partition
+    already caught for a new month are moved into it, with audit inserts
+    waiting until it is attached. Returns the names of the partitions created
+    """
+    if months_ahead is None:
+        months_ahead = settings.DECISION_AUDIT_PARTITION_MONTHS_AHEAD
+    now = now or datetime.now(dt_timezone.utc)
+    created = []
+    for alias in shard_aliases():
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            continue
+        with connection.cursor() as cursor:
+            existing = _existing_partitions(cursor)
+        for name, start, end in _month_partitions(months_ahead, now):
+            if name in existing:
+                continue
+            bounds = [start, end]
+            with transaction.atomic(using=alias), connection.cursor() as cursor:
+                # Held until commit, so no insert lands a row for this month in
+                # the default partition between the move and the ATTACH (which
+                # would then fail its scan). ATTACH takes this lock anyway;
+                # taking it first avoids upgrading a weaker one
+                cursor.execute(f'LOCK TABLE "{DEFAULT_PARTITION}" IN ACCESS EXCLUSIVE MODE')
+                cursor.execute(
+                    f'CREATE TABLE "{name}" (LIKE "{AUDIT_TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+                )
+                cursor.execute(
+                    f'INSERT INTO "{name}" SELECT * FROM "{DEFAULT_PARTITION}" '
+                    f'WHERE "decided_at" >= %s AND "decided_at" < %s', bounds
+                )
+                cursor.execute(
+                    f'DELETE FROM "{DEFAULT_PARTITION}" WHERE "decided_at" >= %s AND "decided_at" < %s', bounds
+                )
+                # Bounds are our own timestamps, not user input
+                cursor.execute(
+                    f'ALTER TABLE "{AUDIT_TABLE}" ATTACH PARTITION "{name}" '
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                )
+            created.append(name if alias == 'default' else f'{alias}.{name}')
+    return created
@@ -0,0 +1,99 @@
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+from django.db import close_old_connections
+from .sharding import db_alias
+
+
+class BufferedWriter:
+    """
+    Collects unsaved model instances in memory and writes them with
+    bulk_create from a background thread, once max_batch rows are waiting or
+    every flush_interval seconds, so request threads never wait on the INSERT.
+    Whatever is still buffered is flushed when the process exits. A
+    flush_interval of 0 writes each row immediately on the caller's thread.
+    Rows are written to the database (shard) selected when they were added
+    """
+
+    def __init__(self, model, max_batch=500, flush_interval=2.0, max_buffer=100000):
+        self.model = model
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        # Past this, new rows are dropped rather than growing memory without bound
+        self.max_buffer = max_buffer
+        self.written = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._buffer = []
+        self._pid = None
+        self._thread = None
+        atexit.register(self.flush)
+
+    def add(self, instance, using=None):
+        entry = (using or db_alias(), instance)
+        if self.flush_interval <= 0:
+            with self._lock:
+                self._buffer.append(entry)
+            self.flush()
+            return
+        with self._lock:
+            self._ensure_thread()
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return
+            self._buffer.append(entry)
+            if len(self._buffer) >= self.max_batch:
+                self._wakeup.set()
+
+    def pending(self):
+        return len(self._buffer)
+
+    def flush(self):
+        """
+        Write everything buffered so far; safe to call from any thread
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            by_alias = defaultdict(list)
+            for alias, instance in batch:
+                by_alias[alias].append(instance)
+            written = 0
+            # Counted per database, so one failing shard doesn't discount the others
+            for alias, instances in by_alias.items():
+                try:
+                    for start in range(0, len(instances), self.max_batch):
+                        self.model.objects.using(alias).bulk_create(instances[start:start + self.max_batch])
+                except Exception as e:
+                    logging.error(f"Failed to write {len(instances)} {self.model.__name__} rows to {alias}: {str(e)}")
+                    self.dropped += len(instances)
+                    continue
+                written += len(instances)
+            self.written += written
+            return written
+
+    def _ensure_thread(self):
+        # Threads don't survive fork (e.g. gunicorn preload), so start one per process
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            # Rows buffered in the parent are flushed by the parent
+            self._buffer = []
+        self._pid = os.getpid()
+        self._thread = threading.Thread(
+            target=self._run, name=f'{self.model.__name__}-writer', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            close_old_connections()
@@ -0,0 +1,145 @@
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.settings import api_settings
+from .models import Customer, Loan
+from .routers import is_customer_pinned, read_from_replica, replica_configured
+from .sharding import for_customer, on_shard, shard_for_id
+
+CACHED_ENDPOINTS = ('view_loan', 'view_customer_loans')
+STAT_NAMES = ('requests', 'not_modified', 'cache_hits')
+
+
+def _timestamp(value):
+    return int(value.timestamp() * 1000000) if value else 0
+
+
+def loan_version(loan_id):
+    """
+    (etag, last_modified) for a loan detail response, which embeds the
+    customer, or None if the loan does not exist (or is not on its ID's home
+    shard, in which case the view finds it)
+    """
+    version = Loan.objects.filter(loan_id=loan_id).values_list('updated_at', 'customer__updated_at', 'customer_id')
+    with on_shard(shard_for_id(loan_id)):
+        with read_from_replica():
+            row = version.first()
+        # The customer is only known once the loan is read: if they wrote
+        # recently (or the loan is new), the replica may still be behind
+        if replica_configured() and (row is None or is_customer_pinned(row[2])):
+            row = version.first()
+    if row is None:
+        return None
+    loan_updated, customer_updated, _ = row
+    etag = f'"loan-{loan_id}-{_timestamp(loan_updated)}-{_timestamp(customer_updated)}"'
+    return etag, max(loan_updated, customer_updated)
+
+
+def customer_loans_version(customer_id):
+    """
+    (etag, last_modified) for a customer's active loan list, or None if the
+    customer does not exist. Any loan write bumps a loan's updated_at, and
+    deactivations also change the active count
+    """
+    with for_customer(customer_id), read_from_replica(customer_id):
+        row = Customer.objects.filter(customer_id=customer_id).annotate(
+            last_loan_update=Max('loans__updated_at'),
+            active_loans=Count('loans', filter=Q(loans__is_active=True)),
+        ).values_list('updated_at', 'last_loan_update', 'active_loans').first()
+    if row is None:
+        return None
+    customer_updated, last_loan_update, active_loans = row
+    etag = (
+        f'"loans-{customer_id}-{_timestamp(customer_updated)}-'
+        f'{_timestamp(last_loan_update)}-{active_loans}"'
+    )
+    return etag, max(filter(None, [customer_updated, last_loan_update]))
+
+
+def _stat_key(endpoint, name):
+    return f"loans:response-stats:{endpoint}:{name}"
+
+
+def _incr(endpoint, name):
+    # One round trip, plus a second the first time a counter is used
+    key = _stat_key(endpoint, name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def response_cache_stats():
+    """
+    Per-endpoint conditional GET and response cache counters
+    """
+    stats = {}
+    for endpoint in CACHED_ENDPOINTS:
+        values = cache.get_many([_stat_key(endpoint, name) for name in STAT_NAMES])
+        counters = {name: values.get(_stat_key(endpoint, name), 0) for name in STAT_NAMES}
+        served = counters['not_modified'] + counters['cache_hits']
+        counters['hit_rate'] = round(served / counters['requests'], 4) if counters['requests'] else 0.0
+        stats[endpoint] = counters
+    return stats
+
+
+def conditional_response(version_func, endpoint):
+    """
+    Answer GETs with 304 Not Modified when the client's ETag/Last-Modified
+    still match version_func(), without running the view. When
+    RESPONSE_CACHE_SECONDS > 0, rendered bodies are shared through the cache
+    under a key derived from the ETag, so any write that changes the version
+    stops old entries from being served
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            version = version_func(*args, **kwargs)
+            if version is None:
+                # Let the view produce its usual 404
+                return view(request, *args, **kwargs)
+            etag, last_modified = version
+            _incr(endpoint, 'requests')
+
+            version_key = etag.strip('"')
+            # Bodies differ by negotiated format (JSON or MessagePack)
+            negotiation = f"{request.META.get('HTTP_ACCEPT', '')}|{request.GET.get(api_settings.URL_FORMAT_OVERRIDE, '')}"
+            accept = hashlib.md5(negotiation.encode()).hexdigest()[:8]
+            body_key = f"loans:response:{version_key}:{accept}"
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=int(last_modified.timestamp())
+            )
+            if response is not None:
+                _incr(endpoint, 'not_modified')
+            else:
+                cached = cache.get(body_key) if settings.RESPONSE_CACHE_SECONDS > 0 else None
+                if cached is not None:
+                    _incr(endpoint, 'cache_hits')
+                    response = HttpResponse(cached['body'], content_type=cached['content_type'])
+                else:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    if settings.RESPONSE_CACHE_SECONDS > 0:
+                        response.render()
+                        cache.set(body_key, {
+                            'body': response.content,
+                            'content_type': response['Content-Type'],
+                        }, settings.RESPONSE_CACHE_SECONDS)
+
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+            patch_vary_headers(response, ['Accept'])
+            return response
+        return wrapper
+    return decorator
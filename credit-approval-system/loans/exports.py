@@ -0,0 +1,244 @@
+import csv
+from contextlib import contextmanager
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Customer, Loan, ArchivedLoan
+from .routers import replica_configured
+from .sharding import shard_aliases, sharding_enabled
+from .utils import credit_score_aggregates, credit_score_from_stats
+
+EXPORT_FORMATS = ('csv', 'parquet')
+EXPORT_DATASETS = ('customers', 'loans', 'archived_loans')
+DEFAULT_BATCH_SIZE = 5000
+
+CUSTOMER_COLUMNS = [
+    'customer_id', 'first_name', 'last_name', 'age', 'phone_number', 'monthly_salary',
+    'approved_limit', 'current_debt', 'credit_score', 'created_at', 'updated_at',
+]
+LOAN_COLUMNS = [
+    'loan_id', 'customer_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment',
+    'emis_paid_on_time', 'start_date', 'end_date', 'is_active', 'created_at', 'updated_at',
+]
+DATASET_COLUMNS = {'customers': CUSTOMER_COLUMNS, 'loans': LOAN_COLUMNS, 'archived_loans': LOAN_COLUMNS}
+
+
+def export_database_alias():
+    """
+    Exports read from the replica when one is configured, to keep load off the primary
+    """
+    return settings.REPLICA_DATABASE_ALIAS if replica_configured() else 'default'
+
+
+def export_database_aliases():
+    """
+    Databases an export reads, in order: every shard, or export_database_alias()
+    """
+    return shard_aliases() if sharding_enabled() else [export_database_alias()]
+
+
+def parse_watermark(value):
+    """
+    Parse a 'since' watermark (ISO 8601); naive values are taken as UTC
+    """
+    if not value:
+        return None
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(f"Invalid timestamp: {value}")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, dt_timezone.utc)
+    return since
+
+
+def check_export_format(fmt):
+    """
+    Validate an export format before any output is produced
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError('Parquet export requires the pyarrow package')
+
+
+def next_watermark():
+    """
+    Watermark for the next incremental export, taken before the snapshot
+    starts. updated_at is set when a row is written, not when its
+    transaction commits, so it is set back by EXPORT_WATERMARK_SAFETY_SECONDS:
+    rows committed late are exported by the next run instead of skipped, and
+    rows near the watermark may appear twice
+    """
+    return timezone.now() - timedelta(seconds=settings.EXPORT_WATERMARK_SAFETY_SECONDS)
+
+
+@contextmanager
+def snapshot(using):
+    """
+    Open a read-only transaction that sees one consistent snapshot across every
+    query inside it (REPEATABLE READ on Postgres). Yields next_watermark()
+    """
+    watermark = next_watermark()
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Must be the first statement of the transaction
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        yield watermark
+
+
+def _customer_batches(using, since, batch_size):
+    customers = Customer.objects.using(using).order_by().annotate(
+        **credit_score_aggregates(prefix='loans__', include_archived=True)
+    ).values(
+        *[column for column in CUSTOMER_COLUMNS if column != 'credit_score'],
+        *credit_score_aggregates().keys()
+    )
+    if since is not None:
+        customers = customers.filter(updated_at__gt=since)
+
+    batch = []
+    # iterator() streams through a server-side cursor on Postgres
+    for row in customers.iterator(chunk_size=batch_size):
+        row['credit_score'] = credit_score_from_stats(row, row['approved_limit'], row['monthly_salary'])
+        batch.append([row[column] for column in CUSTOMER_COLUMNS])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _loan_batches(model, using, since, batch_size, changed_field='updated_at'):
+    loans = model.objects.using(using).order_by().values_list(*LOAN_COLUMNS)
+    if since is not None:
+        loans = loans.filter(**{f'{changed_field}__gt': since})
+
+    batch = []
+    for row in loans.iterator(chunk_size=batch_size):
+        batch.append(list(row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_batches(dataset, using, since=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield rows of a dataset as lists of column values, batch_size rows at a
+    time. Must run inside snapshot() for a consistent export
+    """
+    if dataset == 'customers':
+        return _customer_batches(using, since, batch_size)
+    if dataset == 'loans':
+        return _loan_batches(Loan, using, since, batch_size)
+    if dataset == 'archived_loans':
+        # Archived rows keep the loan's updated_at; they are new as of archived_at
+        return _loan_batches(ArchivedLoan, using, since, batch_size, changed_field='archived_at')
+    raise ValueError(f"Unknown dataset: {dataset}")
+
+
+def iter_snapshot_batches(dataset, since=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    iter_batches() over each of export_database_aliases() in turn, inside
+    its own snapshot(): consistent per shard, not across shards
+    """
+    for using in export_database_aliases():
+        with snapshot(using):
+            yield from iter_batches(dataset, using, since=since, batch_size=batch_size)
+
+
+class _ChunkBuffer:
+    """
+    Write-only file object whose contents are drained after each batch, so
+    encoded output can be streamed without holding the whole file
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet_schema(dataset):
+    import pyarrow as pa
+
+    timestamp = pa.timestamp('us', tz='UTC')
+    if dataset == 'customers':
+        return pa.schema([
+            ('customer_id', pa.int64()), ('first_name', pa.string()), ('last_name', pa.string()),
+            ('age', pa.int32()), ('phone_number', pa.string()),
+            ('monthly_salary', pa.decimal128(10, 2)), ('approved_limit', pa.decimal128(12, 2)),
+            ('current_debt', pa.decimal128(12, 2)), ('credit_score', pa.float64()),
+            ('created_at', timestamp), ('updated_at', timestamp),
+        ])
+    # Active and archived loans share a layout
+    return pa.schema([
+        ('loan_id', pa.int64()), ('customer_id', pa.int64()), ('loan_amount', pa.decimal128(12, 2)),
+        ('tenure', pa.int32()), ('interest_rate', pa.decimal128(5, 2)),
+        ('monthly_repayment', pa.decimal128(10, 2)), ('emis_paid_on_time', pa.int32()),
+        ('start_date', pa.date32()), ('end_date', pa.date32()), ('is_active', pa.bool_()),
+        ('created_at', timestamp), ('updated_at', timestamp),
+    ])
+
+
+def encode_batches(dataset, batches, fmt):
+    """
+    Encode row batches as CSV or Parquet, yielding bytes after every batch.
+    Parquet output gets one row group per batch
+    """
+    columns = DATASET_COLUMNS[dataset]
+    buffer = _ChunkBuffer()
+
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+            yield buffer.drain()
+        yield buffer.drain()
+        return
+
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _parquet_schema(dataset)
+        writer = pq.ParquetWriter(buffer, schema)
+        for batch in batches:
+            table = pa.Table.from_pylist([dict(zip(columns, row)) for row in batch], schema=schema)
+            writer.write_table(table)
+            yield buffer.drain()
+        writer.close()
+        yield buffer.drain()
+        return
+
+    raise ValueError(f"Unsupported export format: {fmt}")
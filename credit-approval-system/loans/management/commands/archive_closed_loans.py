@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from loans.archive import archive_closed_loans, archivable_loans
+from loans.queues import enqueue
+from loans.sharding import on_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Move closed loans from before the current year to the loan archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--enqueue', action='store_true', help='Run the move on an RQ worker instead')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            job = enqueue(archive_closed_loans, options['batch_size'], options['max_batches'])
+            self.stdout.write(self.style.SUCCESS(f'Loan archival queued with job ID: {job.id}'))
+            return
+
+        archivable = 0
+        for alias in shard_aliases():
+            with on_shard(alias):
+                archivable += archivable_loans().count()
+        self.stdout.write(f'{archivable} loans to archive')
+        result = archive_closed_loans(options['batch_size'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(result))
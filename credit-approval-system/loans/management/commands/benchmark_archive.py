@@ -0,0 +1,92 @@
+import random
+import time
+from datetime import date
+from decimal import Decimal
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from loans.archive import archive_closed_loans
+from loans.models import Customer, Loan
+from loans.utils import calculate_credit_score
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time credit scoring on a synthetic loan book before and after archiving '
+        'closed loans. Everything runs in a transaction that is rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--loans-per-customer', type=int, default=50)
+        parser.add_argument('--active-share', type=float, default=0.05)
+        parser.add_argument('--samples', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Synthetic book rolled back')
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        today = date.today()
+        now = timezone.now()
+
+        customers = Customer.objects.bulk_create([
+            Customer(
+                first_name='Bench', last_name=str(i), age=rng.randint(21, 65),
+                phone_number=str(9000000000 + i), monthly_salary=Decimal(rng.randint(20, 300) * 1000),
+                approved_limit=Decimal(rng.randint(10, 100) * 100000),
+            )
+            for i in range(options['customers'])
+        ])
+        # bulk_create only returns primary keys on some backends
+        if customers[0].pk is None:
+            customers = list(Customer.objects.filter(first_name='Bench').order_by('customer_id'))
+
+        loans = []
+        for customer in customers:
+            for _ in range(options['loans_per_customer']):
+                active = rng.random() < options['active_share']
+                start = today - relativedelta(months=rng.randint(0 if active else 13, 240))
+                tenure = rng.choice([12, 24, 36, 60, 120])
+                loans.append(Loan(
+                    customer=customer, loan_amount=Decimal(rng.randint(10, 5000) * 1000), tenure=tenure,
+                    interest_rate=Decimal(rng.randrange(800, 2000, 25)).scaleb(-2),
+                    monthly_repayment=Decimal(rng.randint(1, 100) * 1000),
+                    emis_paid_on_time=rng.randint(0, tenure), start_date=start,
+                    end_date=start + relativedelta(months=tenure), is_active=active,
+                ))
+        Loan.objects.bulk_create(loans, batch_size=5000)
+        self.stdout.write(f'Synthetic book: {len(customers)} customers, {len(loans)} loans')
+
+        sample = rng.sample(customers, min(options['samples'], len(customers)))
+
+        def score_all():
+            started = time.perf_counter()
+            scores = [calculate_credit_score(Customer.objects.get(pk=customer.pk)) for customer in sample]
+            return scores, time.perf_counter() - started
+
+        before_scores, before_seconds = score_all()
+
+        started = time.perf_counter()
+        result = archive_closed_loans()
+        archive_seconds = time.perf_counter() - started
+        self.stdout.write(f'{result} in {archive_seconds:.2f}s ({Loan.objects.count()} loans left in the hot table)')
+
+        after_scores, after_seconds = score_all()
+
+        samples = len(sample)
+        self.stdout.write(f'  before archiving: {before_seconds * 1000 / samples:8.3f} ms/score')
+        self.stdout.write(f'   after archiving: {after_seconds * 1000 / samples:8.3f} ms/score')
+        mismatches = sum(1 for before, after in zip(before_scores, after_scores) if before != after)
+        self.stdout.write(f'Scores changed by archiving: {mismatches}/{samples}')
@@ -0,0 +1,86 @@
+import random
+import time
+from datetime import date
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from loans.models import Customer, Loan
+from loans.views import bulk_view_loans, view_loan
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare per-ID time and queries of /view-loan/<id>/ against /view-loans/bulk/ '
+        'on synthetic loans, in a transaction that is rolled back. Views are called '
+        'directly, so HTTP round trips saved by the bulk endpoint come on top'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=5000)
+        parser.add_argument('--batch', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        customers = Customer.objects.bulk_create([
+            Customer(
+                first_name='Bench', last_name=str(i), age=30, phone_number=str(9000000000 + i),
+                monthly_salary=Decimal(50000), approved_limit=Decimal(1800000),
+            )
+            for i in range(max(1, options['loans'] // 10))
+        ])
+        if customers[0].pk is None:
+            customers = list(Customer.objects.filter(first_name='Bench'))
+        loans = Loan.objects.bulk_create([
+            Loan(
+                customer=rng.choice(customers), loan_amount=Decimal(100000), tenure=12,
+                interest_rate=Decimal(12), monthly_repayment=Decimal(8885), start_date=date.today(),
+                end_date=date.today().replace(year=date.today().year + 1),
+            )
+            for _ in range(options['loans'])
+        ])
+        if loans[0].pk is None:
+            loan_ids = list(Loan.objects.filter(customer__first_name='Bench').values_list('loan_id', flat=True))
+        else:
+            loan_ids = [loan.loan_id for loan in loans]
+        rng.shuffle(loan_ids)
+        factory = RequestFactory()
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for loan_id in loan_ids:
+                view_loan(factory.get(f'/view-loan/{loan_id}/'), loan_id=loan_id).render()
+            single_seconds = time.perf_counter() - started
+        single_queries = len(queries.captured_queries)
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for start in range(0, len(loan_ids), options['batch']):
+                ids = ','.join(map(str, loan_ids[start:start + options['batch']]))
+                bulk_view_loans(factory.get('/view-loans/bulk/', {'ids': ids})).render()
+            bulk_seconds = time.perf_counter() - started
+        bulk_queries = len(queries.captured_queries)
+
+        count = len(loan_ids)
+        self.stdout.write(f'{count} loans, bulk batches of {options["batch"]}')
+        self.stdout.write(
+            f'  single: {single_seconds * 1e6 / count:8.1f} us/ID, {single_queries / count:.3f} queries/ID'
+        )
+        self.stdout.write(
+            f'    bulk: {bulk_seconds * 1e6 / count:8.1f} us/ID, {bulk_queries / count:.3f} queries/ID'
+        )
+        self.stdout.write(f'Speedup: {single_seconds / bulk_seconds:.1f}x')
@@ -0,0 +1,86 @@
+import random
+import time
+from decimal import Decimal, localcontext, ROUND_HALF_UP
+from django.core.management.base import BaseCommand
+from loans.money import to_paise, to_basis_points, emi_paise, from_paise
+from loans.utils import calculate_monthly_installment
+
+STANDARD_TENURES = [6, 12, 24, 36, 48, 60, 84, 120, 180, 240, 360]
+
+
+def decimal_emi(loan_amount, interest_rate, tenure):
+    """
+    Reference EMI computed in 50-digit Decimal, rounded half up to paise
+    """
+    with localcontext() as context:
+        context.prec = 50
+        if interest_rate == 0:
+            emi = loan_amount / tenure
+        else:
+            rate = interest_rate / Decimal(1200)
+            factor = (1 + rate) ** tenure
+            emi = loan_amount * rate * factor / (factor - 1)
+        return emi.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+class Command(BaseCommand):
+    help = 'Compare the float, Decimal and integer-paise EMI implementations for speed and agreement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        cases = [
+            (
+                Decimal(rng.randint(1000, 1000000000)).scaleb(-2),  # up to 1 crore
+                Decimal(rng.randrange(0, 5001, 25)).scaleb(-2),  # 0-50% in 0.25% steps
+                rng.choice(STANDARD_TENURES),
+            )
+            for _ in range(options['samples'])
+        ]
+
+        def run_integer():
+            # Inputs are converted to minor units once per decision
+            return [
+                emi_paise(to_paise(amount), to_basis_points(rate), tenure) for amount, rate, tenure in cases
+            ]
+
+        # The first pass also builds the per (rate, tenure) factor cache
+        started = time.perf_counter()
+        run_integer()
+        cold_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        integer_results = run_integer()
+        integer_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        float_results = [calculate_monthly_installment(amount, rate, tenure) for amount, rate, tenure in cases]
+        float_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        decimal_results = [decimal_emi(amount, rate, tenure) for amount, rate, tenure in cases]
+        decimal_seconds = time.perf_counter() - started
+
+        integer_vs_decimal = sum(
+            1 for paise, exact in zip(integer_results, decimal_results) if from_paise(paise) != exact
+        )
+        float_vs_decimal = sum(
+            1 for emi, exact in zip(float_results, decimal_results) if to_paise(emi) != to_paise(exact)
+        )
+        max_float_drift = max(
+            abs(Decimal(str(emi)) - exact) for emi, exact in zip(float_results, decimal_results)
+        )
+
+        samples = len(cases)
+        for name, seconds in (('integer paise', integer_seconds), ('(cold cache)', cold_seconds),
+                              ('float', float_seconds), ('decimal', decimal_seconds)):
+            self.stdout.write(f'{name:>14}: {seconds * 1e6 / samples:8.2f} us/EMI')
+        self.stdout.write('')
+        self.stdout.write(f'Integer paise differs from exact Decimal in {integer_vs_decimal}/{samples} cases')
+        self.stdout.write(
+            f'Float differs from exact Decimal in {float_vs_decimal}/{samples} cases '
+            f'(max drift {max_float_drift})'
+        )
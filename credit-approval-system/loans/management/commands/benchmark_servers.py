@@ -0,0 +1,169 @@
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date
+from decimal import Decimal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from loans.models import Customer, Loan
+
+SERVERS = {
+    'runserver': lambda port: [sys.executable, '-m', 'django', 'runserver', f'127.0.0.1:{port}', '--noreload'],
+    'gunicorn': lambda port: [
+        sys.executable, '-m', 'gunicorn', '-c', os.path.join('credit_system', 'gunicorn.conf.py'),
+        '--bind', f'127.0.0.1:{port}', 'credit_system.wsgi',
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test GET /view-loan/<id>/ served by Django's runserver and by gunicorn with "
+        'credit_system/gunicorn.conf.py, against the same fresh SQLite database. Admission '
+        'control is off, so every request reaches the server'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='runserver,gunicorn', help='Comma-separated servers to compare')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per server')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client threads')
+        parser.add_argument('--loans', type=int, default=1000)
+        parser.add_argument('--seed-only', action='store_true', help='Internal: seed the database and exit')
+
+    def handle(self, *args, **options):
+        if options['seed_only']:
+            self._seed(options['loans'])
+            return
+
+        servers = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f"Unknown servers: {', '.join(sorted(unknown))}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                'DB_ENGINE': 'django.db.backends.sqlite3',
+                'DB_NAME': os.path.join(directory, 'bench.sqlite3'),
+                'DB_SHARD_NAMES': '',
+                'DB_REPLICA_HOST': '',
+                'DB_REPLICA_NAME': '',
+                'DEBUG': 'False',
+                'CACHE_BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'ADMISSION_CONTROL_ENABLED': 'False',
+                'PROFILING_ENABLED': 'False',
+            }
+            subprocess.run([sys.executable, '-m', 'django', 'migrate', '-v', '0'], env=env, check=True)
+            subprocess.run(
+                [sys.executable, '-m', 'django', 'benchmark_servers', '--seed-only', '--loans', str(options['loans'])],
+                env=env, check=True
+            )
+
+            self.stdout.write(
+                f"{options['requests']} requests, {options['concurrency']} concurrent clients, "
+                f"{os.cpu_count()} CPU(s)"
+            )
+            self.stdout.write(f"{'server':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+            results = {}
+            for name in servers:
+                results[name] = self._run(name, env, options)
+                rate, p50, p99, errors = results[name]
+                self.stdout.write(f'{name:<12}{rate:>10.1f}{p50:>10.1f}{p99:>10.1f}{errors:>8}')
+        if len(results) > 1:
+            baseline = servers[0]
+            for name in servers[1:]:
+                self.stdout.write(f'{name} vs {baseline}: {results[name][0] / results[baseline][0]:.2f}x throughput')
+
+    def _seed(self, loan_count):
+        customers = Customer.objects.bulk_create([
+            Customer(
+                first_name='Bench', last_name=str(index), age=30, phone_number=str(9000000000 + index),
+                monthly_salary=Decimal(50000), approved_limit=Decimal(1800000),
+            )
+            for index in range(max(1, loan_count // 10))
+        ])
+        today = date.today()
+        Loan.objects.bulk_create([
+            Loan(
+                customer=customers[index % len(customers)], loan_amount=Decimal(100000), tenure=12,
+                interest_rate=Decimal(12), monthly_repayment=Decimal(8885), start_date=today,
+                end_date=today.replace(year=today.year + 1),
+            )
+            for index in range(loan_count)
+        ], batch_size=500)
+
+    def _run(self, name, env, options):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen(
+            SERVERS[name](port), env={**env, 'PORT': str(port)}, cwd=settings.BASE_DIR,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            self._wait_until_up(server, base_url)
+            return self._load(base_url, options)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    def _wait_until_up(self, server, base_url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Server exited with {server.returncode} before serving')
+            try:
+                urllib.request.urlopen(f'{base_url}/view-loan/1/', timeout=1).read()
+                return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        raise CommandError(f'Server did not answer within {timeout}s')
+
+    def _load(self, base_url, options):
+        # Loan IDs start at 1 in the fresh database
+        loan_ids = list(range(1, options['loans'] + 1))
+        remaining = iter(range(options['requests']))
+        lock = threading.Lock()
+        timings = []
+        errors = [0]
+
+        def client(rng):
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                url = f'{base_url}/view-loan/{rng.choice(loan_ids)}/'
+                started = time.perf_counter()
+                try:
+                    urllib.request.urlopen(url, timeout=30).read()
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        timings.append(elapsed)
+                except (urllib.error.URLError, ConnectionError):
+                    with lock:
+                        errors[0] += 1
+
+        threads = [
+            threading.Thread(target=client, args=(random.Random(index),))
+            for index in range(options['concurrency'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+        if not timings:
+            raise CommandError('Every request failed')
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        return len(timings) / seconds, statistics.median(timings), p99, errors[0]
@@ -0,0 +1,106 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, transaction
+from loans.models import Customer
+from loans.sharding import db_alias, for_new_customer
+from loans.utils import create_approved_loan
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure write throughput (a registration plus a loan per customer, from several '
+        'worker processes) against 1, 2, 4... SQLite shards, each run in fresh temporary databases'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', default='1,2,4', help='Comma-separated shard counts to compare')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent writer processes')
+        parser.add_argument('--customers', type=int, default=500, help='Customers written per worker')
+        parser.add_argument('--worker', action='store_true', help='Internal: run as one writer process')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self._write_customers(options)
+            return
+
+        shard_counts = [int(count) for count in options['shards'].split(',') if count.strip()]
+        results = []
+        for shard_count in shard_counts:
+            rate, conflicts = self._run(shard_count, options)
+            results.append((shard_count, rate))
+            self.stdout.write(
+                f'{shard_count:>3} shard(s): {rate:10.1f} customers/s '
+                f'({options["workers"]} workers, {conflicts} lock conflicts retried)'
+            )
+        baseline = results[0][1]
+        for shard_count, rate in results[1:]:
+            self.stdout.write(f'{shard_count} vs {results[0][0]} shard(s): {rate / baseline:.2f}x')
+
+    def _run(self, shard_count, options):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                'DB_ENGINE': 'django.db.backends.sqlite3',
+                'DB_NAME': os.path.join(directory, 'default.sqlite3'),
+                'DB_SHARD_NAMES': ','.join(
+                    os.path.join(directory, f'shard_{index}.sqlite3') for index in range(shard_count)
+                ),
+            }
+            for alias in ['default'] + [f'shard_{index}' for index in range(shard_count)]:
+                subprocess.run(
+                    [sys.executable, '-m', 'django', 'migrate', '--database', alias, '-v', '0'],
+                    env=env, check=True
+                )
+
+            workers = [
+                subprocess.Popen(
+                    [sys.executable, '-m', 'django', 'benchmark_sharding', '--worker',
+                     '--customers', str(options['customers']), '--seed', str(options['seed'] + index)],
+                    env=env, stdout=subprocess.PIPE, text=True
+                )
+                for index in range(options['workers'])
+            ]
+            reports = []
+            for worker in workers:
+                output, _ = worker.communicate()
+                if worker.returncode:
+                    raise CommandError(f'Benchmark worker exited with {worker.returncode}')
+                reports.append(json.loads(output.strip().splitlines()[-1]))
+
+        # From the first worker starting to write to the last one finishing,
+        # so process start-up is not counted
+        seconds = max(report['finished'] for report in reports) - min(report['started'] for report in reports)
+        written = sum(report['customers'] for report in reports)
+        return written / seconds, sum(report['conflicts'] for report in reports)
+
+    def _write_customers(self, options):
+        rng = random.Random(options['seed'])
+        conflicts = 0
+        started = time.time()
+        for index in range(options['customers']):
+            salary = Decimal(rng.randint(20, 300) * 1000)
+            while True:
+                try:
+                    with for_new_customer(), transaction.atomic(using=db_alias()):
+                        customer = Customer.objects.create(
+                            first_name='Bench', last_name=str(index), age=rng.randint(21, 65),
+                            phone_number=str(9000000000 + options['seed'] * 1000000 + index),
+                            monthly_salary=salary, approved_limit=salary * 36,
+                        )
+                        create_approved_loan(customer, Decimal(100000), 12, Decimal('12.00'), Decimal('8884.88'))
+                    break
+                except OperationalError:
+                    # 'database is locked': SQLite has one writer per database file
+                    conflicts += 1
+        self.stdout.write(json.dumps({
+            'started': started, 'finished': time.time(),
+            'customers': options['customers'], 'conflicts': conflicts,
+        }))
@@ -0,0 +1,139 @@
+import io
+import random
+import time
+from datetime import date
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from loans.models import CreditScoreSnapshot, Customer, Loan
+from loans.parsers import MessagePackParser
+from loans.renderers import JSONRenderer, MessagePackRenderer, packb
+from loans.serializers import CreditScoreSnapshotSerializer, LoanDetailSerializer
+
+# Values that must come back from MessagePack exactly, scale included
+ROUND_TRIP_CASES = [
+    Decimal('0.00'), Decimal('12.50'), Decimal('-8884.88'), Decimal('1E+5'),
+    Decimal('999999999999999999'), Decimal('-0.000001'), True, 'text', 2 ** 40,
+    {'nested': [Decimal('1.10'), {'amount': Decimal('250000.00')}], 'at': None},
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that API payloads round-trip through MessagePack, then compare their size and '
+        'encode/decode time as JSON and as MessagePack'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=1000, help='Loans in the bulk lookup payload')
+        parser.add_argument('--repeat', type=int, default=20, help='Times each payload is encoded and decoded')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        payloads = self._payloads(random.Random(options['seed']), options['loans'])
+        self._check_round_trips(payloads)
+        self.stdout.write(self.style.SUCCESS('MessagePack round trips OK'))
+
+        formats = [
+            ('json', JSONRenderer(), JSONParser()),
+            ('msgpack', MessagePackRenderer(), MessagePackParser()),
+        ]
+        for name, data in payloads.items():
+            sizes = {}
+            for fmt, renderer, parser in formats:
+                body, encode, decode = self._time(renderer, parser, data, options['repeat'])
+                sizes[fmt] = len(body)
+                self.stdout.write(
+                    f'{name:<16} {fmt:<8} {len(body):>10} bytes   '
+                    f'encode {encode * 1000:8.3f} ms   decode {decode * 1000:8.3f} ms'
+                )
+            self.stdout.write(f"{name:<16} msgpack is {sizes['msgpack'] / sizes['json']:.0%} of json")
+
+    def _payloads(self, rng, loan_count):
+        now = timezone.now()
+        loans = []
+        for index in range(loan_count):
+            salary = Decimal(rng.randint(20, 300) * 1000)
+            customer = Customer(
+                customer_id=index + 1, first_name='Partner', last_name=f'Customer{index}',
+                phone_number=str(9000000000 + index), age=rng.randint(21, 65),
+                monthly_salary=salary, approved_limit=salary * 36,
+            )
+            amount = Decimal(rng.randint(50, 5000) * 1000)
+            tenure = rng.choice([6, 12, 24, 36, 60])
+            loans.append(Loan(
+                loan_id=index + 1, customer=customer, loan_amount=amount, tenure=tenure,
+                interest_rate=Decimal(rng.randint(800, 2400)) / 100,
+                monthly_repayment=(amount / tenure * Decimal('1.1')).quantize(Decimal('0.01')),
+                emis_paid=rng.randint(0, tenure), start_date=date(2024, 1, 1), end_date=date(2029, 1, 1),
+            ))
+        results = LoanDetailSerializer(loans, many=True).data
+        for data in results:
+            data['monthly_installment'] = data.pop('monthly_repayment')
+
+        snapshots = [
+            CreditScoreSnapshot(
+                credit_score=rng.randint(0, 100), computed_at=now, approved_limit=Decimal('3600000.00'),
+                monthly_salary=Decimal('100000.00'), current_loans_sum=Decimal(rng.randint(0, 3000000)),
+                current_emis=Decimal('25000.00'), total_loan_volume=Decimal(rng.randint(0, 9000000)),
+                total_emis=rng.randint(0, 200), paid_on_time=rng.randint(0, 200),
+                loan_count=rng.randint(0, 20), current_year_loans=rng.randint(0, 5),
+            )
+            for _ in range(100)
+        ]
+        return {
+            'bulk_view_loans': {'results': results, 'missing': []},
+            'score_history': {
+                'customer_id': 1,
+                'results': CreditScoreSnapshotSerializer(snapshots, many=True).data,
+                'next_to': now,
+            },
+            'check_eligibility': {
+                'customer_id': 1, 'approval': True, 'interest_rate': Decimal('10.50'),
+                'corrected_interest_rate': Decimal('12.00'), 'tenure': 12,
+                'monthly_installment': Decimal('8884.88'),
+            },
+        }
+
+    def _check_round_trips(self, payloads):
+        renderer, parser = MessagePackRenderer(), MessagePackParser()
+        for value in ROUND_TRIP_CASES + list(payloads.values()):
+            if not _same(parser.parse(io.BytesIO(renderer.render(value))), value):
+                raise CommandError(f'MessagePack round trip changed {value!r}')
+        try:
+            packb(Decimal('9' * 19))
+        except ValueError:
+            pass
+        else:
+            raise CommandError('A Decimal beyond 64 bits was encoded')
+
+    def _time(self, renderer, parser, data, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            body = renderer.render(data)
+        encoded = time.perf_counter()
+        for _ in range(repeat):
+            parser.parse(io.BytesIO(body))
+        decoded = time.perf_counter()
+        return body, (encoded - started) / repeat, (decoded - encoded) / repeat
+
+
+def _same(decoded, original):
+    """
+    Equal, with Decimals also equal in scale (12.50 is not 12.5) and
+    datetimes compared as the ISO strings they are sent as
+    """
+    if isinstance(original, Decimal):
+        return isinstance(decoded, Decimal) and decoded.as_tuple() == original.as_tuple()
+    if isinstance(original, dict):
+        return isinstance(decoded, dict) and decoded.keys() == original.keys() and all(
+            _same(decoded[key], value) for key, value in original.items()
+        )
+    if isinstance(original, (list, tuple)):
+        return isinstance(decoded, list) and len(decoded) == len(original) and all(
+            _same(item, value) for item, value in zip(decoded, original)
+        )
+    if hasattr(original, 'isoformat'):
+        return decoded == JSONRenderer.encoder_class().default(original)
+    return decoded == original
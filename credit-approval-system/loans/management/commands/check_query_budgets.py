@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from loans.query_budgets import LOAN_COUNTS, QUERY_BUDGETS, check_budgets
+from loans.sharding import sharding_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        'Check every loans endpoint against its declared query and time budget for customers '
+        'with 0, 1, 10 and 1000 loans, in a throwaway test database (in-memory with '
+        'DB_ENGINE=django.db.backends.sqlite3, otherwise a test database on the configured server)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Measured requests per endpoint')
+        parser.add_argument('--no-time', action='store_true', help='Report but do not enforce time budgets')
+
+    def handle(self, *args, **options):
+        if sharding_enabled():
+            raise CommandError('Budgets are declared for a single database; unset DB_SHARD_NAMES')
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            results, failures = check_budgets(repeat=options['repeat'], enforce_time=not options['no_time'])
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        self.stdout.write(f'Database: {connection.vendor}')
+        header = f"{'endpoint':<24}{'budget':>14}" + ''.join(f'{count:>16}' for count in LOAN_COUNTS)
+        self.stdout.write(header)
+        self.stdout.write(f"{'':<24}{'queries / ms':>14}" + f"{'loans: q / ms':>16}" * len(LOAN_COUNTS))
+        for name, budget in QUERY_BUDGETS.items():
+            query_budget = budget.get(f'queries_{connection.vendor}', budget['queries'])
+            row = f"{name:<24}{query_budget:>8} / {budget['ms']:<3}"
+            for count in LOAN_COUNTS:
+                measured = results.get(name, {}).get(count)
+                if measured is None:
+                    row += f"{'-':>16}"
+                    continue
+                _, queries, ms = measured
+                row += f'{queries:>9} / {ms:<4.0f}'
+            self.stdout.write(row)
+
+        if failures:
+            raise CommandError('Budget exceeded:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('All endpoints within budget'))
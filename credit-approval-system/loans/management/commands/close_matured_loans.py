@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from loans.queues import enqueue
+from loans.tasks import close_matured_loans
+
+
+class Command(BaseCommand):
+    help = 'Deactivate active loans past their end date and update the portfolio counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--enqueue', action='store_true', help='Run on an RQ worker instead')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            job = enqueue(close_matured_loans, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Loan maturity job queued with job ID: {job.id}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(close_matured_loans(options['batch_size'])))
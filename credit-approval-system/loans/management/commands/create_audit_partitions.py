@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from loans.queues import enqueue
+from loans.tasks import create_decision_audit_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Create monthly partitions of the decision audit log from this month to --months-ahead '
+        'months out (Postgres only; run e.g. daily from cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, help='Default: DECISION_AUDIT_PARTITION_MONTHS_AHEAD')
+        parser.add_argument('--enqueue', action='store_true', help='Run on an RQ worker instead')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            job = enqueue(create_decision_audit_partitions, options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS(f'Audit partition job queued with job ID: {job.id}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(create_decision_audit_partitions(options['months_ahead'])))
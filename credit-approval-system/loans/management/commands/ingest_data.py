@@ -1,11 +1,12 @@
 import os
-import django_rq
 from django.core.management.base import BaseCommand
-from loans.tasks import ingest_all_data
 
 class Command(BaseCommand):
     help = 'Ingest customer and loan data from Excel files'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows per ingestion job (default: INGESTION_CHUNK_SIZE)')
+
     def handle(self, *args, **options):
         self.stdout.write('Starting data ingestion...')
         
@@ -22,21 +23,14 @@ class Command(BaseCommand):
             )
             return
         
-        # Queue the ingestion job
-        queue = django_rq.get_queue('default')
-        job = queue.enqueue(ingest_all_data)
+        from loans.queues import enqueue
+        from loans.tasks import plan_ingestion
+
+        # Queue the ingestion; the planning job splits both files into chunk
+        # jobs on the bulk queue
+        job = enqueue(plan_ingestion, options['chunk_size'])
         
         self.stdout.write(
             self.style.SUCCESS(f'Data ingestion job queued with ID: {job.id}')
         )
-        
-        # Wait for job completion and show results
-        result = job.result
-        if result:
-            self.stdout.write(
-                self.style.SUCCESS(f'Data ingestion completed: {result}')
-            )
-        else:
-            self.stdout.write(
-                self.style.WARNING('Job is still running or failed')
-            )
\ No newline at end of file
+        self.stdout.write('Chunks run on the bulk queue; follow them with `python manage.py rqstats`')
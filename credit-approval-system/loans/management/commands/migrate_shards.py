@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Run migrate on 'default' and then on every shard database; with sharding on, the loans "
+        "tables only exist on the shards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--noinput', '--no-input', action='store_false', dest='interactive',
+            help='Do not prompt the user for input of any kind'
+        )
+
+    def handle(self, *args, **options):
+        for alias in ['default', *settings.SHARD_DATABASE_ALIASES]:
+            self.stdout.write(f'Migrating {alias}')
+            call_command(
+                'migrate', database=alias, interactive=options['interactive'],
+                verbosity=options['verbosity'], stdout=self.stdout, stderr=self.stderr
+            )
+        self.stdout.write(self.style.SUCCESS('All databases migrated'))
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+# What a web worker imports before serving its first request
+DEFAULT_TARGETS = ['credit_system.wsgi', 'credit_system.urls']
+
+
+class Command(BaseCommand):
+    help = 'Report cumulative import time per module for a cold process (python -X importtime)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'modules', nargs='*',
+            help=f"Modules to import after django.setup() (default: {' '.join(DEFAULT_TARGETS)})"
+        )
+        parser.add_argument('--limit', type=int, default=25, help='Number of modules to list')
+        parser.add_argument(
+            '--package', action='append', default=[],
+            help='Only list modules from these top-level packages (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        targets = options['modules'] or DEFAULT_TARGETS
+        script = 'import django; django.setup()\n' + ''.join(f'import {module}\n' for module in targets)
+
+        env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            env=env, capture_output=True, text=True
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if process.returncode != 0:
+            raise CommandError(process.stderr.strip().splitlines()[-1])
+
+        rows = []
+        for line in process.stderr.splitlines():
+            # "import time:  self [us] |  cumulative | imported package"
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, cumulative_us, module = line[len('import time:'):].split('|')
+            module_name = module.strip()
+            rows.append((int(cumulative_us), int(self_us), module_name))
+
+        packages = options['package']
+        if packages:
+            rows = [row for row in rows if row[2].split('.')[0] in packages]
+        rows.sort(reverse=True)
+
+        self.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for cumulative_us, self_us, module_name in rows[:options['limit']]:
+            self.stdout.write(f'{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {module_name}')
+
+        total_ms = sum(row[1] for row in rows) / 1000 if not packages else None
+        self.stdout.write('')
+        if total_ms is not None:
+            self.stdout.write(f'Total import time: {total_ms:.1f} ms across {len(rows)} modules')
+        self.stdout.write(self.style.SUCCESS(f'Cold process wall time: {wall_ms:.1f} ms ({", ".join(targets)})'))
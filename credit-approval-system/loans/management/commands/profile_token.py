@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import get_resolver
+from loans.profiling import sign_profile_request
+
+
+class Command(BaseCommand):
+    help = 'Print a signed X-Profile-Token header value that profiles requests to one endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('endpoint', help='URL name, e.g. check_eligibility')
+
+    def handle(self, *args, **options):
+        endpoint = options['endpoint']
+        if endpoint not in get_resolver().reverse_dict:
+            raise CommandError(f"Unknown URL name: {endpoint}")
+        if not settings.PROFILING['ENABLED']:
+            self.stderr.write('PROFILING_ENABLED is off, so the header will be ignored')
+        self.stdout.write(sign_profile_request(endpoint))
+        self.stderr.write(f"Valid for {settings.PROFILING['TOKEN_MAX_AGE']} seconds")
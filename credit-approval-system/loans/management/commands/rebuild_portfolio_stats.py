@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from loans.portfolio import rebuild_portfolio_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the portfolio counters behind /portfolio/stats/ from the loan table'
+
+    def handle(self, *args, **options):
+        for name, value in sorted(rebuild_portfolio_counters().items()):
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(self.style.SUCCESS('Portfolio counters rebuilt'))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from loans.offers import refresh_offers
+from loans.queues import enqueue
+
+
+class Command(BaseCommand):
+    help = 'Precompute pre-approved offers for customers without current ones (or --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every customer, e.g. nightly')
+        parser.add_argument('--batch-size', type=int, help='Customers per write (default: OFFER_REFRESH_BATCH_SIZE)')
+        parser.add_argument('--enqueue', action='store_true', help='Run on an RQ worker instead')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            job = enqueue(refresh_offers, options['all'], options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Offer refresh queued with job ID: {job.id}'))
+            return
+
+        started = time.perf_counter()
+        refreshed = refresh_offers(options['all'], options['batch_size'])
+        seconds = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Refreshed offers of {refreshed} customers in {seconds:.1f}s'))
@@ -0,0 +1,36 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Apply a CSV (optionally .gz) payroll refresh: customer_id,monthly_salary; recomputes approved limits'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, help='Customers per transaction (default: SALARY_REFRESH_BATCH_SIZE)')
+        parser.add_argument('--enqueue', action='store_true', help='Run on an RQ worker; the path must be readable there')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} not found')
+
+        from loans.queues import enqueue
+        from loans.tasks import process_salary_file
+
+        if options['enqueue']:
+            job = enqueue(process_salary_file, os.path.abspath(path), options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Salary refresh queued with job ID: {job.id}'))
+            return
+
+        started = time.perf_counter()
+        try:
+            totals = process_salary_file(path, options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        seconds = time.perf_counter() - started
+        for name, count in sorted(totals.items()):
+            self.stdout.write(f'{name}: {count}')
+        rate = totals.get('rows', 0) / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(f'Done in {seconds:.1f}s ({rate:,.0f} rows/s)'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from loans.queues import enqueue
+from loans.tasks import requeue_loan_applications
+
+
+class Command(BaseCommand):
+    help = 'Enqueue a decision job for queued loan applications no worker is processing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enqueue', action='store_true', help='Run on an RQ worker instead')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            job = enqueue(requeue_loan_applications)
+            self.stdout.write(self.style.SUCCESS(f'Application sweep job queued with job ID: {job.id}'))
+            return
+
+        stuck = requeue_loan_applications()
+        self.stdout.write(self.style.SUCCESS(f'Re-enqueued {stuck} stuck loan applications'))
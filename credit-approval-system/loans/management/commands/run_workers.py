@@ -0,0 +1,54 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from loans.queues import worker_queues
+
+# Seconds between checks for exited workers; also the fastest restart rate
+RESTART_INTERVAL = 1
+
+
+class Command(BaseCommand):
+    help = 'Start RQ worker processes (default: one per CPU) and restart any that exit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help='Worker processes (default: RQ_WORKER_PROCESSES or CPU count)')
+        parser.add_argument('--bulk-workers', type=int, help='How many of them also take bulk jobs (default: RQ_BULK_WORKERS)')
+
+    def handle(self, *args, **options):
+        processes = options['processes'] or settings.RQ_WORKER_PROCESSES or os.cpu_count() or 1
+        layout = worker_queues(processes, options['bulk_workers'] or settings.RQ_BULK_WORKERS)
+        for queues in sorted(set(map(tuple, layout))):
+            self.stdout.write(f"{layout.count(list(queues))} worker(s) on {', '.join(queues)}")
+
+        workers = [None] * len(layout)
+        stopping = False
+
+        def stop(signum, frame):
+            # rqworker finishes its current job on SIGTERM (warm shutdown)
+            nonlocal stopping
+            stopping = True
+            for worker in workers:
+                if worker is not None and worker.poll() is None:
+                    worker.send_signal(signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        while not stopping:
+            for index, queues in enumerate(layout):
+                worker = workers[index]
+                if stopping or (worker is not None and worker.poll() is None):
+                    continue
+                if worker is not None:
+                    self.stderr.write(f"Worker {worker.pid} on {', '.join(queues)} exited with {worker.returncode}; restarting")
+                workers[index] = subprocess.Popen([sys.executable, '-m', 'django', 'rqworker', *queues])
+            time.sleep(RESTART_INTERVAL)
+
+        for worker in workers:
+            if worker is not None:
+                worker.wait()
+        self.stdout.write(self.style.SUCCESS('All workers stopped'))
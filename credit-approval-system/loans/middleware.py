@@ -0,0 +1,94 @@
+import random
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from .admission import admission_class, get_admission_controller
+from .profiling import RequestProfiler, signed_endpoint
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds load on the decision endpoints before it reaches the database:
+    429 when a client exceeds its token-bucket rate, 503 when an endpoint
+    class has no free concurrency slot within the queue wait target
+    """
+
+    def __init__(self, get_response):
+        if not settings.ADMISSION_CONTROL['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.client_header = settings.ADMISSION_CONTROL['CLIENT_IP_HEADER']
+        self.trusted_proxies = settings.ADMISSION_CONTROL['TRUSTED_PROXIES']
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            limiter = getattr(request, '_admission_limiter', None)
+            if limiter is not None:
+                limiter.release()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = admission_class(request)
+        if budget is None:
+            return None
+
+        controller = get_admission_controller()
+        retry_after = controller.check_rate(budget, self._client(request))
+        if retry_after is not None:
+            response = JsonResponse({'error': 'Rate limit exceeded'}, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+
+        limiter = controller.limiters[budget]
+        if not limiter.acquire(controller.queue_timeout):
+            response = JsonResponse({'error': 'Service overloaded, retry shortly'}, status=503)
+            response['Retry-After'] = '1'
+            return response
+        request._admission_limiter = limiter
+        return None
+
+    def _client(self, request):
+        if self.client_header and self.trusted_proxies > 0:
+            # Entries left of the ones our proxies appended are client-supplied
+            # and can be rotated to dodge the rate limit
+            forwarded = [entry.strip() for entry in request.META.get(self.client_header, '').split(',')]
+            if len(forwarded) >= self.trusted_proxies and forwarded[-self.trusted_proxies]:
+                return forwarded[-self.trusted_proxies]
+        return request.META.get('REMOTE_ADDR', '')
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sampled fraction of requests to the endpoints listed in
+    PROFILING['ENDPOINTS'], plus any request carrying a valid signed
+    X-Profile-Token header for its endpoint. Not installed at all unless
+    PROFILING['ENABLED']; otherwise unselected requests cost one branch.
+    Must be the last middleware, as it calls the view itself
+    """
+    HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+    def __init__(self, get_response):
+        config = settings.PROFILING
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config['SAMPLE_RATE']
+        self.endpoints = frozenset(config['ENDPOINTS'])
+        self.token_max_age = config['TOKEN_MAX_AGE']
+        self.profiler = RequestProfiler(config)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        endpoint = request.resolver_match.url_name
+        if not self._selected(request, endpoint):
+            return None
+        return self.profiler.profile(endpoint, view_func, request, view_args, view_kwargs)
+
+    def _selected(self, request, endpoint):
+        token = request.META.get(self.HEADER)
+        if token is not None:
+            return signed_endpoint(token, self.token_max_age) == endpoint
+        return endpoint in self.endpoints and random.random() < self.sample_rate
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:58
+
+from django.db import migrations, models
+
+
+PREFIX_SEARCH_INDEXES = [
+    ('customer_last_name_prefix_idx', 'customer', 'last_name'),
+    ('customer_first_name_prefix_idx', 'customer', 'first_name'),
+]
+
+
+def create_prefix_search_indexes(apps, schema_editor):
+    # Admin '^' searches compile to UPPER(col) LIKE UPPER('term%'), which only
+    # a pattern_ops expression index can serve on non-C collations
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in PREFIX_SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" (UPPER("{column}") varchar_pattern_ops)'
+        )
+
+
+def drop_prefix_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in PREFIX_SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'is_active'], name='loan_customer_active_idx'),
+        ),
+        migrations.RunPython(create_prefix_search_indexes, drop_prefix_search_indexes),
+    ]
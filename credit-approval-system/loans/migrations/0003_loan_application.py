@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0002_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanApplication',
+            fields=[
+                ('application_id', models.AutoField(primary_key=True, serialize=False)),
+                ('customer_id', models.IntegerField()),
+                ('loan_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('tenure', models.PositiveIntegerField()),
+                ('callback_url', models.URLField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('approved', 'Approved'), ('rejected', 'Rejected')], default='pending', max_length=10)),
+                ('message', models.CharField(blank=True, max_length=255)),
+                ('corrected_interest_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('monthly_installment', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('loan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='loans.loan')),
+            ],
+            options={
+                'db_table': 'loan_application',
+                'indexes': [models.Index(fields=['status', 'application_id'], name='loan_app_status_idx')],
+            },
+        ),
+    ]
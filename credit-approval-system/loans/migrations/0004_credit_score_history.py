@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+def create_brin_index(apps, schema_editor):
+    # Rows arrive in computed_at order, so a BRIN index covers time-range scans
+    # of the whole table at a tiny fraction of a btree's size
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS "score_history_computed_brin" '
+        'ON "credit_score_history" USING brin ("computed_at")'
+    )
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS "score_history_computed_brin"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0003_loan_application'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditScoreSnapshot',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('customer_id', models.IntegerField()),
+                ('credit_score', models.FloatField()),
+                ('approved_limit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('monthly_salary', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('current_loans_sum', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('current_emis', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_loan_volume', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('total_emis', models.PositiveIntegerField()),
+                ('paid_on_time', models.PositiveIntegerField()),
+                ('loan_count', models.PositiveIntegerField()),
+                ('current_year_loans', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'credit_score_history',
+                'indexes': [models.Index(fields=['customer_id', 'computed_at'], name='score_history_customer_idx')],
+            },
+        ),
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
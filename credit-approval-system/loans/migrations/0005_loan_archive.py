@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0004_credit_score_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='archived_emis_paid_on_time',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='archived_loan_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='archived_loan_volume',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='archived_tenure_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='loanapplication',
+            name='loan',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='loans.loan'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('loan_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('loan_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tenure', models.PositiveIntegerField()),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('monthly_repayment', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('emis_paid_on_time', models.PositiveIntegerField(default=0)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('is_active', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='loans.customer')),
+            ],
+            options={
+                'db_table': 'loan_archive',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0005_loan_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slot', models.PositiveSmallIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'portfolio_counter',
+                'unique_together': {('name', 'slot')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PortfolioHourlyCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('name', models.CharField(max_length=50)),
+                ('slot', models.PositiveSmallIntegerField(default=0)),
+                ('value', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'portfolio_hourly_counter',
+                'unique_together': {('hour', 'name', 'slot')},
+            },
+        ),
+    ]
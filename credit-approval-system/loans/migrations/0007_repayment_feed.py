@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:22
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_emis_paid(apps, schema_editor):
+    # Until now only on-time EMIs were recorded, and they were the only ones known
+    Loan = apps.get_model('loans', 'Loan')
+    Loan.objects.using(schema_editor.connection.alias).update(emis_paid=F('emis_paid_on_time'))
+
+
+def create_brin_index(apps, schema_editor):
+    # Events are recorded in processed_at order; pruning scans by time range
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS "repayment_event_processed_brin" '
+        'ON "repayment_event" USING brin ("processed_at")'
+    )
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS "repayment_event_processed_brin"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0006_portfolio_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepaymentEvent',
+            fields=[
+                ('event_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('loan_id', models.IntegerField()),
+                ('processed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'repayment_event',
+            },
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='emis_paid',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_emis_paid, migrations.RunPython.noop),
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
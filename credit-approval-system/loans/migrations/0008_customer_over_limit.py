@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0007_repayment_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='over_limit',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0008_customer_over_limit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanOffer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_id', models.IntegerField()),
+                ('tenure', models.PositiveIntegerField()),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('max_loan_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('monthly_installment', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('credit_score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'loan_offer',
+                'unique_together': {('customer_id', 'tenure')},
+            },
+        ),
+    ]
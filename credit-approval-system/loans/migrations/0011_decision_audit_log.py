@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:51
+
+from django.db import migrations, models
+
+
+def partition_by_month(apps, schema_editor):
+    # Recreate the table range-partitioned on decided_at, with a default
+    # partition; create_audit_partitions adds the monthly ones. Partitioned
+    # tables need the partition key in the primary key
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in [
+        'CREATE TABLE "decision_audit_log_partitioned" (LIKE "decision_audit_log" '
+        'INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS) PARTITION BY RANGE ("decided_at")',
+        'DROP TABLE "decision_audit_log"',
+        'ALTER TABLE "decision_audit_log_partitioned" RENAME TO "decision_audit_log"',
+        'ALTER TABLE "decision_audit_log" ADD CONSTRAINT "decision_audit_log_pkey" PRIMARY KEY ("id", "decided_at")',
+        'CREATE INDEX "decision_audit_customer_idx" ON "decision_audit_log" ("customer_id", "decided_at")',
+        'CREATE TABLE "decision_audit_log_default" PARTITION OF "decision_audit_log" DEFAULT',
+    ]:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0010_shard_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DecisionAuditRecord',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('decided_at', models.DateTimeField()),
+                ('source', models.CharField(choices=[('check_eligibility', 'Eligibility check'), ('create_loan', 'Loan creation'), ('loan_application', 'Queued loan application')], max_length=20)),
+                ('customer_id', models.IntegerField()),
+                ('loan_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('tenure', models.PositiveIntegerField()),
+                ('credit_score', models.FloatField(null=True)),
+                ('corrected_interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('monthly_installment', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('approved', models.BooleanField()),
+                ('message', models.CharField(max_length=255)),
+                ('loan_id', models.IntegerField(null=True)),
+                ('min_approval_score', models.PositiveSmallIntegerField()),
+                ('emi_cap_percent', models.PositiveSmallIntegerField()),
+                ('rate_floor_score_above_30', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('rate_floor_score_above_10', models.DecimalField(decimal_places=2, max_digits=5)),
+            ],
+            options={
+                'db_table': 'decision_audit_log',
+                'indexes': [models.Index(fields=['customer_id', 'decided_at'], name='decision_audit_customer_idx')],
+            },
+        ),
+        # Reversing CreateModel drops the table with its partitions
+        migrations.RunPython(partition_by_month, migrations.RunPython.noop),
+    ]
@@ -10,6 +10,13 @@ class Customer(models.Model):
     monthly_salary = models.DecimalField(max_digits=10, decimal_places=2)
     approved_limit = models.DecimalField(max_digits=12, decimal_places=2)
     current_debt = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Lifetime totals of loans moved to the archive, so credit scoring never scans them
+    archived_loan_count = models.PositiveIntegerField(default=0)
+    archived_loan_volume = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    archived_tenure_total = models.PositiveIntegerField(default=0)
+    archived_emis_paid_on_time = models.PositiveIntegerField(default=0)
+    # Set by the salary refresh when active loans exceed the recomputed approved_limit
+    over_limit = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -28,6 +35,8 @@ class Loan(models.Model):
     interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
     monthly_repayment = models.DecimalField(max_digits=10, decimal_places=2)
     emis_paid_on_time = models.PositiveIntegerField(default=0)
+    # All EMIs paid so far, on time or late; kept current by the repayment feed
+    emis_paid = models.PositiveIntegerField(default=0)
     start_date = models.DateField()
     end_date = models.DateField()
     is_active = models.BooleanField(default=True)
@@ -42,7 +51,262 @@ class Loan(models.Model):
         """Calculate remaining EMIs"""
         if not self.is_active:
             return 0
-        return max(0, self.tenure - self.emis_paid_on_time)
+        return max(0, self.tenure - self.emis_paid)
 
     class Meta:
-        db_table = 'loan'
\ No newline at end of file
+        db_table = 'loan'
+        indexes = [
+            models.Index(fields=['customer', 'is_active'], name='loan_customer_active_idx'),
+        ]
+
+
+class ArchivedLoan(models.Model):
+    """
+    A closed loan moved out of the hot loan table, keeping its original loan_id
+    """
+    loan_id = models.IntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_loans')
+    loan_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    tenure = models.PositiveIntegerField()  # in months
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    monthly_repayment = models.DecimalField(max_digits=10, decimal_places=2)
+    emis_paid_on_time = models.PositiveIntegerField(default=0)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    is_active = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived loan {self.loan_id} - customer {self.customer_id}"
+
+    @property
+    def repayments_left(self):
+        return 0
+
+    class Meta:
+        db_table = 'loan_archive'
+
+
+class LoanApplication(models.Model):
+    """
+    A loan request submitted with ?async=1 and decided later by an RQ worker
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    APPROVED = 'approved'
+    REJECTED = 'rejected'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (APPROVED, 'Approved'),
+        (REJECTED, 'Rejected'),
+    ]
+
+    application_id = models.AutoField(primary_key=True)
+    # Not a foreign key: unknown customers are accepted and rejected by the worker
+    customer_id = models.IntegerField()
+    loan_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    tenure = models.PositiveIntegerField()
+    callback_url = models.URLField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    message = models.CharField(max_length=255, blank=True)
+    # No constraint: the loan may later move to the archive under the same id
+    loan = models.ForeignKey(
+        Loan, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    corrected_interest_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    monthly_installment = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Application {self.application_id} - customer {self.customer_id} ({self.status})"
+
+    class Meta:
+        db_table = 'loan_application'
+        indexes = [
+            models.Index(fields=['status', 'application_id'], name='loan_app_status_idx'),
+        ]
+
+
+class CreditScoreSnapshot(models.Model):
+    """
+    Append-only record of every credit score computed for a decision, with
+    the aggregates it was computed from
+    """
+    id = models.BigAutoField(primary_key=True)
+    customer_id = models.IntegerField()
+    credit_score = models.FloatField()
+    approved_limit = models.DecimalField(max_digits=12, decimal_places=2)
+    monthly_salary = models.DecimalField(max_digits=10, decimal_places=2)
+    current_loans_sum = models.DecimalField(max_digits=14, decimal_places=2)
+    current_emis = models.DecimalField(max_digits=12, decimal_places=2)
+    total_loan_volume = models.DecimalField(max_digits=14, decimal_places=2)
+    total_emis = models.PositiveIntegerField()
+    paid_on_time = models.PositiveIntegerField()
+    loan_count = models.PositiveIntegerField()
+    current_year_loans = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Score {self.credit_score} for customer {self.customer_id} at {self.computed_at}"
+
+    class Meta:
+        db_table = 'credit_score_history'
+        indexes = [
+            models.Index(fields=['customer_id', 'computed_at'], name='score_history_customer_idx'),
+        ]
+
+
+class DecisionAuditRecord(models.Model):
+    """
+    Append-only record of every eligibility decision: the request, the score
+    and terms it produced, and the rule thresholds in force. On Postgres the
+    table is range-partitioned by month on decided_at (see loans/audit.py)
+    """
+    CHECK_ELIGIBILITY = 'check_eligibility'
+    CREATE_LOAN = 'create_loan'
+    LOAN_APPLICATION = 'loan_application'
+    SOURCE_CHOICES = [
+        (CHECK_ELIGIBILITY, 'Eligibility check'),
+        (CREATE_LOAN, 'Loan creation'),
+        (LOAN_APPLICATION, 'Queued loan application'),
+    ]
+
+    # Unique, but the primary key on Postgres is (id, decided_at) as
+    # partitioned tables require
+    id = models.BigAutoField(primary_key=True)
+    decided_at = models.DateTimeField()
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    customer_id = models.IntegerField()
+    loan_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    tenure = models.PositiveIntegerField()
+    # Null when the customer was not found
+    credit_score = models.FloatField(null=True)
+    corrected_interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    monthly_installment = models.DecimalField(max_digits=10, decimal_places=2)
+    approved = models.BooleanField()
+    message = models.CharField(max_length=255)
+    # Set when a loan was created; it may later move to the archive
+    loan_id = models.IntegerField(null=True)
+    min_approval_score = models.PositiveSmallIntegerField()
+    emi_cap_percent = models.PositiveSmallIntegerField()
+    rate_floor_score_above_30 = models.DecimalField(max_digits=5, decimal_places=2)
+    rate_floor_score_above_10 = models.DecimalField(max_digits=5, decimal_places=2)
+
+    def __str__(self):
+        outcome = 'approved' if self.approved else 'rejected'
+        return f"Decision for customer {self.customer_id} at {self.decided_at} ({outcome})"
+
+    class Meta:
+        db_table = 'decision_audit_log'
+        indexes = [
+            models.Index(fields=['customer_id', 'decided_at'], name='decision_audit_customer_idx'),
+        ]
+
+
+class PortfolioCounter(models.Model):
+    """
+    A portfolio-wide total (exposure, active loans, borrowers per EMI burden
+    band) maintained incrementally as loans open and close. Each total is
+    striped over slots, so concurrent loan writes rarely update the same
+    row; the total is the sum of its slots
+    """
+    name = models.CharField(max_length=50)
+    slot = models.PositiveSmallIntegerField(default=0)
+    # A slot can go negative when loans close on a different slot than they opened on
+    value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}[{self.slot}] = {self.value}"
+
+    class Meta:
+        db_table = 'portfolio_counter'
+        unique_together = [('name', 'slot')]
+
+
+class PortfolioHourlyCounter(models.Model):
+    """
+    Loan decisions per hour: approvals, rejections and score bands, striped
+    over slots like PortfolioCounter
+    """
+    hour = models.DateTimeField()
+    name = models.CharField(max_length=50)
+    slot = models.PositiveSmallIntegerField(default=0)
+    value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}[{self.slot}] at {self.hour} = {self.value}"
+
+    class Meta:
+        db_table = 'portfolio_hourly_counter'
+        unique_together = [('hour', 'name', 'slot')]
+
+
+class RepaymentEvent(models.Model):
+    """
+    ID of an EMI repayment event already applied, so replayed feeds are no-ops
+    """
+    event_id = models.CharField(max_length=64, primary_key=True)
+    loan_id = models.IntegerField()
+    processed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Repayment {self.event_id} for loan {self.loan_id}"
+
+    class Meta:
+        db_table = 'repayment_event'
+
+
+class LoanOffer(models.Model):
+    """
+    Largest loan a customer would be approved for at one standard tenure,
+    precomputed for /offers/ and dropped whenever the customer's loans or
+    salary change
+    """
+    customer_id = models.IntegerField()
+    tenure = models.PositiveIntegerField()
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    max_loan_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    monthly_installment = models.DecimalField(max_digits=10, decimal_places=2)
+    credit_score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Offer of {self.max_loan_amount} over {self.tenure} months for customer {self.customer_id}"
+
+    @classmethod
+    def invalidate(cls, customer_ids):
+        """
+        Drop the offers of customers whose loans or salary changed; they are
+        recomputed on the next read or offer refresh
+        """
+        customer_ids = list(customer_ids)
+        # Split so SQLite stays under its bound-parameter limit
+        for start in range(0, len(customer_ids), 900):
+            cls.objects.filter(customer_id__in=customer_ids[start:start + 900]).delete()
+
+    class Meta:
+        db_table = 'loan_offer'
+        unique_together = [('customer_id', 'tenure')]
+
+
+class ShardSequence(models.Model):
+    """
+    Next unreserved value of one model's ID sequence on one shard. Lives on
+    the primary, so reserving IDs never joins a shard transaction
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} at {self.next_value}"
+
+    class Meta:
+        db_table = 'shard_sequence'
@@ -0,0 +1,167 @@
+"""
+Exact money arithmetic in integer paise and integer basis points (1% = 100 bp)
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+PAISE_PER_RUPEE = 100
+BASIS_POINTS_PER_PERCENT = 100
+# Monthly rate r = bp / (12 months * 100 percent * 100 bp)
+MONTHLY_RATE_DENOMINATOR = 12 * 100 * BASIS_POINTS_PER_PERCENT
+
+# Score-based minimum rates, in basis points
+RATE_FLOOR_SCORE_ABOVE_30 = 1200
+RATE_FLOOR_SCORE_ABOVE_10 = 1600
+
+# Loans are rejected at or below this credit score, or when total EMIs would
+# exceed this share of the monthly salary
+MIN_APPROVAL_SCORE = 10
+EMI_CAP_PERCENT = 50
+
+# Bits of the cached fixed-point EMI factor; see emi_paise()
+FIXED_POINT_BITS = 128
+
+
+def _round_half_up(numerator, denominator):
+    # Integer division rounding halves away from zero (all inputs are non-negative)
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def _to_minor_units(value, units):
+    if isinstance(value, int):
+        return value * units
+    if isinstance(value, float):
+        value = Decimal(str(value))
+    # Exact for any Decimal; DB and serializer values have at most two places
+    numerator, denominator = value.as_integer_ratio()
+    if units % denominator == 0:
+        return numerator * (units // denominator)
+    return int((value * units).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def to_paise(amount):
+    """
+    Convert a rupee amount (Decimal, int, str or float) to integer paise
+    """
+    if isinstance(amount, str):
+        amount = Decimal(amount)
+    return _to_minor_units(amount, PAISE_PER_RUPEE)
+
+
+def from_paise(paise):
+    """
+    Convert integer paise to a two-place rupee Decimal
+    """
+    return Decimal(paise).scaleb(-2)
+
+
+def to_basis_points(rate):
+    """
+    Convert an annual percentage rate (e.g. Decimal('12.50')) to basis points
+    """
+    if isinstance(rate, str):
+        rate = Decimal(rate)
+    return _to_minor_units(rate, BASIS_POINTS_PER_PERCENT)
+
+
+def from_basis_points(rate_bp):
+    """
+    Convert basis points to a two-place percentage Decimal
+    """
+    return Decimal(rate_bp).scaleb(-2)
+
+
+@lru_cache(maxsize=4096)
+def _emi_factor(rate_bp, tenure_months):
+    # With A = D + bp and B = D (D = MONTHLY_RATE_DENOMINATOR), (1 + r)^n = A^n / B^n,
+    # so EMI = P * r * (1 + r)^n / ((1 + r)^n - 1) = P * bp * A^n / (D * (A^n - B^n))
+    growth = (MONTHLY_RATE_DENOMINATOR + rate_bp) ** tenure_months
+    base = MONTHLY_RATE_DENOMINATOR ** tenure_months
+    numerator = rate_bp * growth
+    denominator = MONTHLY_RATE_DENOMINATOR * (growth - base)
+    return numerator, denominator, (numerator << FIXED_POINT_BITS) // denominator
+
+
+def emi_paise(principal_paise, rate_bp, tenure_months):
+    """
+    Monthly installment in paise, rounded half up from the exact value of
+    EMI = P * r * (1 + r)^n / ((1 + r)^n - 1)
+    """
+    if rate_bp == 0:
+        return _round_half_up(principal_paise, tenure_months)
+    numerator, denominator, fixed_factor = _emi_factor(rate_bp, tenure_months)
+
+    # fixed_factor is the exact factor scaled by 2^BITS and floored, so the exact
+    # scaled EMI lies in [P * fixed_factor, P * fixed_factor + P). When both ends
+    # round to the same paise that is the answer; otherwise (a near-tie) fall
+    # back to exact big-integer division
+    scaled = principal_paise * fixed_factor
+    half = 1 << (FIXED_POINT_BITS - 1)
+    low = (scaled + half) >> FIXED_POINT_BITS
+    if low == (scaled + principal_paise + half) >> FIXED_POINT_BITS:
+        return low
+    return _round_half_up(principal_paise * numerator, denominator)
+
+
+def max_principal_paise(installment_paise, rate_bp, tenure_months):
+    """
+    Largest principal whose emi_paise() does not exceed installment_paise,
+    i.e. the EMI formula inverted exactly
+    """
+    if installment_paise < 0:
+        return 0
+    # emi_paise() <= I  <=>  P * num / den < I + 1/2  <=>  2 * P * num < den * (2I + 1)
+    if rate_bp == 0:
+        return (tenure_months * (2 * installment_paise + 1) - 1) // 2
+    numerator, denominator, _ = _emi_factor(rate_bp, tenure_months)
+    return (denominator * (2 * installment_paise + 1) - 1) // (2 * numerator)
+
+
+def max_principals_paise(installments_paise, rate_bp, tenure_months):
+    """
+    max_principal_paise() of each installment cap, sharing one factor lookup
+    """
+    if rate_bp == 0:
+        return [max_principal_paise(installment, 0, tenure_months) for installment in installments_paise]
+    numerator, denominator, _ = _emi_factor(rate_bp, tenure_months)
+    return [
+        (denominator * (2 * installment + 1) - 1) // (2 * numerator) if installment >= 0 else 0
+        for installment in installments_paise
+    ]
+
+
+def outstanding_paise(principal_paise, rate_bp, installment_paise, payments):
+    """
+    Principal still owed after a number of installments, rounded half up:
+    B_k = P * (1 + r)^k - EMI * ((1 + r)^k - 1) / r, floored at zero
+    """
+    if rate_bp == 0:
+        return max(0, principal_paise - installment_paise * payments)
+    # Same integer form as _emi_factor(): (1 + r)^k = A^k / D^k
+    growth = (MONTHLY_RATE_DENOMINATOR + rate_bp) ** payments
+    base = MONTHLY_RATE_DENOMINATOR ** payments
+    numerator = principal_paise * growth * rate_bp - installment_paise * (growth - base) * MONTHLY_RATE_DENOMINATOR
+    if numerator <= 0:
+        return 0
+    return _round_half_up(numerator, base * rate_bp)
+
+
+def corrected_rate_bp(credit_score, rate_bp):
+    """
+    Apply the score-based minimum rates to a rate in basis points
+    """
+    if credit_score > 50:
+        return rate_bp
+    elif credit_score > 30:
+        return max(RATE_FLOOR_SCORE_ABOVE_30, rate_bp)
+    elif credit_score > 10:
+        return max(RATE_FLOOR_SCORE_ABOVE_10, rate_bp)
+    else:
+        return rate_bp
+
+
+def within_emi_cap(total_emis_paise, monthly_salary_paise):
+    """
+    Whether total monthly EMIs stay within EMI_CAP_PERCENT of the monthly salary
+    """
+    return 100 * total_emis_paise <= EMI_CAP_PERCENT * monthly_salary_paise
@@ -0,0 +1,135 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import Customer, LoanOffer
+from .money import (
+    PAISE_PER_RUPEE, to_paise, from_paise, to_basis_points, from_basis_points,
+    emi_paise, max_principals_paise, corrected_rate_bp, MIN_APPROVAL_SCORE, EMI_CAP_PERCENT
+)
+from .sharding import db_alias, on_shard, shard_aliases
+from .utils import credit_score_aggregates, credit_score_from_stats, customer_loan_stats
+from .validators import MAX_LOAN_AMOUNT
+
+
+def compute_offer_batch(rows, now):
+    """
+    Unsaved LoanOffer rows, one per OFFER_TENURES entry for each row of
+    customer_id, approved_limit, monthly_salary and precomputed
+    credit_score_aggregates() values. Each is the largest whole-rupee amount
+    decide_loan() approves at the base rate after the score-based floors:
+    its EMI fits under the EMI_CAP_PERCENT salary cap next to the current EMIs, and it
+    stays within what is left of approved_limit and the MAX_LOAN_AMOUNT the
+    create path accepts. Ineligible customers get zero amounts, which are no
+    offer (the create path requires more than zero).
+
+    Customers are scored in one pass, then grouped by corrected rate, so each
+    (rate, tenure) EMI factor is looked up once for the whole batch
+    """
+    base_rate_bp = to_basis_points(settings.OFFER_BASE_INTEREST_RATE)
+    max_amount = to_paise(MAX_LOAN_AMOUNT)
+    by_rate = defaultdict(list)
+    for row in rows:
+        credit_score = credit_score_from_stats(row, row['approved_limit'], row['monthly_salary'])
+        # Largest installment within_emi_cap() still accepts next to the current EMIs
+        emi_headroom = to_paise(row['monthly_salary']) * EMI_CAP_PERCENT // 100 - to_paise(row['current_emis'] or 0)
+        limit_headroom = min(to_paise(row['approved_limit']) - to_paise(row['current_loans_sum'] or 0), max_amount)
+        by_rate[corrected_rate_bp(credit_score, base_rate_bp)].append(
+            (row['customer_id'], credit_score, emi_headroom, limit_headroom)
+        )
+
+    offers = []
+    for rate_bp, customers in by_rate.items():
+        interest_rate = from_basis_points(rate_bp)
+        for tenure in settings.OFFER_TENURES:
+            principals = max_principals_paise([customer[2] for customer in customers], rate_bp, tenure)
+            for (customer_id, credit_score, _, limit_headroom), principal in zip(customers, principals):
+                if credit_score > MIN_APPROVAL_SCORE:
+                    principal = min(principal, limit_headroom)
+                    principal = max(0, principal - principal % PAISE_PER_RUPEE)
+                else:
+                    principal = 0
+                offers.append(LoanOffer(
+                    customer_id=customer_id,
+                    tenure=tenure,
+                    interest_rate=interest_rate,
+                    max_loan_amount=from_paise(principal),
+                    monthly_installment=from_paise(emi_paise(principal, rate_bp, tenure)),
+                    credit_score=credit_score,
+                    computed_at=now,
+                ))
+    return offers
+
+
+def compute_offers(customer_id, loan_stats, approved_limit, monthly_salary, now):
+    """
+    compute_offer_batch() for one customer, in tenure order
+    """
+    row = {**loan_stats, 'customer_id': customer_id, 'approved_limit': approved_limit, 'monthly_salary': monthly_salary}
+    return sorted(compute_offer_batch([row], now), key=lambda offer: offer.tenure)
+
+
+def _store(offers, customer_ids):
+    with transaction.atomic(using=db_alias()):
+        LoanOffer.invalidate(customer_ids)
+        # A concurrent refresh of the same customer computed the same rows
+        LoanOffer.objects.bulk_create(offers, ignore_conflicts=True)
+
+
+def current_offers(customer_id):
+    """
+    Compute one customer's offers without storing them, e.g. for a read
+    after they were invalidated. Returns None if the customer does not exist
+    """
+    customer = Customer.objects.filter(customer_id=customer_id).first()
+    if customer is None:
+        return None
+    return compute_offers(
+        customer_id, customer_loan_stats(customer), customer.approved_limit, customer.monthly_salary,
+        timezone.now()
+    )
+
+
+def refresh_customer_offers(customer_id):
+    """
+    Compute and store one customer's offers. Returns them, or None if the
+    customer does not exist
+    """
+    offers = current_offers(customer_id)
+    if offers is not None:
+        _store(offers, [customer_id])
+    return offers
+
+
+def refresh_offers(all_customers=False, batch_size=None):
+    """
+    Batch job computing offers from one aggregate query streamed over the
+    customer table: by default only for customers without offers (new, or
+    invalidated since the last run), or for everyone, e.g. nightly so the
+    current-year score component and rate settings are picked up. Returns
+    the number of customers refreshed. Shards are refreshed one after another
+    """
+    batch_size = batch_size or settings.OFFER_REFRESH_BATCH_SIZE
+    aggregates = credit_score_aggregates(prefix='loans__', include_archived=True)
+    customers = Customer.objects.order_by().annotate(**aggregates).values(
+        'customer_id', 'approved_limit', 'monthly_salary', *aggregates.keys()
+    )
+    if not all_customers:
+        customers = customers.filter(~Exists(LoanOffer.objects.filter(customer_id=OuterRef('pk'))))
+
+    now = timezone.now()
+    refreshed = 0
+    for alias in shard_aliases():
+        with on_shard(alias):
+            rows = []
+            for row in customers.iterator(chunk_size=batch_size):
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    _store(compute_offer_batch(rows, now), [row['customer_id'] for row in rows])
+                    refreshed += len(rows)
+                    rows = []
+            if rows:
+                _store(compute_offer_batch(rows, now), [row['customer_id'] for row in rows])
+                refreshed += len(rows)
+    return refreshed
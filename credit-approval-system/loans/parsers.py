@@ -0,0 +1,17 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from .renderers import unpackb
+
+
+class MessagePackParser(BaseParser):
+    """
+    MessagePack request bodies (Content-Type: application/msgpack), decoded
+    like MessagePackRenderer encodes them
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return unpackb(stream.read())
+        except Exception as exc:
+            raise ParseError(f'MessagePack parse error - {str(exc) or type(exc).__name__}')
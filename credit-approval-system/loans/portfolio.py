@@ -0,0 +1,263 @@
+import random
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum, Count, Q, QuerySet
+from django.utils import timezone
+from .models import Customer, Loan, LoanOffer, PortfolioCounter, PortfolioHourlyCounter
+from .routers import read_from_replica
+from .sharding import db_alias, on_shard, shard_aliases
+
+# Upper bounds (percent of monthly salary) of the EMI burden bands
+EMI_BURDEN_BANDS = [(10, '0-10'), (20, '10-20'), (30, '20-30'), (40, '30-40'), (50, '40-50')]
+EMI_BURDEN_OVERFLOW = '50+'
+# Credit score bands matching the approval and rate correction rules
+SCORE_BANDS = [(10, '0-10'), (30, '11-30'), (50, '31-50'), (100, '51-100')]
+
+STATS_CACHE_KEY = 'loans:portfolio-stats'
+STATS_HOURS = 24
+# Loans closed per transaction by close_loans()
+CLOSE_BATCH_SIZE = 1000
+
+_stripe = threading.local()
+
+
+def emi_burden_band(emis, monthly_salary):
+    """
+    EMI burden band of a borrower, or None without active EMIs
+    """
+    if not emis:
+        return None
+    if not monthly_salary:
+        return EMI_BURDEN_OVERFLOW
+    burden = Decimal(emis) * 100 / Decimal(monthly_salary)
+    for upper, band in EMI_BURDEN_BANDS:
+        if burden < upper:
+            return band
+    return EMI_BURDEN_OVERFLOW
+
+
+def score_band(credit_score):
+    for upper, band in SCORE_BANDS:
+        if credit_score <= upper:
+            return band
+    return SCORE_BANDS[-1][1]
+
+
+def _burden_deltas(deltas, monthly_salary, emis_before, emis_after):
+    band_before = emi_burden_band(emis_before, monthly_salary)
+    band_after = emi_burden_band(emis_after, monthly_salary)
+    if band_before != band_after:
+        if band_before:
+            deltas[f'emi_burden:{band_before}'] -= 1
+        if band_after:
+            deltas[f'emi_burden:{band_after}'] += 1
+
+
+def counter_slot():
+    """
+    Counter slot this thread writes: picked at random once per thread, so
+    every counter row a transaction locks is in the same slot and two
+    threads only contend when they share one
+    """
+    slot = getattr(_stripe, 'slot', None)
+    if slot is None or slot >= settings.PORTFOLIO_COUNTER_STRIPES:
+        slot = _stripe.slot = random.randrange(max(1, settings.PORTFOLIO_COUNTER_STRIPES))
+    return slot
+
+
+def _apply(model, deltas, **lookup):
+    """
+    Add deltas to this thread's slot of each counter in one transaction.
+    Counters are updated in name order so writers sharing a slot always lock
+    rows in the same order
+    """
+    slot = counter_slot()
+    # No savepoint when nested: a failure here fails the enclosing loan write too
+    with transaction.atomic(using=db_alias(), savepoint=False):
+        for name in sorted(deltas):
+            delta = deltas[name]
+            if not delta:
+                continue
+            counters = model.objects.filter(name=name, slot=slot, **lookup)
+            if not counters.update(value=F('value') + delta):
+                model.objects.bulk_create([model(name=name, slot=slot, **lookup)], ignore_conflicts=True)
+                counters.update(value=F('value') + delta)
+
+
+def record_opened_loan(loan, monthly_salary, emis_before):
+    """
+    Count a new active loan. Call in the transaction that creates it
+    """
+    deltas = defaultdict(Decimal)
+    deltas['active_loans'] += 1
+    deltas['exposure'] += Decimal(loan.loan_amount)
+    deltas['monthly_emis'] += Decimal(loan.monthly_repayment)
+    emis_before = Decimal(emis_before or 0)
+    _burden_deltas(deltas, monthly_salary, emis_before, emis_before + Decimal(loan.monthly_repayment))
+    _apply(PortfolioCounter, deltas)
+
+
+def _close_loan_batch(loans, batch_size):
+    with transaction.atomic(using=db_alias()):
+        batch = list(
+            loans.filter(is_active=True).select_for_update().order_by('loan_id')
+            .values('loan_id', 'customer_id', 'loan_amount', 'monthly_repayment')[:batch_size]
+        )
+        if not batch:
+            return 0
+        customer_ids = {loan['customer_id'] for loan in batch}
+        customers = Customer.objects.filter(customer_id__in=customer_ids).annotate(
+            emis=Sum('loans__monthly_repayment', filter=Q(loans__is_active=True))
+        ).values_list('customer_id', 'monthly_salary', 'emis')
+
+        deltas = defaultdict(Decimal)
+        closed_emis = defaultdict(Decimal)
+        for loan in batch:
+            deltas['active_loans'] -= 1
+            deltas['exposure'] -= loan['loan_amount']
+            deltas['monthly_emis'] -= loan['monthly_repayment']
+            closed_emis[loan['customer_id']] += loan['monthly_repayment']
+        for customer_id, monthly_salary, emis in customers:
+            _burden_deltas(deltas, monthly_salary, emis, (emis or 0) - closed_emis[customer_id])
+
+        now = timezone.now()
+        Loan.objects.filter(loan_id__in=[loan['loan_id'] for loan in batch]).update(
+            is_active=False, updated_at=now
+        )
+        # Their exported credit scores change with the active loans
+        Customer.objects.filter(customer_id__in=customer_ids).update(updated_at=now)
+        _apply(PortfolioCounter, deltas)
+        LoanOffer.invalidate(customer_ids)
+    return len(batch)
+
+
+def close_loans(loans, batch_size=CLOSE_BATCH_SIZE):
+    """
+    Deactivate loans (a Loan queryset, or loan IDs) and take them out of the
+    portfolio counters, batch_size at a time with one transaction each, so
+    neither the loans nor their IDs are ever all in memory. Returns the
+    number of loans closed
+    """
+    if isinstance(loans, QuerySet):
+        # As a subquery, which also sheds the caller's DISTINCT (not allowed with FOR UPDATE)
+        loans = Loan.objects.filter(loan_id__in=loans.values('loan_id'))
+    else:
+        loans = Loan.objects.filter(loan_id__in=list(loans))
+    closed = 0
+    while True:
+        count = _close_loan_batch(loans, batch_size)
+        closed += count
+        if count < batch_size:
+            return closed
+
+
+def record_salary_changes(changes):
+    """
+    Move borrowers between EMI burden bands after salary changes, given
+    (current EMIs, salary before, salary after) per customer. Call in the
+    transaction that changes the salaries
+    """
+    deltas = defaultdict(Decimal)
+    for emis, salary_before, salary_after in changes:
+        band_before = emi_burden_band(emis, salary_before)
+        band_after = emi_burden_band(emis, salary_after)
+        if band_before != band_after:
+            deltas[f'emi_burden:{band_before}'] -= 1
+            deltas[f'emi_burden:{band_after}'] += 1
+    _apply(PortfolioCounter, deltas)
+
+
+def record_loan_decision(approved, credit_score=None):
+    """
+    Count a create-loan decision in the current hour's counters
+    """
+    deltas = {'approved' if approved else 'rejected': 1}
+    if credit_score is not None:
+        deltas[f'score_band:{score_band(credit_score)}'] = 1
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    _apply(PortfolioHourlyCounter, deltas, hour=hour)
+
+
+def _rebuild_shard_counters():
+    totals = Loan.objects.filter(is_active=True).aggregate(
+        active_loans=Count('loan_id'), exposure=Sum('loan_amount'), monthly_emis=Sum('monthly_repayment')
+    )
+    values = {name: value or 0 for name, value in totals.items()}
+    borrowers = Customer.objects.filter(loans__is_active=True).annotate(
+        emis=Sum('loans__monthly_repayment', filter=Q(loans__is_active=True))
+    ).values_list('monthly_salary', 'emis')
+    for monthly_salary, emis in borrowers.iterator(chunk_size=5000):
+        name = f'emi_burden:{emi_burden_band(emis, monthly_salary)}'
+        values[name] = values.get(name, 0) + 1
+
+    with transaction.atomic(using=db_alias()):
+        # Every slot is dropped and the totals start over in slot 0
+        PortfolioCounter.objects.all().delete()
+        PortfolioCounter.objects.bulk_create(
+            [PortfolioCounter(name=name, slot=0, value=value) for name, value in values.items()]
+        )
+    return values
+
+
+def rebuild_portfolio_counters():
+    """
+    Recompute the portfolio counters from the loan table, e.g. after a bulk
+    ingestion or to initialise them for existing data. Each shard keeps
+    counters for its own loans; the totals are returned. Hourly decision
+    counters are history and are left alone
+    """
+    values = {}
+    for alias in shard_aliases():
+        with on_shard(alias):
+            for name, value in _rebuild_shard_counters().items():
+                values[name] = values.get(name, 0) + value
+    cache.delete(STATS_CACHE_KEY)
+    return values
+
+
+def portfolio_stats():
+    """
+    Dashboard numbers read from the counters (two small queries per shard,
+    summing every slot of every counter), shared through the cache for
+    PORTFOLIO_STATS_CACHE_SECONDS
+    """
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is not None:
+        return stats
+
+    since = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=STATS_HOURS - 1)
+    counters = {}
+    hourly = []
+    for alias in shard_aliases():
+        with on_shard(alias), read_from_replica():
+            for name, value in PortfolioCounter.objects.values_list('name', 'value'):
+                counters[name] = counters.get(name, 0) + value
+            hourly += PortfolioHourlyCounter.objects.filter(hour__gte=since).values_list('hour', 'name', 'value')
+    hourly.sort(key=lambda row: row[0])
+
+    decisions = {}
+    score_bands = {band: 0 for _, band in SCORE_BANDS}
+    for hour, name, value in hourly:
+        if name.startswith('score_band:'):
+            score_bands[name.split(':', 1)[1]] += value
+            continue
+        decisions.setdefault(hour, {'hour': hour, 'approved': 0, 'rejected': 0})[name] += value
+
+    bands = [band for _, band in EMI_BURDEN_BANDS] + [EMI_BURDEN_OVERFLOW]
+    stats = {
+        # Numbers, not the strings Decimals render as
+        'total_exposure': float(counters.get('exposure', 0)),
+        'active_loans': int(counters.get('active_loans', 0)),
+        'monthly_emis': float(counters.get('monthly_emis', 0)),
+        'emi_burden_distribution': {band: int(counters.get(f'emi_burden:{band}', 0)) for band in bands},
+        'decisions_per_hour': list(decisions.values()),
+        'score_bands_last_24h': score_bands,
+        'generated_at': timezone.now(),
+    }
+    cache.set(STATS_CACHE_KEY, stats, settings.PORTFOLIO_STATS_CACHE_SECONDS)
+    return stats
@@ -0,0 +1,172 @@
+import atexit
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from django.core import signing
+
+SIGNING_SALT = 'loans.profiling'
+PROFILE_MODES = ('cprofile', 'sampling')
+
+
+def sign_profile_request(endpoint):
+    """
+    Token for the profiling header that profiles requests to one endpoint
+    (a URL name) until it expires
+    """
+    return signing.dumps({'endpoint': endpoint}, salt=SIGNING_SALT)
+
+
+def signed_endpoint(token, max_age):
+    """
+    URL name a profiling header token was signed for, or None if it is
+    invalid or expired
+    """
+    try:
+        return signing.loads(token, salt=SIGNING_SALT, max_age=max_age)['endpoint']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def _render(view_func, request, args, kwargs):
+    # Render inside the profile so DRF serialization and JSON encoding are included
+    response = view_func(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response.render()
+    return response
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Statistical profiler: a background thread records the stacks of the
+    request threads registered with it every interval seconds
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self, thread_id):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+            self._threads[thread_id] = Counter()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._threads.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._threads.items():
+                    frame = frames.get(thread_id)
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if labels:
+                        stacks[';'.join(reversed(labels))] += 1
+
+
+class RequestProfiler:
+    """
+    Profiles requests and aggregates the results per endpoint, dumping them
+    to OUTPUT_DIR every DUMP_EVERY profiled requests and at exit: pstats
+    files in cprofile mode, collapsed stacks (flamegraph.pl / speedscope
+    input) in sampling mode
+    """
+
+    def __init__(self, config):
+        self.mode = config['MODE']
+        if self.mode not in PROFILE_MODES:
+            raise ValueError(f"Unsupported profiling mode: {self.mode}")
+        self.output_dir = config['OUTPUT_DIR']
+        self.dump_every = config['DUMP_EVERY']
+        self.sampler = StackSampler(config['SAMPLE_INTERVAL_MS'] / 1000)
+        self._stats = {}
+        self._profiled = Counter()
+        self._lock = threading.Lock()
+        # cProfile can only run on one thread at a time on newer Pythons, and
+        # one profiled request at a time keeps the overhead bounded anyway
+        self._busy = threading.Lock()
+        atexit.register(self.dump)
+
+    def profile(self, endpoint, view_func, request, args, kwargs):
+        """
+        Call the view under the profiler, or plainly if another request is
+        being profiled
+        """
+        if not self._busy.acquire(blocking=False):
+            return _render(view_func, request, args, kwargs)
+        try:
+            if self.mode == 'cprofile':
+                profiler = cProfile.Profile()
+                try:
+                    return profiler.runcall(_render, view_func, request, args, kwargs)
+                finally:
+                    self._add(endpoint, profiler)
+            thread_id = threading.get_ident()
+            self.sampler.start(thread_id)
+            try:
+                return _render(view_func, request, args, kwargs)
+            finally:
+                self._add(endpoint, self.sampler.stop(thread_id))
+        finally:
+            self._busy.release()
+
+    def _add(self, endpoint, result):
+        with self._lock:
+            if self.mode == 'cprofile':
+                if endpoint in self._stats:
+                    self._stats[endpoint].add(result)
+                else:
+                    self._stats[endpoint] = pstats.Stats(result)
+            else:
+                self._stats.setdefault(endpoint, Counter()).update(result)
+            self._profiled[endpoint] += 1
+            dump = self._profiled[endpoint] % self.dump_every == 0
+        if dump:
+            self.dump(endpoint)
+
+    def dump(self, endpoint=None):
+        """
+        Write the aggregated results so far, one file per endpoint and process
+        """
+        with self._lock:
+            endpoints = [endpoint] if endpoint else list(self._stats)
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                for name in endpoints:
+                    self._write(name, self._stats[name])
+            except Exception as e:
+                logging.error(f"Failed to write profiles to {self.output_dir}: {str(e)}")
+
+    def _write(self, endpoint, result):
+        extension = 'prof' if self.mode == 'cprofile' else 'collapsed'
+        path = os.path.join(self.output_dir, f"{endpoint}-{os.getpid()}.{extension}")
+        partial = f"{path}.tmp"
+        if self.mode == 'cprofile':
+            result.dump_stats(partial)
+        else:
+            with open(partial, 'w') as output:
+                for stack, count in result.most_common():
+                    output.write(f"{stack} {count}\n")
+        # Readers never see a half-written file
+        os.replace(partial, path)
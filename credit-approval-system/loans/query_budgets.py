@@ -0,0 +1,281 @@
+"""
+Query and time budgets for every endpoint in loans/urls.py, and the
+harness that checks them against customers with growing loan books. Run by
+`manage.py check_query_budgets` and by the test suite
+"""
+import logging
+import statistics
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from .models import Customer, Loan, LoanApplication
+from .urls import urlpatterns
+
+# Loans per seeded customer
+LOAN_COUNTS = (0, 1, 10, 1000)
+
+# Most queries (including BEGIN/COMMIT/SAVEPOINT statements) and median
+# milliseconds one request may take, for any loan count; queries_<vendor>
+# overrides the query budget on that database. Raising a query budget should
+# be a deliberate, reviewed change
+QUERY_BUDGETS = {
+    'dashboard': {'queries': 0, 'ms': 100},
+    'api_docs': {'queries': 0, 'ms': 100},
+    'api_documentation': {'queries': 0, 'ms': 100},
+    'register_customer': {'queries': 1, 'ms': 100},
+    # customer, loan aggregates, score history and decision audit inserts in
+    # their own transactions (buffered off the request outside this harness)
+    'check_eligibility': {'queries': 8, 'ms': 150},
+    # one transaction locking the customer, then eligibility as above (the
+    # aggregates carry the current EMIs), insert, debt update, portfolio
+    # counters (a counter seen for the first time costs two more) and offer
+    # invalidation; then the score history insert in its own transaction,
+    # one for the hourly decision counters, and the decision audit insert
+    'create_loan': {'queries': 25, 'ms': 250},
+    'view_loan_application': {'queries': 1, 'ms': 100},
+    # version check, loan joined to customer
+    'view_loan': {'queries': 2, 'ms': 100},
+    # one IN query joined to customer (the archive is only asked for misses)
+    'bulk_view_loans': {'queries': 1, 'ms': 500},
+    'bulk_view_customers': {'queries': 1, 'ms': 100},
+    # version check, customer, active loans
+    'view_customer_loans': {'queries': 3, 'ms': 250},
+    'view_score_history': {'queries': 1, 'ms': 100},
+    # session and user lookups, then one read of the (customer_id, decided_at) index
+    'view_decision_audit': {'queries': 3, 'ms': 100},
+    # one indexed read of the precomputed rows (a read after an invalidation
+    # also reads the customer and loan aggregates, and queues a job storing them)
+    'view_offers': {'queries': 1, 'ms': 100},
+    'portfolio_stats': {'queries': 2, 'ms': 100},
+    # session, user, then one transaction: replay check, loans, event insert,
+    # loan update, customers read, debt update and offer invalidation (fewer
+    # for unknown loans)
+    'process_repayments': {'queries': 11, 'ms': 150},
+    # session, user, then one transaction: customer lock, EMI sums, salary,
+    # limit, flag and offer invalidation, and the burden band counters it moves
+    'refresh_salaries': {'queries': 12, 'ms': 150},
+    # session and user lookups for the admin check
+    'metrics': {'queries': 2, 'ms': 100},
+    # session, user, snapshot transaction around one streamed query; Postgres
+    # also sets the isolation level
+    'export_snapshot': {'queries': 5, 'queries_postgresql': 6, 'ms': 1000},
+}
+
+# Keep the run self-contained and deterministic: no Redis, no cached
+# responses, score history and decision audit written synchronously
+HARNESS_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    'RESPONSE_CACHE_SECONDS': 0,
+    'PORTFOLIO_STATS_CACHE_SECONDS': 0,
+    'SCORE_HISTORY_FLUSH_SECONDS': 0,
+    'DECISION_AUDIT_FLUSH_SECONDS': 0,
+}
+
+
+def seed_customers(loan_counts=LOAN_COUNTS):
+    """
+    One customer per loan count. Most loans are closed, so the customers
+    stay eligible and create_loan exercises its approval path
+    """
+    today = date.today()
+    customers = {}
+    for index, loan_count in enumerate(loan_counts):
+        customer = Customer.objects.create(
+            first_name='Budget', last_name=str(loan_count), age=35,
+            phone_number=str(8000000000 + index), monthly_salary=Decimal(500000),
+            approved_limit=Decimal(18000000),
+        )
+        Loan.objects.bulk_create([
+            Loan(
+                customer=customer, loan_amount=Decimal(50000), tenure=12, interest_rate=Decimal(12),
+                monthly_repayment=Decimal(4442), emis_paid_on_time=12 if number % 10 else 6,
+                start_date=today - relativedelta(years=2, days=number),
+                end_date=today - relativedelta(years=1, days=number),
+                is_active=number % 50 == 0,
+            )
+            for number in range(loan_count)
+        ], batch_size=500)
+        customers[loan_count] = customer
+    return customers
+
+
+def endpoint_requests(customer):
+    """
+    (url name, method, path, body, expected status, as admin) of one request per
+    endpoint, made on behalf of customer. body may be a callable returning it
+    """
+    loan_ids = list(customer.loans.order_by('loan_id').values_list('loan_id', flat=True))
+    application = LoanApplication.objects.create(
+        customer_id=customer.customer_id, loan_amount=Decimal(10000), interest_rate=Decimal(12), tenure=12
+    )
+    loan_request = {
+        'customer_id': customer.customer_id, 'loan_amount': 10000, 'interest_rate': 12, 'tenure': 12
+    }
+    requests = [
+        ('dashboard', 'get', reverse('dashboard'), None, 200, False),
+        ('api_docs', 'get', reverse('api_docs'), None, 200, False),
+        ('api_documentation', 'get', reverse('api_documentation'), None, 200, False),
+        ('register_customer', 'post', reverse('register_customer'), _registration, 201, False),
+        ('check_eligibility', 'post', reverse('check_eligibility'), loan_request, 200, False),
+        ('create_loan', 'post', reverse('create_loan'), loan_request, 201, False),
+        ('view_loan_application', 'get', reverse('view_loan_application', args=[application.pk]), None, 200, False),
+        ('bulk_view_customers', 'post', reverse('bulk_view_customers'), {'ids': [customer.customer_id]}, 200, False),
+        ('view_customer_loans', 'get', reverse('view_customer_loans', args=[customer.customer_id]), None, 200, False),
+        ('view_score_history', 'get', reverse('view_score_history', args=[customer.customer_id]), None, 200, False),
+        ('view_decision_audit', 'get', reverse('view_decision_audit', args=[customer.customer_id]), None, 200, True),
+        ('view_offers', 'get', reverse('view_offers', args=[customer.customer_id]), None, 200, False),
+        ('portfolio_stats', 'get', reverse('portfolio_stats'), None, 200, False),
+        ('process_repayments', 'post', reverse('process_repayments'), _repayment(loan_ids), 200, True),
+        ('refresh_salaries', 'post', reverse('refresh_salaries'), _salary(customer), 200, True),
+        ('metrics', 'get', reverse('metrics'), None, 200, True),
+        ('export_snapshot', 'get', reverse('export_snapshot', args=['loans']), None, 200, True),
+    ]
+    if loan_ids:
+        requests += [
+            ('view_loan', 'get', reverse('view_loan', args=[loan_ids[-1]]), None, 200, False),
+            # Within SQLite's 999 parameters, past which in_bulk splits the IN list
+            ('bulk_view_loans', 'post', reverse('bulk_view_loans'), {'ids': loan_ids[-500:]}, 200, False),
+        ]
+    return requests
+
+
+def _registration():
+    # Phone numbers are unique, so every registration needs a fresh one
+    _registration.count += 1
+    return {
+        'first_name': 'Budget', 'last_name': 'Register', 'age': 30, 'monthly_income': 50000,
+        'phone_number': str(7000000000 + _registration.count),
+    }
+
+
+_registration.count = 0
+
+
+def _repayment(loan_ids):
+    # Fresh event IDs, or every call after the first is a replay
+    def body():
+        _repayment.count += 1
+        loan_id = loan_ids[-1] if loan_ids else 999999
+        return {'events': [{'event_id': f'budget-{_repayment.count}', 'loan_id': loan_id, 'on_time': True}]}
+    return body
+
+
+_repayment.count = 0
+
+
+def _salary(customer):
+    # Alternate between two salaries, or every call after the first is a no-op
+    def body():
+        _salary.count += 1
+        salary = customer.monthly_salary + _salary.count % 2
+        return {'salaries': [{'customer_id': customer.customer_id, 'monthly_salary': str(salary)}]}
+    return body
+
+
+_salary.count = 0
+
+
+def _send(client, method, path, body):
+    if callable(body):
+        body = body()
+    if method == 'post':
+        response = client.post(path, body, content_type='application/json')
+    else:
+        response = client.get(path)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def measure(client, method, path, body, repeat):
+    """
+    (status, queries, median milliseconds) of a request. The first call
+    warms caches and counter rows and is not measured
+    """
+    _send(client, method, path, body)
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = _send(client, method, path, body)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(captured.captured_queries))
+    return response.status_code, queries, statistics.median(timings)
+
+
+def run_budget_checks(loan_counts=LOAN_COUNTS, repeat=3):
+    """
+    Measure every endpoint for a customer with each loan count. Returns
+    {url name: {loan count: (status, queries, ms)}}, the expected statuses
+    and the url names without a declared budget
+    """
+    customers = seed_customers(loan_counts)
+    # Admin-only endpoints also pay for the session and user lookups
+    admin = get_user_model().objects.create_superuser('budget-admin', 'budget@example.com', 'budget')
+    admin_client = Client()
+    admin_client.force_login(admin)
+    client = Client()
+
+    results = {}
+    expected = {}
+    for loan_count, customer in customers.items():
+        for name, method, path, body, expected_status, as_admin in endpoint_requests(customer):
+            expected[name] = expected_status
+            results.setdefault(name, {})[loan_count] = measure(
+                admin_client if as_admin else client, method, path, body, repeat
+            )
+
+    unbudgeted = [pattern.name for pattern in urlpatterns if pattern.name not in QUERY_BUDGETS]
+    return results, expected, unbudgeted
+
+
+def _run_job(func, *args, job_timeout=None, **kwargs):
+    # Jobs views enqueue run in the request, as if a worker took them at once
+    func(*args, **kwargs)
+
+
+def budget_violations(results, expected, unbudgeted, enforce_time=True):
+    """
+    Messages for every request over its query (or time) budget or with an
+    unexpected status, and every endpoint without a budget
+    """
+    violations = [f'{name}: no budget declared in loans/query_budgets.py' for name in unbudgeted]
+    for name, by_count in results.items():
+        budget = QUERY_BUDGETS[name]
+        query_budget = budget.get(f'queries_{connection.vendor}', budget['queries'])
+        for count, (status, queries, ms) in by_count.items():
+            if status != expected[name]:
+                violations.append(f'{name} ({count} loans): status {status}, expected {expected[name]}')
+            if queries > query_budget:
+                violations.append(f'{name} ({count} loans): {queries} queries, budget {query_budget}')
+            if enforce_time and ms > budget['ms']:
+                violations.append(f"{name} ({count} loans): {ms:.0f} ms, budget {budget['ms']}")
+    return violations
+
+
+def check_budgets(loan_counts=LOAN_COUNTS, repeat=3, enforce_time=True):
+    """
+    run_budget_checks() with admission control, profiling and Redis out of
+    the way, in an empty database. Returns the results and
+    budget_violations()
+    """
+    admission = {**settings.ADMISSION_CONTROL, 'ENABLED': False}
+    profiling = {**settings.PROFILING, 'ENABLED': False}
+    # Request logging would drown the output
+    logging.disable(logging.INFO)
+    try:
+        with override_settings(ADMISSION_CONTROL=admission, PROFILING=profiling, **HARNESS_SETTINGS), \
+                mock.patch('loans.views.enqueue', _run_job):
+            results, expected, unbudgeted = run_budget_checks(loan_counts, repeat)
+    finally:
+        logging.disable(logging.NOTSET)
+    return results, budget_violations(results, expected, unbudgeted, enforce_time)
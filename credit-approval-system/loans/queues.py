@@ -0,0 +1,57 @@
+import django_rq
+
+# Queues in priority order: a worker always takes the next job from the first
+# non-empty queue it listens to
+QUEUE_PRIORITY = ('high', 'default', 'bulk')
+
+# Queue of every background task, by function name. 'high' is for jobs a
+# client is waiting on, 'bulk' for file loads and other long scans; anything
+# not listed runs on 'default'
+TASK_QUEUES = {
+    'process_loan_applications': 'high',
+    'requeue_loan_applications': 'default',
+    'close_matured_loans': 'default',
+    'refresh_offers': 'default',
+    'store_customer_offers': 'default',
+    'create_decision_audit_partitions': 'default',
+    'process_repayment_file': 'bulk',
+    'process_salary_file': 'bulk',
+    'archive_closed_loans': 'bulk',
+    'ingest_all_data': 'bulk',
+    'plan_ingestion': 'bulk',
+    'ingest_customer_rows': 'bulk',
+    'ingest_loan_rows': 'bulk',
+    'finish_loan_ingestion': 'bulk',
+}
+
+
+def task_queue(func):
+    """
+    Name of the queue a task function is routed to
+    """
+    return TASK_QUEUES.get(func.__name__, 'default')
+
+
+def enqueue(func, *args, **kwargs):
+    """
+    Enqueue a background task on its queue, where it gets that queue's job
+    timeout unless job_timeout is passed
+    """
+    return django_rq.get_queue(task_queue(func)).enqueue(func, *args, **kwargs)
+
+
+def worker_queues(processes, bulk_workers=0):
+    """
+    Queues each of processes workers listens to. bulk_workers of them (by
+    default a quarter, at least one) also take bulk jobs; the others only
+    serve high and default, so a long load never holds every worker
+    """
+    processes = max(1, processes)
+    bulk_workers = bulk_workers or max(1, processes // 4)
+    # With a single process bulk jobs still need somewhere to run
+    bulk_workers = min(bulk_workers, max(1, processes - 1))
+    latency_workers = processes - bulk_workers
+    return (
+        [list(QUEUE_PRIORITY[:2])] * latency_workers
+        + [list(QUEUE_PRIORITY)] * bulk_workers
+    )
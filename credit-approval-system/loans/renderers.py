@@ -0,0 +1,88 @@
+import struct
+from decimal import Decimal
+import msgpack
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+# MessagePack extension type carrying a Decimal: 9 bytes, a signed 8-bit
+# exponent then a signed 64-bit big-endian coefficient, value =
+# coefficient * 10 ** exponent. The scale is kept, so Decimal('12.50') is
+# (-2, 1250) and decodes back to Decimal('12.50')
+DECIMAL_EXT_TYPE = 1
+_DECIMAL = struct.Struct('>bq')
+
+
+class DecimalEncoder(encoders.JSONEncoder):
+    """
+    DRF's encoder, with Decimals written as plain strings ('12.50'), the way
+    serializers coerce them, rather than as floats
+    """
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return format(obj, 'f')
+        return super().default(obj)
+
+
+_json_default = DecimalEncoder().default
+
+
+def encode_decimal(value):
+    """
+    DECIMAL_EXT_TYPE payload of a finite Decimal; raises ValueError when the
+    coefficient is outside 64 bits (any value of up to 18 digits fits)
+    """
+    sign, digits, exponent = value.as_tuple()
+    if not isinstance(exponent, int):
+        raise ValueError(f"Cannot encode {value} as MessagePack")
+    coefficient = int(value.scaleb(-exponent))
+    try:
+        return _DECIMAL.pack(exponent, coefficient)
+    except struct.error:
+        raise ValueError(f"Decimal {value} does not fit the MessagePack decimal encoding")
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(DECIMAL_EXT_TYPE, encode_decimal(obj))
+    # Dates, times, UUIDs... as in JSON responses
+    return _json_default(obj)
+
+
+def ext_hook(code, data):
+    if code == DECIMAL_EXT_TYPE:
+        exponent, coefficient = _DECIMAL.unpack(data)
+        return Decimal(coefficient).scaleb(exponent)
+    return msgpack.ExtType(code, data)
+
+
+def packb(data):
+    return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+def unpackb(content):
+    return msgpack.unpackb(content, ext_hook=ext_hook, raw=False)
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    JSON responses; serializers leave Decimals as Decimals (for MessagePack),
+    and here they become the same strings they always were
+    """
+    encoder_class = DecimalEncoder
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    MessagePack responses (Accept: application/msgpack or ?format=msgpack),
+    with Decimals as DECIMAL_EXT_TYPE
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return packb(data)
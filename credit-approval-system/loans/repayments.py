@@ -0,0 +1,258 @@
+import csv
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+from .models import Customer, Loan, LoanOffer, RepaymentEvent
+from .money import to_paise, to_basis_points, from_paise, outstanding_paise
+from .portfolio import close_loans
+from .routers import pin_customers_to_primary
+from .sharding import db_alias, group_by_shard, on_shard, shard_aliases
+
+REQUIRED_COLUMNS = ('event_id', 'loan_id', 'on_time')
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+# IN lists are split so SQLite stays under its bound-parameter limit
+LOOKUP_CHUNK_SIZE = 900
+VALUES_CHUNK_SIZE = 5000
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_event(row):
+    """
+    (event_id, loan_id, on_time) from a feed row; raises ValueError if malformed
+    """
+    try:
+        event_id = row['event_id'].strip()
+        loan_id = int(row['loan_id'])
+        on_time = str(row['on_time']).strip().lower() in TRUE_VALUES
+    except (KeyError, TypeError, AttributeError):
+        raise ValueError(f"Malformed repayment event: {row}")
+    if not event_id or len(event_id) > 64:
+        raise ValueError(f"Invalid event_id: {event_id!r}")
+    return event_id, loan_id, on_time
+
+
+def read_csv_events(lines):
+    """
+    Stream dict rows from CSV lines (any iterable of str) with the feed's
+    header; extra columns are ignored
+    """
+    reader = csv.DictReader(lines)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    return reader
+
+
+def _update_loans(rows, now):
+    """
+    Write (loan_id, emis_paid, emis_paid_on_time) rows: one UPDATE ... FROM
+    (VALUES ...) per chunk on Postgres, one prepared UPDATE run per row
+    elsewhere (bulk_update's CASE expressions cost more than the writes)
+    """
+    connection = connections[db_alias()]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for chunk in _chunks(rows, VALUES_CHUNK_SIZE):
+                cursor.execute(
+                    'UPDATE "loan" SET "emis_paid" = v.emis_paid, "emis_paid_on_time" = v.on_time, '
+                    '"updated_at" = %s FROM (VALUES ' + ', '.join(['(%s, %s, %s)'] * len(chunk)) + ') '
+                    'AS v(loan_id, emis_paid, on_time) WHERE "loan"."loan_id" = v.loan_id',
+                    [now] + [value for row in chunk for value in row]
+                )
+            return
+        # Stored the way the ORM stores it, so updated_at comparisons keep working
+        updated_at = connection.ops.adapt_datetimefield_value(now)
+        cursor.executemany(
+            'UPDATE "loan" SET "emis_paid" = %s, "emis_paid_on_time" = %s, "updated_at" = %s '
+            'WHERE "loan_id" = %s',
+            [(emis_paid, on_time, updated_at, loan_id) for loan_id, emis_paid, on_time in rows]
+        )
+
+
+def _reduce_debts(repaid_by_customer, now):
+    """
+    Subtract repaid principal from each customer's current_debt, never below
+    zero, and mark every customer given updated, since on-time EMIs feed the
+    exported credit score
+    """
+    rows = list(repaid_by_customer.items())
+    connection = connections[db_alias()]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for chunk in _chunks(rows, VALUES_CHUNK_SIZE):
+                cursor.execute(
+                    'UPDATE "customer" SET "current_debt" = GREATEST("customer"."current_debt" - v.repaid, 0), '
+                    '"updated_at" = %s FROM (VALUES ' + ', '.join(['(%s, %s::numeric)'] * len(chunk)) + ') '
+                    'AS v(customer_id, repaid) WHERE "customer"."customer_id" = v.customer_id',
+                    [now] + [value for row in chunk for value in row]
+                )
+        return
+    customers = []
+    for chunk in _chunks(rows, LOOKUP_CHUNK_SIZE):
+        repaid = dict(chunk)
+        for customer in Customer.objects.select_for_update().filter(customer_id__in=repaid).only('current_debt'):
+            customer.current_debt = max(0, customer.current_debt - repaid[customer.customer_id])
+            customer.updated_at = now
+            customers.append(customer)
+    Customer.objects.bulk_update(customers, ['current_debt', 'updated_at'], batch_size=500)
+
+
+def _apply_batch(events):
+    """
+    Apply one batch of (event_id, loan_id, on_time) in a single transaction.
+    Returns the stats and the fresh events whose loan was not found
+    """
+    stats = defaultdict(int)
+    now = timezone.now()
+    with transaction.atomic(using=db_alias()):
+        event_ids = [event[0] for event in events]
+        seen = set()
+        for chunk in _chunks(event_ids, LOOKUP_CHUNK_SIZE):
+            seen.update(RepaymentEvent.objects.filter(event_id__in=chunk).values_list('event_id', flat=True))
+        fresh = [event for event in events if event[0] not in seen]
+        stats['duplicates'] += len(events) - len(fresh)
+
+        # Aggregate per loan, so each loan is read and written once per batch
+        payments = defaultdict(lambda: [0, 0])
+        for _, loan_id, on_time in fresh:
+            payments[loan_id][0] += 1
+            payments[loan_id][1] += on_time
+
+        loans = {}
+        for chunk in _chunks(list(payments), LOOKUP_CHUNK_SIZE):
+            for loan in Loan.objects.select_for_update().filter(loan_id__in=chunk).values(
+                'loan_id', 'customer_id', 'loan_amount', 'interest_rate', 'monthly_repayment',
+                'tenure', 'emis_paid', 'emis_paid_on_time', 'is_active'
+            ):
+                loans[loan['loan_id']] = loan
+
+        updates = []
+        repaid_loans = []
+        repaid_by_customer = defaultdict(int)
+        for loan_id, (paid, paid_on_time) in payments.items():
+            loan = loans.get(loan_id)
+            if loan is None or not loan['is_active']:
+                continue
+            emis_paid = min(loan['tenure'], loan['emis_paid'] + paid)
+            on_time = min(emis_paid, loan['emis_paid_on_time'] + paid_on_time)
+            updates.append((loan_id, emis_paid, on_time))
+
+            principal = to_paise(loan['loan_amount'])
+            rate_bp = to_basis_points(loan['interest_rate'])
+            installment = to_paise(loan['monthly_repayment'])
+            owed_before = outstanding_paise(principal, rate_bp, installment, loan['emis_paid'])
+            if emis_paid >= loan['tenure']:
+                repaid_loans.append(loan_id)
+                owed_after = 0
+            else:
+                owed_after = outstanding_paise(principal, rate_bp, installment, emis_paid)
+            repaid_by_customer[loan['customer_id']] += owed_before - owed_after
+
+        recorded = [
+            RepaymentEvent(event_id=event_id, loan_id=loan_id, processed_at=now)
+            for event_id, loan_id, _ in fresh if loan_id in loans
+        ]
+        for event in recorded:
+            if loans[event.loan_id]['is_active']:
+                stats['applied'] += 1
+            else:
+                stats['inactive_loan'] += 1
+        # Events for unknown loans are not recorded, so a later run can apply them
+        unknown = [event for event in fresh if event[1] not in loans]
+        stats['unknown_loan'] += len(unknown)
+
+        RepaymentEvent.objects.bulk_create(recorded, batch_size=5000)
+        _update_loans(updates, now)
+        _reduce_debts(
+            {customer_id: from_paise(paise) for customer_id, paise in repaid_by_customer.items()}, now
+        )
+        # On-time EMIs feed the credit score, so the offers are stale too
+        LoanOffer.invalidate({loans[loan_id]['customer_id'] for loan_id, _, _ in updates})
+        # Deactivates them and takes them out of the portfolio counters
+        for chunk in _chunks(repaid_loans, LOOKUP_CHUNK_SIZE):
+            stats['loans_repaid'] += close_loans(chunk)
+        stats['loans_updated'] += len(updates)
+    # Their loans and debt changed: read them back from the primary
+    pin_customers_to_primary({loans[loan_id]['customer_id'] for loan_id, _, _ in updates})
+    return stats, unknown
+
+
+def _apply_retrying(events):
+    # A concurrent run that recorded some of the same event IDs first makes
+    # the insert fail; the batch is then retried, skipping them
+    try:
+        return _apply_batch(events)
+    except IntegrityError:
+        return _apply_batch(events)
+
+
+def apply_repayment_batch(events):
+    """
+    Apply a batch of repayment events idempotently, on the shard of each
+    loan. Events for loans not on their ID's home shard (loaded with IDs
+    from before sharding) are tried on the other shards
+    """
+    totals = defaultdict(int)
+    for alias, loan_ids in group_by_shard({event[1] for event in events}).items():
+        loan_ids = set(loan_ids)
+        pending = [event for event in events if event[1] in loan_ids]
+        for shard in shard_aliases(first=alias):
+            with on_shard(shard):
+                stats, pending = _apply_retrying(pending)
+            # Only the events no shard knows are reported as unknown
+            stats.pop('unknown_loan', None)
+            for name, count in stats.items():
+                totals[name] += count
+            if not pending:
+                break
+        totals['unknown_loan'] += len(pending)
+    return totals
+
+
+def process_repayment_events(rows, batch_size=None):
+    """
+    Stream feed rows (dicts) through apply_repayment_batch() batch_size
+    events at a time. Returns totals; malformed rows are counted, not fatal
+    """
+    batch_size = batch_size or settings.REPAYMENT_BATCH_SIZE
+    totals = defaultdict(int)
+    batch = {}
+    for row in rows:
+        try:
+            event_id, loan_id, on_time = parse_event(row)
+        except ValueError:
+            totals['malformed'] += 1
+            continue
+        totals['events'] += 1
+        if event_id in batch:
+            totals['duplicates'] += 1
+            continue
+        batch[event_id] = (event_id, loan_id, on_time)
+        if len(batch) >= batch_size:
+            for name, count in apply_repayment_batch(list(batch.values())).items():
+                totals[name] += count
+            batch = {}
+    if batch:
+        for name, count in apply_repayment_batch(list(batch.values())).items():
+            totals[name] += count
+    return dict(totals)
+
+
+def prune_repayment_events(retention_days=None):
+    """
+    Forget event IDs older than the retention window; replays older than
+    that are no longer detected
+    """
+    retention_days = retention_days or settings.REPAYMENT_EVENT_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted = 0
+    for alias in shard_aliases():
+        with on_shard(alias):
+            deleted += RepaymentEvent.objects.filter(processed_at__lt=cutoff).delete()[0]
+    return deleted
@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    """
+    Check whether a replica database alias is configured
+    """
+    return settings.REPLICA_DATABASE_ALIAS in settings.DATABASES
+
+
+def _sticky_key(customer_id):
+    return f"loans:primary-pin:{customer_id}"
+
+
+def pin_customer_to_primary(customer_id):
+    """
+    Send this customer's reads to the primary for a short window after a write,
+    so clients can read their own writes before the replica catches up
+    """
+    if replica_configured() and settings.REPLICA_STICKY_SECONDS > 0:
+        cache.set(_sticky_key(customer_id), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+def pin_customers_to_primary(customer_ids):
+    """
+    pin_customer_to_primary() for every customer a batch wrote to, in one
+    cache round trip
+    """
+    if replica_configured() and settings.REPLICA_STICKY_SECONDS > 0:
+        cache.set_many({_sticky_key(customer_id): 1 for customer_id in customer_ids}, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_customer_pinned(customer_id):
+    return cache.get(_sticky_key(customer_id)) is not None
+
+
+@contextmanager
+def read_from_replica(customer_id=None):
+    """
+    Route ORM reads inside the block to the replica, unless no replica is
+    configured or the customer wrote recently
+    """
+    if not replica_configured() or (customer_id is not None and is_customer_pinned(customer_id)):
+        yield
+        return
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to the replica only inside read_from_replica(); every write,
+    and any read outside that block, goes to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return settings.REPLICA_DATABASE_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replica hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
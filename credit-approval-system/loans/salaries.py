@@ -0,0 +1,187 @@
+import csv
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce, Mod, Round
+from django.db.models.lookups import Exact, GreaterThan
+from django.utils import timezone
+from .models import Customer, Loan, LoanOffer
+from .portfolio import record_salary_changes
+from .routers import pin_customers_to_primary
+from .sharding import db_alias, group_by_shard, on_shard
+from .validators import validate_monthly_income
+
+REQUIRED_COLUMNS = ('customer_id', 'monthly_salary')
+LAKH = Decimal(100000)
+# IN lists are split so SQLite stays under its bound-parameter limit
+LOOKUP_CHUNK_SIZE = 900
+VALUES_CHUNK_SIZE = 5000
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def approved_limit_expression():
+    """
+    36 * monthly_salary rounded to the nearest lakh, in SQL. Exact halves
+    round to even like Python's round() at registration, where SQL ROUND
+    would round them up
+    """
+    limit = F('monthly_salary') * Decimal(36)
+    # Multiplied rather than divided: SQLite divides integral values as integers
+    lakhs = F('monthly_salary') * (Decimal(36) / LAKH)
+    return Case(
+        When(Exact(Mod(limit, LAKH), LAKH / 2), then=Round(lakhs * Decimal('0.5')) * (2 * LAKH)),
+        default=Round(lakhs) * LAKH,
+    )
+
+
+def active_loans_sum():
+    """
+    Subquery of a customer's active loan amounts, as credit scoring sums them
+    """
+    return Subquery(
+        Loan.objects.filter(customer=OuterRef('pk'), is_active=True).order_by()
+        .values('customer').annotate(total=Sum('loan_amount')).values('total')
+    )
+
+
+def parse_salary(row):
+    """
+    (customer_id, monthly_salary) from a feed row; raises ValueError if malformed
+    """
+    try:
+        customer_id = int(row['customer_id'])
+        salary = Decimal(str(row['monthly_salary']).strip()).quantize(Decimal('0.01'))
+        validate_monthly_income(salary)
+    except (KeyError, TypeError, AttributeError, InvalidOperation, ValidationError):
+        raise ValueError(f"Malformed salary row: {row}")
+    return customer_id, salary
+
+
+def read_csv_salaries(lines):
+    """
+    Stream dict rows from CSV lines (any iterable of str) with the feed's
+    header; extra columns are ignored
+    """
+    reader = csv.DictReader(lines)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    return reader
+
+
+def _update_salaries(rows, now):
+    """
+    Write (customer_id, monthly_salary) rows: one UPDATE ... FROM (VALUES ...)
+    per chunk on Postgres, one prepared UPDATE run per row elsewhere
+    """
+    connection = connections[db_alias()]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for chunk in _chunks(rows, VALUES_CHUNK_SIZE):
+                cursor.execute(
+                    'UPDATE "customer" SET "monthly_salary" = v.salary, "updated_at" = %s '
+                    'FROM (VALUES ' + ', '.join(['(%s, %s::numeric)'] * len(chunk)) + ') '
+                    'AS v(customer_id, salary) WHERE "customer"."customer_id" = v.customer_id',
+                    [now] + [value for row in chunk for value in row]
+                )
+            return
+        updated_at = connection.ops.adapt_datetimefield_value(now)
+        cursor.executemany(
+            'UPDATE "customer" SET "monthly_salary" = %s, "updated_at" = %s WHERE "customer_id" = %s',
+            [(str(salary), updated_at, customer_id) for customer_id, salary in rows]
+        )
+
+
+def _apply_shard_salaries(salaries):
+    stats = defaultdict(int)
+    now = timezone.now()
+    with transaction.atomic(using=db_alias()):
+        current = {}
+        emis = {}
+        for chunk in _chunks(list(salaries), LOOKUP_CHUNK_SIZE):
+            # Locked apart from the EMI sums: FOR UPDATE can't be combined with GROUP BY
+            current.update(
+                Customer.objects.select_for_update().filter(customer_id__in=chunk)
+                .values_list('customer_id', 'monthly_salary')
+            )
+            emis.update(
+                Loan.objects.filter(customer_id__in=chunk, is_active=True).order_by()
+                .values('customer_id').annotate(emis=Sum('monthly_repayment'))
+                .values_list('customer_id', 'emis')
+            )
+        stats['unknown_customer'] += len(salaries) - len(current)
+
+        changed = [
+            (customer_id, salary) for customer_id, salary in salaries.items()
+            if customer_id in current and current[customer_id] != salary
+        ]
+        stats['unchanged'] += len(current) - len(changed)
+        _update_salaries(changed, now)
+
+        for chunk in _chunks([customer_id for customer_id, _ in changed], LOOKUP_CHUNK_SIZE):
+            customers = Customer.objects.filter(customer_id__in=chunk)
+            customers.update(approved_limit=approved_limit_expression())
+            customers.update(over_limit=Case(
+                When(GreaterThan(Coalesce(active_loans_sum(), Decimal(0)), F('approved_limit')), then=True),
+                default=False,
+            ))
+            stats['over_limit'] += customers.filter(over_limit=True).count()
+
+        LoanOffer.invalidate([customer_id for customer_id, _ in changed])
+        record_salary_changes(
+            (emis.get(customer_id), current[customer_id], salary) for customer_id, salary in changed
+        )
+        stats['updated'] += len(changed)
+    # Their salary and approved_limit changed: read them back from the primary
+    pin_customers_to_primary([customer_id for customer_id, _ in changed])
+    return stats
+
+
+def apply_salary_batch(salaries):
+    """
+    Apply {customer_id: monthly_salary} in one transaction per shard: write
+    the changed salaries, recompute their approved_limit and over_limit flags
+    with one UPDATE each per chunk, and move the borrowers between EMI
+    burden bands
+    """
+    totals = defaultdict(int)
+    for alias, customer_ids in group_by_shard(salaries).items():
+        with on_shard(alias):
+            stats = _apply_shard_salaries({customer_id: salaries[customer_id] for customer_id in customer_ids})
+        for name, count in stats.items():
+            totals[name] += count
+    return totals
+
+
+def process_salary_rows(rows, batch_size=None):
+    """
+    Stream feed rows (dicts) through apply_salary_batch() batch_size
+    customers at a time. A later row for the same customer in a batch wins.
+    Returns totals; malformed rows are counted, not fatal
+    """
+    batch_size = batch_size or settings.SALARY_REFRESH_BATCH_SIZE
+    totals = defaultdict(int)
+    batch = {}
+    for row in rows:
+        try:
+            customer_id, salary = parse_salary(row)
+        except ValueError:
+            totals['malformed'] += 1
+            continue
+        totals['rows'] += 1
+        batch[customer_id] = salary
+        if len(batch) >= batch_size:
+            for name, count in apply_salary_batch(batch).items():
+                totals[name] += count
+            batch = {}
+    if batch:
+        for name, count in apply_salary_batch(batch).items():
+            totals[name] += count
+    return dict(totals)
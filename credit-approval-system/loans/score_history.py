@@ -0,0 +1,48 @@
+from decimal import Decimal
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .buffering import BufferedWriter
+from .models import CreditScoreSnapshot
+from .sharding import db_alias
+
+_writer = None
+
+
+def get_score_history_writer():
+    global _writer
+    if _writer is None:
+        _writer = BufferedWriter(
+            CreditScoreSnapshot,
+            max_batch=settings.SCORE_HISTORY_BATCH_SIZE,
+            flush_interval=settings.SCORE_HISTORY_FLUSH_SECONDS
+        )
+    return _writer
+
+
+def record_credit_score(customer, loan_stats, credit_score):
+    """
+    Queue a score and the credit_score_aggregates() values behind it for the
+    history table once the current transaction commits, so a rolled back and
+    retried decision is recorded once; the INSERT happens in batches off the
+    request thread
+    """
+    if not settings.SCORE_HISTORY_ENABLED:
+        return
+    alias = db_alias()
+    snapshot = CreditScoreSnapshot(
+        customer_id=customer.customer_id,
+        credit_score=float(credit_score),
+        approved_limit=customer.approved_limit,
+        monthly_salary=customer.monthly_salary,
+        current_loans_sum=loan_stats['current_loans_sum'] or Decimal(0),
+        current_emis=loan_stats['current_emis'] or Decimal(0),
+        total_loan_volume=loan_stats['total_loan_volume'] or Decimal(0),
+        total_emis=loan_stats['total_emis'] or 0,
+        paid_on_time=loan_stats['paid_on_time'] or 0,
+        loan_count=loan_stats['loan_count'],
+        current_year_loans=loan_stats['current_year_loans'],
+        computed_at=timezone.now()
+    )
+    transaction.on_commit(partial(get_score_history_writer().add, snapshot, using=alias), using=alias)
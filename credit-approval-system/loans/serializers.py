@@ -1,9 +1,11 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from .models import Customer, Loan
+from .models import Customer, Loan, CreditScoreSnapshot, LoanOffer, DecisionAuditRecord
 from .validators import (
     validate_phone_number, validate_loan_amount, validate_interest_rate,
-    validate_tenure, validate_monthly_income, validate_age, validate_name
+    validate_tenure, validate_monthly_income, validate_age, validate_name,
+    validate_callback_url
 )
 
 class CustomerRegistrationSerializer(serializers.Serializer):
@@ -93,6 +95,12 @@ class LoanCreationSerializer(serializers.Serializer):
     def validate_tenure(self, value):
         return validate_tenure(value)
 
+class LoanApplicationSubmissionSerializer(LoanCreationSerializer):
+    callback_url = serializers.URLField(required=False, allow_blank=True)
+    
+    def validate_callback_url(self, value):
+        return validate_callback_url(value)
+
 class LoanCreationResponseSerializer(serializers.Serializer):
     loan_id = serializers.IntegerField(allow_null=True)
     customer_id = serializers.IntegerField()
@@ -100,6 +108,15 @@ class LoanCreationResponseSerializer(serializers.Serializer):
     message = serializers.CharField()
     monthly_installment = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
 
+class LoanApplicationResultSerializer(serializers.Serializer):
+    application_id = serializers.IntegerField()
+    customer_id = serializers.IntegerField()
+    status = serializers.CharField()
+    loan_approved = serializers.BooleanField()
+    loan_id = serializers.IntegerField(allow_null=True)
+    message = serializers.CharField(allow_blank=True)
+    monthly_installment = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+
 class CustomerDetailSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='customer_id')
 
@@ -115,10 +132,42 @@ class LoanDetailSerializer(serializers.ModelSerializer):
         model = Loan
         fields = ['loan_id', 'customer', 'loan_amount', 'interest_rate', 'monthly_repayment', 'tenure', 'repayments_left']
 
+class BulkLookupSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    
+    def validate_ids(self, value):
+        if len(value) > settings.BULK_LOOKUP_MAX_IDS:
+            raise serializers.ValidationError(f"At most {settings.BULK_LOOKUP_MAX_IDS} IDs per request")
+        # Duplicates are answered once, at their first position
+        return list(dict.fromkeys(value))
+
 class LoanListSerializer(serializers.ModelSerializer):
     repayments_left = serializers.IntegerField(read_only=True)
     monthly_installment = serializers.DecimalField(source='monthly_repayment', max_digits=10, decimal_places=2)
 
     class Meta:
         model = Loan
-        fields = ['loan_id', 'loan_amount', 'interest_rate', 'monthly_installment', 'repayments_left']
\ No newline at end of file
+        fields = ['loan_id', 'loan_amount', 'interest_rate', 'monthly_installment', 'repayments_left']
+
+class CreditScoreSnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CreditScoreSnapshot
+        fields = [
+            'credit_score', 'computed_at', 'approved_limit', 'monthly_salary', 'current_loans_sum',
+            'current_emis', 'total_loan_volume', 'total_emis', 'paid_on_time', 'loan_count',
+            'current_year_loans'
+        ]
+
+class LoanOfferSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoanOffer
+        fields = ['tenure', 'interest_rate', 'max_loan_amount', 'monthly_installment']
+
+class DecisionAuditRecordSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DecisionAuditRecord
+        fields = [
+            'decided_at', 'source', 'loan_amount', 'interest_rate', 'tenure', 'credit_score',
+            'corrected_interest_rate', 'monthly_installment', 'approved', 'message', 'loan_id',
+            'min_approval_score', 'emi_cap_percent', 'rate_floor_score_above_30', 'rate_floor_score_above_10'
+        ]
@@ -0,0 +1,232 @@
+import random
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.db.models.signals import pre_save
+from .models import ArchivedLoan, Customer, Loan, LoanApplication, ShardSequence
+
+_shard = ContextVar('shard', default=None)
+
+# Models whose IDs are looked up without knowing the customer, so they are
+# generated to encode their shard (see shard_for_id())
+SHARD_ID_MODELS = (Customer, Loan, LoanApplication)
+
+_id_blocks = {}
+_id_blocks_lock = threading.Lock()
+
+
+class ShardNotSelected(RuntimeError):
+    """
+    A loans table was queried with sharding on but outside on_shard()
+    """
+
+
+def sharding_enabled():
+    return bool(settings.SHARD_DATABASE_ALIASES)
+
+
+def shard_aliases(first=None):
+    """
+    Aliases to fan out over: every shard, starting with first when given, or
+    just 'default' when sharding is off
+    """
+    aliases = list(settings.SHARD_DATABASE_ALIASES) or ['default']
+    if first in aliases:
+        aliases.remove(first)
+        aliases.insert(0, first)
+    return aliases
+
+
+def shard_for_id(object_id):
+    """
+    Home shard of a customer ID, or of a generated loan or application ID
+    (which lands on its customer's shard). Loans loaded with IDs from before
+    sharding may live elsewhere, so loan lookups fall back to the other shards
+    """
+    aliases = shard_aliases()
+    return aliases[int(object_id) % len(aliases)]
+
+
+def find_shard(model, object_id):
+    """
+    Shard holding a model row: its home shard, else the first other shard
+    that has it (loans loaded with IDs from before sharding), else the home
+    shard
+    """
+    home = shard_for_id(object_id)
+    for alias in shard_aliases(first=home):
+        if model._base_manager.using(alias).filter(pk=object_id).exists():
+            return alias
+    return home
+
+
+def group_by_shard(object_ids):
+    """
+    {alias: [ids]} of IDs grouped by home shard, in input order
+    """
+    groups = defaultdict(list)
+    for object_id in object_ids:
+        groups[shard_for_id(object_id)].append(object_id)
+    return groups
+
+
+def db_alias():
+    """
+    Alias loans queries in the current context go to, for transaction.atomic()
+    and raw SQL: the selected shard, or 'default'
+    """
+    return _shard.get() or 'default'
+
+
+@contextmanager
+def on_shard(alias):
+    """
+    Route loans queries inside the block to a shard. A no-op when sharding is
+    off, so replica routing keeps working
+    """
+    token = _shard.set(alias if sharding_enabled() else None)
+    try:
+        yield alias
+    finally:
+        _shard.reset(token)
+
+
+def for_customer(customer_id):
+    """
+    on_shard() for the shard holding a customer and everything keyed by them
+    """
+    return on_shard(shard_for_id(customer_id))
+
+
+def for_new_customer():
+    """
+    on_shard() for a random shard, where a new customer gets an ID that
+    routes back to it
+    """
+    return on_shard(random.choice(shard_aliases()))
+
+
+def _sequence_name(model, alias):
+    return f'{model._meta.label_lower}:{alias}'
+
+
+def _first_free_value(model, alias):
+    # Past every row already there, e.g. loaded from files with explicit IDs.
+    # Archived loans keep their IDs and view_loan falls back to them, so
+    # those are taken too
+    querysets = [model.objects.using(alias)]
+    if model is Loan:
+        querysets.append(ArchivedLoan.objects.using(alias))
+    highest = max(queryset.aggregate(highest=Max('pk'))['highest'] or 0 for queryset in querysets)
+    return highest // len(shard_aliases()) + 1
+
+
+def _reserve_ids(model, alias, count):
+    """
+    Reserve count values of model's sequence on alias; returns the first.
+    The UPDATE comes first so the row (or SQLite database) is locked before
+    the value is read back
+    """
+    sequence = ShardSequence.objects.using('default').filter(name=_sequence_name(model, alias))
+    with transaction.atomic(using='default'):
+        if not sequence.update(next_value=F('next_value') + count):
+            ShardSequence.objects.using('default').bulk_create(
+                [ShardSequence(name=_sequence_name(model, alias), next_value=_first_free_value(model, alias))],
+                ignore_conflicts=True
+            )
+            sequence.update(next_value=F('next_value') + count)
+        return sequence.values_list('next_value', flat=True).get() - count
+
+
+def next_id(model, alias):
+    """
+    Primary key for a new row of model on shard alias: a sequence value
+    times the shard count plus the shard's index, so shard_for_id() maps it
+    back. Values are reserved SHARD_ID_BLOCK_SIZE at a time per process, so
+    IDs are unique but not ordered across processes
+    """
+    aliases = shard_aliases()
+    key = (model, alias)
+    with _id_blocks_lock:
+        block = _id_blocks.get(key)
+        if block is None or block[0] >= block[1]:
+            start = _reserve_ids(model, alias, settings.SHARD_ID_BLOCK_SIZE)
+            block = _id_blocks[key] = [start, start + settings.SHARD_ID_BLOCK_SIZE]
+        value = block[0]
+        block[0] += 1
+    return value * len(aliases) + aliases.index(alias)
+
+
+def reset_id_sequences():
+    """
+    Move every shard's sequences past rows inserted with explicit IDs, e.g.
+    after a bulk load, including loans since archived. Blocks other processes already reserved are not
+    affected, so run it before serving writes
+    """
+    if not sharding_enabled():
+        return
+    for alias in shard_aliases():
+        for model in SHARD_ID_MODELS:
+            first_free = _first_free_value(model, alias)
+            ShardSequence.objects.using('default').filter(
+                name=_sequence_name(model, alias), next_value__lt=first_free
+            ).update(next_value=first_free)
+
+
+def _assign_shard_id(sender, instance, raw, using, **kwargs):
+    if raw or instance.pk is not None or not sharding_enabled() or using not in shard_aliases():
+        return
+    instance.pk = next_id(sender, using)
+
+
+def connect_id_generation():
+    """
+    Give new rows of SHARD_ID_MODELS shard-encoded IDs when saved; rows
+    created with bulk_create() must be given IDs (or next_id()) explicitly
+    """
+    for model in SHARD_ID_MODELS:
+        pre_save.connect(_assign_shard_id, sender=model, dispatch_uid=f'shard-id-{model._meta.label_lower}')
+
+
+class ShardRouter:
+    """
+    Sends loans queries to the shard selected with on_shard(), or to the
+    shard an instance was loaded from (e.g. customer.loans). Other apps, and
+    the ID sequences, stay on 'default'. The replica is not used for sharded
+    tables
+    """
+
+    def _shard_for(self, model, hints):
+        if model._meta.app_label != 'loans':
+            return None
+        if model is ShardSequence:
+            return 'default'
+        alias = _shard.get()
+        if alias is not None:
+            return alias
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        raise ShardNotSelected(f"{model.__name__} queried outside on_shard()")
+
+    def db_for_read(self, model, **hints):
+        return self._shard_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.app_label == 'loans' and obj2._meta.app_label == 'loans':
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label != 'loans':
+            return False if db in shard_aliases() else None
+        if model_name == ShardSequence._meta.model_name:
+            return db == 'default'
+        return db in shard_aliases()
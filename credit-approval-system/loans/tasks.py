@@ -1,23 +1,76 @@
-import pandas as pd
-import django_rq
+import gzip
+import json
+import logging
+import urllib.request
+from collections import defaultdict
+from functools import partial
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 from django.conf import settings
-from datetime import datetime
-from .models import Customer, Loan
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Customer, DecisionAuditRecord, Loan, LoanApplication
+from .utils import (
+    customer_loan_stats, customer_not_found_result, decide_loan, create_approved_loan, add_loan_to_stats
+)
+from .audit import create_audit_partitions, get_decision_audit_writer, record_decision
+from .portfolio import close_loans, rebuild_portfolio_counters, record_loan_decision
+from .repayments import process_repayment_events, prune_repayment_events, read_csv_events
+from .salaries import process_salary_rows, read_csv_salaries
+from .offers import refresh_customer_offers, refresh_offers
+from .score_history import get_score_history_writer
+from .sharding import db_alias, for_customer, on_shard, reset_id_sequences, shard_aliases
+from .queues import enqueue
 
-def ingest_customer_data():
+# pandas/openpyxl are imported inside the ingestion tasks only, so importing
+# this module (e.g. when a worker unpickles any job) stays cheap
+
+def _plain_value(value):
+    import pandas as pd
+
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.date()
+    if hasattr(value, 'item'):
+        # numpy scalar
+        value = value.item()
+    if isinstance(value, float):
+        # Decimal of the printed value: 8.2, not 8.199999999999999289...
+        return Decimal(repr(value))
+    return value
+
+def _records(df):
     """
-    Background task to ingest customer data from Excel file
+    Rows of a DataFrame as dicts of plain Python values (int, Decimal, str,
+    date), so chunk jobs unpickle without pandas or numpy
     """
-    try:
-        # Read customer data
-        df = pd.read_excel('customer_data.xlsx')
-        
-        customers_created = 0
-        for _, row in df.iterrows():
-            try:
-                # Calculate approved limit (36 * monthly_salary rounded to nearest lakh)
-                approved_limit = round((36 * row['monthly_salary']) / 100000) * 100000
-                
+    return [
+        {column: _plain_value(value) for column, value in row.items()}
+        for row in df.to_dict('records')
+    ]
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def ingest_customer_rows(rows):
+    """
+    Background task creating customers from Excel rows (dicts); existing
+    customer IDs are skipped. Returns the number created
+    """
+    customers_created = 0
+    for row in rows:
+        try:
+            # Calculate approved limit (36 * monthly_salary rounded to nearest lakh)
+            approved_limit = round((36 * row['monthly_salary']) / 100000) * 100000
+            
+            with for_customer(row['customer_id']):
                 customer, created = Customer.objects.get_or_create(
                     customer_id=row['customer_id'],
                     defaults={
@@ -30,36 +83,29 @@ def ingest_customer_data():
                         'age': row.get('age', 25)  # Use age from Excel or default to 25
                     }
                 )
-                if created:
-                    customers_created += 1
-            except Exception as e:
-                print(f"Error creating customer {row.get('customer_id', 'unknown')}: {e}")
-                continue
-        
-        print(f"Successfully created {customers_created} customers")
-        return f"Created {customers_created} customers"
-        
-    except Exception as e:
-        print(f"Error ingesting customer data: {e}")
-        return f"Error: {e}"
+            if created:
+                customers_created += 1
+        except Exception as e:
+            print(f"Error creating customer {row.get('customer_id', 'unknown')}: {e}")
+            continue
+    return customers_created
 
-def ingest_loan_data():
+def ingest_loan_rows(rows):
     """
-    Background task to ingest loan data from Excel file
+    Background task creating loans from Excel rows (dicts); existing loan
+    IDs are skipped. Loans go to their customer's shard. Call
+    finish_loan_ingestion() after the last chunk. Returns the number created
     """
-    try:
-        # Read loan data
-        df = pd.read_excel('loan_data.xlsx')
-        
-        loans_created = 0
-        for _, row in df.iterrows():
-            try:
+    loans_created = 0
+    for row in rows:
+        try:
+            with for_customer(row['customer_id']):
                 # Get customer
                 customer = Customer.objects.get(customer_id=row['customer_id'])
                 
                 # Parse dates
-                start_date = pd.to_datetime(row['start_date']).date()
-                end_date = pd.to_datetime(row['end_date']).date()
+                start_date = _as_date(row['start_date'])
+                end_date = _as_date(row['end_date'])
                 
                 # Determine if loan is still active
                 is_active = end_date > datetime.now().date()
@@ -73,22 +119,67 @@ def ingest_loan_data():
                         'interest_rate': row['interest_rate'],
                         'monthly_repayment': row['monthly_repayment'],
                         'emis_paid_on_time': row['EMIs_paid_on_time'],
+                        # The source data has no late payments
+                        'emis_paid': row['EMIs_paid_on_time'],
                         'start_date': start_date,
                         'end_date': end_date,
                         'is_active': is_active
                     }
                 )
-                if created:
-                    loans_created += 1
-                    
-            except Customer.DoesNotExist:
-                print(f"Customer {row.get('customer_id', 'unknown')} not found for loan {row.get('loan_id', 'unknown')}")
-                continue
-            except Exception as e:
-                print(f"Error creating loan {row.get('loan_id', 'unknown')}: {e}")
-                continue
+            if created:
+                loans_created += 1
+                
+        except Customer.DoesNotExist:
+            print(f"Customer {row.get('customer_id', 'unknown')} not found for loan {row.get('loan_id', 'unknown')}")
+            continue
+        except Exception as e:
+            print(f"Error creating loan {row.get('loan_id', 'unknown')}: {e}")
+            continue
+    return loans_created
+
+def finish_loan_ingestion():
+    """
+    Background task run once loans were bulk loaded: bulk loads bypass
+    create_approved_loan, so the counters and offers are recomputed, and
+    shard ID sequences move past the loaded IDs
+    """
+    reset_id_sequences()
+    rebuild_portfolio_counters()
+    refresh_offers(all_customers=True)
+    return "Portfolio counters and offers rebuilt"
+
+def ingest_customer_data():
+    """
+    Background task to ingest customer data from Excel file
+    """
+    import pandas as pd
+
+    try:
+        # Read customer data
+        df = pd.read_excel('customer_data.xlsx')
+        customers_created = ingest_customer_rows(_records(df))
+        
+        print(f"Successfully created {customers_created} customers")
+        return f"Created {customers_created} customers"
+        
+    except Exception as e:
+        print(f"Error ingesting customer data: {e}")
+        return f"Error: {e}"
+
+def ingest_loan_data():
+    """
+    Background task to ingest loan data from Excel file
+    """
+    import pandas as pd
+
+    try:
+        # Read loan data
+        df = pd.read_excel('loan_data.xlsx')
+        loans_created = ingest_loan_rows(_records(df))
         
         print(f"Successfully created {loans_created} loans")
+        if loans_created:
+            finish_loan_ingestion()
         return f"Created {loans_created} loans"
         
     except Exception as e:
@@ -105,4 +196,255 @@ def ingest_all_data():
     return {
         'customers': customer_result,
         'loans': loan_result
-    }
\ No newline at end of file
+    }
+
+def _enqueue_chunks(func, rows, chunk_size, depends_on=None):
+    return [
+        enqueue(func, rows[start:start + chunk_size], depends_on=depends_on)
+        for start in range(0, len(rows), chunk_size)
+    ]
+
+def plan_ingestion(chunk_size=None):
+    """
+    Background task splitting both Excel files into chunk jobs on the bulk
+    queue: customers first, loans once every customer chunk has finished,
+    then finish_loan_ingestion(). Between chunks workers go back to the
+    queues, so high priority jobs never wait for a whole load
+    """
+    import pandas as pd
+
+    chunk_size = chunk_size or settings.INGESTION_CHUNK_SIZE
+    customer_rows = _records(pd.read_excel('customer_data.xlsx'))
+    loan_rows = _records(pd.read_excel('loan_data.xlsx'))
+
+    customer_jobs = _enqueue_chunks(ingest_customer_rows, customer_rows, chunk_size)
+    loan_jobs = _enqueue_chunks(ingest_loan_rows, loan_rows, chunk_size, depends_on=customer_jobs or None)
+    enqueue(finish_loan_ingestion, depends_on=loan_jobs or None)
+    return {'customer_chunks': len(customer_jobs), 'loan_chunks': len(loan_jobs)}
+
+def _claim_applications(batch_size):
+    """
+    Mark up to batch_size pending applications as processing and return them.
+    SKIP LOCKED lets several workers claim disjoint batches; applications left
+    in processing by a crashed worker become claimable again once stale
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.LOAN_APPLICATION_STALE_SECONDS)
+    with transaction.atomic(using=db_alias()):
+        claimable = LoanApplication.objects.select_for_update(skip_locked=True).filter(
+            Q(status=LoanApplication.PENDING)
+            | Q(status=LoanApplication.PROCESSING, updated_at__lt=stale_before)
+        )
+        application_ids = list(
+            claimable.order_by('application_id').values_list('application_id', flat=True)[:batch_size]
+        )
+        LoanApplication.objects.filter(application_id__in=application_ids).update(
+            status=LoanApplication.PROCESSING, updated_at=timezone.now()
+        )
+    return list(LoanApplication.objects.filter(application_id__in=application_ids).order_by('application_id'))
+
+def _decide_customer_applications(customer_id, applications):
+    """
+    Decide one customer's applications in submission order under a lock on
+    the customer row, reading the loan aggregates once for all of them
+    """
+    with transaction.atomic(using=db_alias()):
+        customer = Customer.objects.select_for_update().filter(customer_id=customer_id).first()
+        loan_stats = customer_loan_stats(customer) if customer else None
+        
+        for application in applications:
+            if customer is None:
+                result = customer_not_found_result(application.interest_rate)
+                application.status = LoanApplication.REJECTED
+                application.message = result['message']
+            else:
+                result = decide_loan(
+                    customer, loan_stats, application.loan_amount,
+                    application.interest_rate, application.tenure
+                )
+                application.message = result['message']
+                application.corrected_interest_rate = result['corrected_interest_rate']
+                application.monthly_installment = result['monthly_installment']
+                if result['approval']:
+                    loan = create_approved_loan(
+                        customer, application.loan_amount, application.tenure,
+                        result['corrected_interest_rate'], result['monthly_installment'],
+                        current_emis=loan_stats['current_emis']
+                    )
+                    add_loan_to_stats(loan_stats, loan)
+                    application.loan = loan
+                    application.status = LoanApplication.APPROVED
+                    application.message = 'Loan approved successfully'
+                else:
+                    application.status = LoanApplication.REJECTED
+            record_loan_decision(
+                application.status == LoanApplication.APPROVED,
+                result['credit_score'] if customer else None
+            )
+            # Audited once the decision commits: a rolled back batch is retried
+            transaction.on_commit(partial(
+                record_decision, DecisionAuditRecord.LOAN_APPLICATION, customer_id,
+                application.loan_amount, application.interest_rate, application.tenure, result,
+                message=application.message, loan_id=application.loan_id
+            ), using=db_alias())
+            application.processed_at = timezone.now()
+            application.save()
+
+def application_result(application):
+    """
+    Public representation of an application's status and decision
+    """
+    return {
+        'application_id': application.application_id,
+        'customer_id': application.customer_id,
+        'status': application.status,
+        'loan_approved': application.status == LoanApplication.APPROVED,
+        'loan_id': application.loan_id,
+        'message': application.message,
+        # Decimal, sent as a string like everywhere else in the API
+        'monthly_installment': application.monthly_installment,
+    }
+
+def _send_callback(application):
+    try:
+        request = urllib.request.Request(
+            application.callback_url,
+            data=json.dumps(application_result(application), cls=DjangoJSONEncoder).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=settings.LOAN_CALLBACK_TIMEOUT):
+            pass
+    except Exception as e:
+        logging.warning(f"Callback for application {application.application_id} failed: {e}")
+
+def _process_shard_applications(batch_size):
+    processed = 0
+    while True:
+        applications = _claim_applications(batch_size)
+        if not applications:
+            break
+        
+        by_customer = defaultdict(list)
+        for application in applications:
+            by_customer[application.customer_id].append(application)
+        for customer_id, customer_applications in by_customer.items():
+            try:
+                _decide_customer_applications(customer_id, customer_applications)
+            except Exception as e:
+                # Leave them in processing; they are retried once stale
+                logging.error(f"Error deciding applications for customer {customer_id}: {e}")
+                continue
+            for application in customer_applications:
+                if application.callback_url:
+                    _send_callback(application)
+        processed += len(applications)
+    return processed
+
+def process_loan_applications(batch_size=None):
+    """
+    Background task deciding pending loan applications in batches until none
+    are left, grouping each batch by customer to share aggregate reads.
+    Applications live on their customer's shard, which are drained in turn
+    """
+    batch_size = batch_size or settings.LOAN_APPLICATION_BATCH_SIZE
+    processed = 0
+    try:
+        for alias in shard_aliases():
+            with on_shard(alias):
+                processed += _process_shard_applications(batch_size)
+    finally:
+        # RQ work horses exit without running atexit handlers
+        get_score_history_writer().flush()
+        get_decision_audit_writer().flush()
+    
+    return f"Processed {processed} loan applications"
+
+def requeue_loan_applications():
+    """
+    Periodic task recovering applications no job will pick up: pending ones
+    whose enqueue failed or whose job was lost, and ones a worker left in
+    processing (crashed mid-batch, or deciding them raised). Enqueues one
+    process_loan_applications() job if any shard has some. Returns how many
+    were found
+    """
+    now = timezone.now()
+    pending_before = now - timedelta(seconds=settings.LOAN_APPLICATION_REQUEUE_SECONDS)
+    stale_before = now - timedelta(seconds=settings.LOAN_APPLICATION_STALE_SECONDS)
+    stuck = 0
+    for alias in shard_aliases():
+        with on_shard(alias):
+            stuck += LoanApplication.objects.filter(
+                Q(status=LoanApplication.PENDING, created_at__lt=pending_before)
+                | Q(status=LoanApplication.PROCESSING, updated_at__lt=stale_before)
+            ).count()
+    if stuck:
+        logging.warning(f"Re-enqueueing {stuck} stuck loan applications")
+        enqueue(process_loan_applications)
+    return stuck
+
+def close_matured_loans(batch_size=5000):
+    """
+    Background task deactivating active loans past their end date, in
+    batches, and taking them out of the portfolio counters, shard by shard
+    """
+    today = datetime.now().date()
+    closed = 0
+    for alias in shard_aliases():
+        with on_shard(alias):
+            while True:
+                loan_ids = list(
+                    Loan.objects.filter(is_active=True, end_date__lte=today)
+                    .order_by('loan_id').values_list('loan_id', flat=True)[:batch_size]
+                )
+                if not loan_ids:
+                    break
+                closed += close_loans(loan_ids)
+    return f"Closed {closed} matured loans"
+
+def create_decision_audit_partitions(months_ahead=None):
+    """
+    Background task creating the coming monthly partitions of the decision
+    audit log (Postgres only)
+    """
+    created = create_audit_partitions(months_ahead)
+    return f"Created {len(created)} audit log partitions: {', '.join(created) or 'none needed'}"
+
+def store_customer_offers(customer_id):
+    """
+    Background task storing the offers of a customer whose offers were
+    computed by a read after they were invalidated
+    """
+    with for_customer(customer_id):
+        offers = refresh_customer_offers(customer_id)
+    return f"Stored {len(offers or [])} offers for customer {customer_id}"
+
+def open_feed(path):
+    """
+    Open a feed CSV, gzip-compressed if it ends in .gz
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, newline='')
+
+def process_repayment_file(path, batch_size=None):
+    """
+    Background task applying a repayment feed file, then pruning event IDs
+    past the retention window
+    """
+    with open_feed(path) as feed:
+        totals = process_repayment_events(read_csv_events(feed), batch_size)
+    totals['pruned_event_ids'] = prune_repayment_events()
+    # Recompute the offers the feed invalidated, rather than on the next reads
+    totals['offers_refreshed'] = refresh_offers()
+    logging.info(f"Repayment feed {path} processed: {totals}")
+    return totals
+
+def process_salary_file(path, batch_size=None):
+    """
+    Background task applying a payroll salary refresh file
+    """
+    with open_feed(path) as feed:
+        totals = process_salary_rows(read_csv_salaries(feed), batch_size)
+    totals['offers_refreshed'] = refresh_offers()
+    logging.info(f"Salary refresh {path} processed: {totals}")
+    return totals
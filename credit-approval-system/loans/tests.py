@@ -0,0 +1,974 @@
+import io
+import json
+import pickle
+import random
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal, localcontext
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from . import archive, offers, tasks
+from .admission import ConcurrencyLimiter, admission_class
+from .archive import archive_loan_batch
+from .audit import AUDIT_TABLE, DEFAULT_PARTITION, RULE_THRESHOLDS, create_audit_partitions
+from .buffering import BufferedWriter
+from .caching import loan_version, response_cache_stats
+from .exports import CUSTOMER_COLUMNS, iter_snapshot_batches, next_watermark
+from .management.commands.benchmark_emi import STANDARD_TENURES, decimal_emi
+from .middleware import AdmissionControlMiddleware
+from .models import (
+    ArchivedLoan, CreditScoreSnapshot, Customer, DecisionAuditRecord, Loan, LoanApplication, LoanOffer,
+    PortfolioCounter, ShardSequence
+)
+from .money import emi_paise, from_paise, max_principal_paise, outstanding_paise, to_basis_points, to_paise
+from .offers import compute_offer_batch, compute_offers, refresh_offers
+from .parsers import MessagePackParser
+from .queues import QUEUE_PRIORITY, TASK_QUEUES, enqueue, worker_queues
+from .portfolio import close_loans, portfolio_stats, rebuild_portfolio_counters
+from .query_budgets import check_budgets
+from .renderers import JSONRenderer, MessagePackRenderer, encode_decimal, packb, unpackb
+from .repayments import process_repayment_events
+from .routers import PrimaryReplicaRouter, pin_customer_to_primary, read_from_replica
+from .salaries import process_salary_rows
+from .sharding import _reserve_ids, reset_id_sequences
+from .tasks import (
+    _records, application_result, process_loan_applications, requeue_loan_applications, store_customer_offers
+)
+from .utils import create_approved_loan, customer_loan_stats, decide_loan
+from .validators import MAX_LOAN_AMOUNT, validate_loan_amount
+from .views import _fetch_in_order
+
+# No Redis: the admin and the views share one in-process cache
+TEST_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    'RESPONSE_CACHE_SECONDS': 0,
+    'PORTFOLIO_STATS_CACHE_SECONDS': 0,
+    'SCORE_HISTORY_FLUSH_SECONDS': 0,
+    'DECISION_AUDIT_FLUSH_SECONDS': 0,
+}
+
+
+def create_customers(count, loans_each=0):
+    customers = []
+    for index in range(count):
+        customer = Customer.objects.create(
+            first_name='Test', last_name=f'Customer{index}', age=35, phone_number=str(9100000000 + index),
+            monthly_salary=Decimal(100000), approved_limit=Decimal(3600000),
+        )
+        Loan.objects.bulk_create([
+            Loan(
+                customer=customer, loan_amount=Decimal(100000), tenure=12, interest_rate=Decimal(12),
+                monthly_repayment=Decimal('8884.88'), start_date=date(2025, 1, 1), end_date=date(2026, 1, 1),
+            )
+            for _ in range(loans_each)
+        ])
+        customers.append(customer)
+    return customers
+
+
+def create_snapshot():
+    return CreditScoreSnapshot(
+        customer_id=1, credit_score=50, approved_limit=0, monthly_salary=0, current_loans_sum=0,
+        current_emis=0, total_loan_volume=0, total_emis=0, paid_on_time=0, loan_count=0,
+        current_year_loans=0, computed_at=timezone.now(),
+    )
+
+
+def create_archived_copy(loan, loan_id=None):
+    return ArchivedLoan.objects.create(
+        loan_id=loan_id or loan.loan_id, customer=loan.customer, loan_amount=loan.loan_amount,
+        tenure=loan.tenure, interest_rate=loan.interest_rate, monthly_repayment=loan.monthly_repayment,
+        start_date=loan.start_date, end_date=loan.end_date, created_at=loan.created_at,
+        updated_at=loan.updated_at,
+    )
+
+@override_settings(**TEST_SETTINGS)
+class AdminQueryCountTests(TestCase):
+    """
+    Admin pages cost a fixed number of queries, however many rows there are:
+    session, user, then the page's own queries
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = create_customers(30, loans_each=3)
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assert_page_queries(self, queries, url, data=None):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_customer_changelist(self):
+        # count, page of rows
+        self.assert_page_queries(4, reverse('admin:loans_customer_changelist'))
+
+    def test_customer_changelist_search(self):
+        response = self.assert_page_queries(4, reverse('admin:loans_customer_changelist'), {'q': 'Customer1'})
+        self.assertContains(response, 'Customer12')
+
+    def test_customer_change_page(self):
+        # savepoint, customer, content type (for the history link), release
+        self.assert_page_queries(6, reverse('admin:loans_customer_change', args=[self.customers[0].pk]))
+
+    def test_loan_changelist(self):
+        # count, page of rows joined to their customers
+        self.assert_page_queries(4, reverse('admin:loans_loan_changelist'))
+
+    def test_loan_changelist_search(self):
+        customer = self.customers[5]
+        response = self.assert_page_queries(
+            4, reverse('admin:loans_loan_changelist'), {'q': str(customer.customer_id)}
+        )
+        self.assertContains(response, reverse('admin:loans_loan_change', args=[customer.loans.first().pk]))
+
+    def test_loan_change_page(self):
+        # savepoint, loan joined to its customer, content type, release, then
+        # the raw-id customer widget's label
+        loan = self.customers[0].loans.first()
+        self.assert_page_queries(7, reverse('admin:loans_loan_change', args=[loan.pk]))
+
+
+@override_settings(**TEST_SETTINGS)
+class IncrementalExportTests(TestCase):
+    """
+    Rows changed after a watermark, e.g. customers whose loans closed or got
+    repaid, are in the next incremental export
+    """
+
+    def setUp(self):
+        self.customer, self.other = create_customers(2, loans_each=1)
+        self.since = timezone.now()
+
+    def exported_customer_ids(self):
+        rows = [row for batch in iter_snapshot_batches('customers', since=self.since) for row in batch]
+        return [row[CUSTOMER_COLUMNS.index('customer_id')] for row in rows]
+
+    def test_closed_loans(self):
+        close_loans(self.customer.loans.values_list('loan_id', flat=True))
+        self.assertEqual(self.exported_customer_ids(), [self.customer.customer_id])
+
+    def test_repayments(self):
+        loan = self.customer.loans.get()
+        process_repayment_events([{'event_id': 'e1', 'loan_id': loan.loan_id, 'on_time': '1'}])
+        self.assertEqual(self.exported_customer_ids(), [self.customer.customer_id])
+
+    def test_watermark_overlaps_the_snapshot(self):
+        with override_settings(EXPORT_WATERMARK_SAFETY_SECONDS=300):
+            self.assertLessEqual(next_watermark(), timezone.now() - timedelta(seconds=300))
+
+    def test_archived_loans_since_they_were_archived(self):
+        loan = self.customer.loans.get()
+        archived = ArchivedLoan.objects.create(
+            loan_id=loan.loan_id, customer=self.customer, loan_amount=loan.loan_amount, tenure=loan.tenure,
+            interest_rate=loan.interest_rate, monthly_repayment=loan.monthly_repayment,
+            start_date=loan.start_date, end_date=loan.end_date,
+            created_at=loan.created_at, updated_at=self.since - timedelta(days=365),
+        )
+        rows = [row for batch in iter_snapshot_batches('archived_loans', since=self.since) for row in batch]
+        self.assertEqual([row[0] for row in rows], [archived.loan_id])
+
+
+class IngestionChunkTests(SimpleTestCase):
+    def test_chunk_rows_are_plain_python(self):
+        import pandas as pd
+
+        df = pd.DataFrame({
+            'loan_id': [1, 2], 'interest_rate': [8.2, 12.0], 'start_date': pd.to_datetime(['2017-03-09', None]),
+        })
+        rows = _records(df)
+        self.assertEqual(rows[0], {'loan_id': 1, 'interest_rate': Decimal('8.2'), 'start_date': date(2017, 3, 9)})
+        self.assertIsNone(rows[1]['start_date'])
+        # Unpickling a chunk job must not import pandas or numpy
+        payload = pickle.dumps(rows)
+        self.assertNotIn(b'pandas', payload)
+        self.assertNotIn(b'numpy', payload)
+
+
+class AdmissionBudgetTests(SimpleTestCase):
+    def test_concurrency_budgets_are_below_the_thread_count(self):
+        for name, budget in settings.ADMISSION_CONTROL['BUDGETS'].items():
+            with self.subTest(name):
+                self.assertLess(budget['CONCURRENCY'], max(settings.GUNICORN_THREADS, 2))
+
+    def test_classes_get_distinct_budgets_at_the_default_thread_count(self):
+        self.assertEqual(settings.GUNICORN_THREADS, 8)
+        budgets = {name: budget['CONCURRENCY'] for name, budget in settings.ADMISSION_CONTROL['BUDGETS'].items()}
+        self.assertEqual(budgets, {'read': 6, 'eligibility': 4, 'submit': 3, 'create': 2})
+
+    def test_limiter_sheds_once_the_budget_is_in_flight(self):
+        limiter = ConcurrencyLimiter(1)
+        self.assertTrue(limiter.acquire(timeout=0))
+        self.assertFalse(limiter.acquire(timeout=0.01))
+        limiter.release()
+        self.assertTrue(limiter.acquire(timeout=0))
+        self.assertEqual(limiter.stats()['shed_overload'], 1)
+
+    def test_client_is_taken_from_the_trusted_proxies_entry(self):
+        admission = {**settings.ADMISSION_CONTROL, 'CLIENT_IP_HEADER': 'HTTP_X_FORWARDED_FOR'}
+        factory = RequestFactory()
+        for trusted, forwarded, client in [
+            (1, '6.6.6.6, 10.0.0.7', '10.0.0.7'),
+            (2, '6.6.6.6, 10.0.0.7, 172.16.0.2', '10.0.0.7'),
+            (2, '10.0.0.7', '127.0.0.1'),
+            (1, '', '127.0.0.1'),
+            (0, '10.0.0.7', '127.0.0.1'),
+        ]:
+            with self.subTest(trusted=trusted, forwarded=forwarded):
+                with override_settings(ADMISSION_CONTROL={**admission, 'TRUSTED_PROXIES': trusted}):
+                    middleware = AdmissionControlMiddleware(lambda request: None)
+                request = factory.get('/', HTTP_X_FORWARDED_FOR=forwarded)
+                self.assertEqual(middleware._client(request), client)
+
+
+@override_settings(**TEST_SETTINGS)
+class LoanApplicationTests(TestCase):
+    def setUp(self):
+        self.customer = create_customers(1)[0]
+        self.payload = {
+            'customer_id': self.customer.customer_id, 'loan_amount': '100000', 'interest_rate': '12', 'tenure': 12,
+        }
+
+    def test_async_submissions_have_their_own_admission_class(self):
+        request = RequestFactory().post('/create-loan/?async=1')
+        request.resolver_match = resolve('/create-loan/')
+        self.assertEqual(admission_class(request), 'submit')
+        request = RequestFactory().post('/create-loan/')
+        request.resolver_match = resolve('/create-loan/')
+        self.assertEqual(admission_class(request), 'create')
+
+    def test_stuck_applications_are_requeued(self):
+        with mock.patch('loans.views.enqueue', side_effect=ConnectionError):
+            response = self.client.post('/create-loan/?async=1', self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        with mock.patch('loans.tasks.enqueue') as enqueue:
+            self.assertEqual(requeue_loan_applications(), 0)
+            LoanApplication.objects.update(created_at=timezone.now() - timedelta(hours=1))
+            self.assertEqual(requeue_loan_applications(), 1)
+        enqueue.assert_called_once_with(process_loan_applications)
+
+    def test_result_serializes_the_installment_as_a_string(self):
+        with mock.patch('loans.views.enqueue'):
+            response = self.client.post('/create-loan/?async=1', self.payload, content_type='application/json')
+        process_loan_applications()
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.json()['status'], LoanApplication.APPROVED)
+        self.assertEqual(response.json()['monthly_installment'], '8884.88')
+        # The callback body, too
+        callback = json.dumps(application_result(LoanApplication.objects.get()), cls=DjangoJSONEncoder)
+        self.assertEqual(json.loads(callback)['monthly_installment'], '8884.88')
+
+
+class EMITests(SimpleTestCase):
+    """
+    The integer-paise EMI against the formula evaluated in 50-digit Decimal
+    """
+
+    def assert_matches_reference(self, amount, rate, tenure):
+        expected = decimal_emi(amount, rate, tenure)
+        self.assertEqual(from_paise(emi_paise(to_paise(amount), to_basis_points(rate), tenure)), expected)
+
+    def test_random_loans(self):
+        rng = random.Random(34)
+        for _ in range(2000):
+            amount = Decimal(rng.randint(1000, 1000000000)).scaleb(-2)
+            rate = Decimal(rng.randrange(0, 5001, 25)).scaleb(-2)
+            tenure = rng.choice(STANDARD_TENURES)
+            with self.subTest(amount=amount, rate=rate, tenure=tenure):
+                self.assert_matches_reference(amount, rate, tenure)
+
+    def test_edge_cases(self):
+        cases = [
+            (Decimal('0.03'), Decimal(0), 2),  # exact half paise rounds up
+            (Decimal('10000000'), Decimal('50'), 360),  # largest loan
+            (Decimal('100000'), Decimal('0.01'), 1),
+            (Decimal('1.00'), Decimal('12.5'), 600),
+        ]
+        for amount, rate, tenure in cases:
+            with self.subTest(amount=amount, rate=rate, tenure=tenure):
+                self.assert_matches_reference(amount, rate, tenure)
+
+    def test_max_principal_inverts_the_emi(self):
+        for installment, rate_bp, tenure in [(888488, 1200, 12), (1, 1600, 360), (5000000, 0, 7)]:
+            principal = max_principal_paise(installment, rate_bp, tenure)
+            self.assertLessEqual(emi_paise(principal, rate_bp, tenure), installment)
+            self.assertGreater(emi_paise(principal + 1, rate_bp, tenure), installment)
+
+
+@override_settings(**TEST_SETTINGS)
+class BufferedWriterTests(TestCase):
+    def test_snapshots_of_a_rolled_back_decision_are_not_written(self):
+        customer = create_customers(1, loans_each=1)[0]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                decide_loan(customer, customer_loan_stats(customer), Decimal(100000), Decimal(12), 12)
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            decide_loan(customer, customer_loan_stats(customer), Decimal(100000), Decimal(12), 12)
+        self.assertEqual(CreditScoreSnapshot.objects.filter(customer_id=customer.customer_id).count(), 1)
+
+    def test_failures_are_counted_per_database(self):
+        writer = BufferedWriter(CreditScoreSnapshot, flush_interval=60)
+        writer._buffer = [('default', create_snapshot()) for _ in range(2)] + [('missing', create_snapshot())]
+        with mock.patch('loans.buffering.logging'):
+            self.assertEqual(writer.flush(), 2)
+        self.assertEqual((writer.written, writer.dropped), (2, 1))
+
+
+@override_settings(**TEST_SETTINGS)
+class PortfolioCounterTests(TestCase):
+    def setUp(self):
+        rebuild_portfolio_counters()
+        self.customers = create_customers(3)
+
+    def open_loan(self, customer, slot):
+        with mock.patch('loans.portfolio.counter_slot', return_value=slot):
+            return create_approved_loan(customer, Decimal(100000), 12, Decimal(12), Decimal('8884.88'))
+
+    def test_slots_add_up_to_the_rebuilt_totals(self):
+        for slot, customer in enumerate(self.customers):
+            self.open_loan(customer, slot)
+        self.assertEqual(PortfolioCounter.objects.filter(name='active_loans').count(), 3)
+        with mock.patch('loans.portfolio.counter_slot', return_value=5):
+            close_loans([self.customers[0].loans.get().loan_id])
+        stats = portfolio_stats()
+        rebuilt = rebuild_portfolio_counters()
+        self.assertEqual(stats['active_loans'], rebuilt['active_loans'])
+        self.assertEqual(stats['total_exposure'], float(rebuilt['exposure']))
+        self.assertEqual(stats['emi_burden_distribution']['0-10'], 2)
+
+    def test_close_loans_takes_a_queryset_in_batches(self):
+        for customer in self.customers:
+            self.open_loan(customer, 0)
+        loans = Loan.objects.filter(customer__in=self.customers[:2])
+        # Per batch: savepoint, locked loans, their customers, loan and
+        # customer updates, four counters, offers, release; then an empty batch
+        with mock.patch('loans.portfolio.counter_slot', return_value=0), self.assertNumQueries(2 * 11 + 3):
+            self.assertEqual(close_loans(loans, batch_size=1), 2)
+        self.assertEqual(portfolio_stats()['active_loans'], 1)
+
+
+class OfferTests(SimpleTestCase):
+    def test_offers_stay_within_the_create_path_bounds(self):
+        loan_stats = {
+            'current_loans_sum': None, 'current_emis': None, 'total_loan_volume': None, 'total_emis': None,
+            'paid_on_time': None, 'loan_count': 0, 'current_year_loans': 0,
+        }
+        # A salary and limit large enough that only the 1 crore cap binds
+        offers = compute_offers(1, loan_stats, Decimal('1000000000'), Decimal('50000000'), timezone.now())
+        for offer in offers:
+            with self.subTest(tenure=offer.tenure):
+                self.assertEqual(validate_loan_amount(offer.max_loan_amount), MAX_LOAN_AMOUNT)
+
+    def test_batch_matches_one_customer_at_a_time(self):
+        now = timezone.now()
+        rows = [
+            {
+                'customer_id': customer_id, 'approved_limit': Decimal(limit), 'monthly_salary': Decimal(salary),
+                'current_loans_sum': Decimal(current), 'current_emis': Decimal(emis), 'total_loan_volume': Decimal(current),
+                'total_emis': tenure, 'paid_on_time': paid, 'loan_count': count, 'current_year_loans': 0,
+            }
+            for customer_id, limit, salary, current, emis, tenure, paid, count in [
+                (1, 3600000, 100000, 0, 0, 0, 0, 0),
+                (2, 1800000, 50000, 600000, 20000, 24, 24, 2),
+                (3, 1800000, 50000, 600000, 20000, 24, 6, 2),
+                (4, 900000, 25000, 950000, 5000, 12, 12, 1),
+            ]
+        ]
+        batch = {(offer.customer_id, offer.tenure): offer for offer in compute_offer_batch(rows, now)}
+        self.assertEqual(len(batch), len(rows) * len(settings.OFFER_TENURES))
+        for row in rows:
+            for offer in compute_offers(row['customer_id'], row, row['approved_limit'], row['monthly_salary'], now):
+                with self.subTest(customer=row['customer_id'], tenure=offer.tenure):
+                    batched = batch[(offer.customer_id, offer.tenure)]
+                    self.assertEqual(
+                        (batched.max_loan_amount, batched.monthly_installment, batched.interest_rate),
+                        (offer.max_loan_amount, offer.monthly_installment, offer.interest_rate)
+                    )
+
+
+@override_settings(**TEST_SETTINGS)
+class ViewOffersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer, = create_customers(1, loans_each=1)
+        self.url = reverse('view_offers', args=[self.customer.customer_id])
+
+    def test_miss_is_computed_without_writes_and_stored_by_a_job(self):
+        with mock.patch('loans.views.enqueue') as enqueue:
+            response = self.client.get(self.url)
+            self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['offers']), len(settings.OFFER_TENURES))
+        self.assertFalse(LoanOffer.objects.exists())
+        enqueue.assert_called_once_with(store_customer_offers, self.customer.customer_id)
+
+        store_customer_offers(self.customer.customer_id)
+        with self.assertNumQueries(1):
+            stored = self.client.get(self.url)
+        self.assertEqual(stored.json()['offers'], response.json()['offers'])
+
+    def test_refresh_job_matches_the_read(self):
+        with mock.patch('loans.views.enqueue'):
+            response = self.client.get(self.url)
+        self.assertEqual(refresh_offers(), 1)
+        self.assertEqual(self.client.get(self.url).json()['offers'], response.json()['offers'])
+
+    @override_settings(OFFER_TENURES=[])
+    def test_no_tenures_configured(self):
+        with mock.patch('loans.views.enqueue') as enqueue:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['offers'], [])
+        self.assertIsNone(response.json()['credit_score'])
+        enqueue.assert_not_called()
+
+    def test_unknown_customer(self):
+        response = self.client.get(reverse('view_offers', args=[self.customer.customer_id + 1000]))
+        self.assertEqual(response.status_code, 404)
+
+
+class WireFormatTests(SimpleTestCase):
+    """
+    Payloads survive both renderers and their parsers: Decimals keep their
+    scale in MessagePack and are strings in JSON; dates are ISO strings in both
+    """
+    payload = {
+        'loan_amount': Decimal('250000.50'),
+        'start_date': date(2026, 1, 31),
+        'loans': [
+            {'interest_rate': Decimal('12.00'), 'end_date': date(2027, 1, 31), 'emis': [Decimal('-0.01'), 3]},
+            [],
+        ],
+    }
+
+    def round_trip(self, renderer, parser):
+        content = renderer.render(self.payload, renderer.media_type)
+        return parser.parse(io.BytesIO(content), parser.media_type, {})
+
+    def test_msgpack_round_trip(self):
+        data = self.round_trip(MessagePackRenderer(), MessagePackParser())
+        self.assertEqual(data, {
+            'loan_amount': Decimal('250000.50'),
+            'start_date': '2026-01-31',
+            'loans': [
+                {'interest_rate': Decimal('12.00'), 'end_date': '2027-01-31', 'emis': [Decimal('-0.01'), 3]},
+                [],
+            ],
+        })
+        self.assertEqual(str(data['loan_amount']), '250000.50')
+        self.assertEqual(str(data['loans'][0]['interest_rate']), '12.00')
+
+    def test_json_round_trip(self):
+        data = self.round_trip(JSONRenderer(), JSONParser())
+        self.assertEqual(data, {
+            'loan_amount': '250000.50',
+            'start_date': '2026-01-31',
+            'loans': [{'interest_rate': '12.00', 'end_date': '2027-01-31', 'emis': ['-0.01', 3]}, []],
+        })
+
+    def test_decimal_outside_64_bits(self):
+        encode_decimal(Decimal('9' * 18))
+        with self.assertRaises(ValueError):
+            encode_decimal(Decimal('9' * 20))
+        with self.assertRaises(ValueError):
+            encode_decimal(Decimal('NaN'))
+
+    def test_malformed_msgpack(self):
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
+
+
+@override_settings(**TEST_SETTINGS)
+class ContentNegotiationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, = create_customers(1, loans_each=1)
+        cls.loan = cls.customer.loans.get()
+        cls.eligibility = {
+            'customer_id': cls.customer.customer_id, 'loan_amount': Decimal('50000.00'),
+            'interest_rate': Decimal('14.00'), 'tenure': 12,
+        }
+
+    def test_json_by_default(self):
+        response = self.client.get(reverse('view_loan', args=[self.loan.loan_id]))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['loan_amount'], '100000.00')
+
+    def test_msgpack_by_accept_header_or_format(self):
+        url = reverse('view_loan', args=[self.loan.loan_id])
+        for response in (
+            self.client.get(url, HTTP_ACCEPT='application/msgpack'),
+            self.client.get(url, {'format': 'msgpack'}),
+        ):
+            self.assertEqual(response['Content-Type'], 'application/msgpack')
+            data = unpackb(response.content)
+            self.assertEqual(str(data['loan_amount']), '100000.00')
+            self.assertEqual(data['customer']['id'], self.customer.customer_id)
+
+    def test_msgpack_request_body(self):
+        response = self.client.post(
+            reverse('check_eligibility'), packb(self.eligibility),
+            content_type='application/msgpack', HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, 200)
+        data = unpackb(response.content)
+        self.assertEqual(data['interest_rate'], Decimal('14.00'))
+        self.assertIsInstance(data['monthly_installment'], Decimal)
+
+    def test_json_request_body_msgpack_response(self):
+        response = self.client.post(
+            reverse('check_eligibility'), json.dumps(self.eligibility, cls=DjangoJSONEncoder),
+            content_type='application/json', HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(unpackb(response.content)['customer_id'], self.customer.customer_id)
+
+    def test_unacceptable_media_type(self):
+        response = self.client.get(reverse('view_loan', args=[self.loan.loan_id]), HTTP_ACCEPT='application/xml')
+        self.assertEqual(response.status_code, 406)
+
+    def test_unsupported_content_type(self):
+        response = self.client.post(reverse('check_eligibility'), '<loan/>', content_type='application/xml')
+        self.assertEqual(response.status_code, 415)
+
+    def test_malformed_msgpack_body(self):
+        response = self.client.post(reverse('check_eligibility'), b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(**TEST_SETTINGS, SHARD_DATABASE_ALIASES=['default'])
+class ShardSequenceTests(TestCase):
+    """
+    Shard ID sequences start past loans already archived, so new loans never
+    reuse an ID view_loan would find in the archive
+    """
+    name = 'loans.loan:default'
+
+    def setUp(self):
+        customer, = create_customers(1, loans_each=1)
+        loan = customer.loans.get()
+        self.archived_id = loan.loan_id + 100
+        create_archived_copy(loan, loan_id=self.archived_id)
+
+    def test_new_sequence_starts_past_archived_loans(self):
+        self.assertEqual(_reserve_ids(Loan, 'default', 10), self.archived_id + 1)
+
+    def test_reset_moves_past_archived_loans(self):
+        ShardSequence.objects.create(name=self.name, next_value=1)
+        reset_id_sequences()
+        self.assertEqual(ShardSequence.objects.get(name=self.name).next_value, self.archived_id + 1)
+
+
+@override_settings(**TEST_SETTINGS)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.customer, = create_customers(1, loans_each=2)
+        self.customer.loans.update(is_active=False)
+        self.today = date(2026, 6, 1)
+
+    def test_archives_and_folds_closed_loans(self):
+        self.assertEqual(archive_loan_batch(today=self.today), 2)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.archived_loan_count, 2)
+        self.assertEqual(self.customer.archived_loan_volume, Decimal(200000))
+        self.assertFalse(self.customer.loans.exists())
+        self.assertEqual(ArchivedLoan.objects.filter(customer=self.customer).count(), 2)
+
+    def test_archive_conflict_keeps_the_loans(self):
+        create_archived_copy(self.customer.loans.first())
+        with self.assertRaises(IntegrityError):
+            archive_loan_batch(today=self.today)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.archived_loan_count, 0)
+        self.assertEqual(self.customer.loans.count(), 2)
+
+
+@override_settings(**TEST_SETTINGS)
+class ConditionalResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer, = create_customers(1, loans_each=1)
+        self.loan = self.customer.loans.get()
+        self.url = reverse('view_loan', args=[self.loan.loan_id])
+
+    def test_not_modified_while_unchanged(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response_cache_stats()['view_loan']['not_modified'], 1)
+
+    def test_etag_changes_after_a_write(self):
+        etag = self.client.get(self.url)['ETag']
+        process_repayment_events([{'event_id': 'e1', 'loan_id': self.loan.loan_id, 'on_time': '1'}])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(RESPONSE_CACHE_SECONDS=60)
+    def test_cached_bodies_are_keyed_by_accept(self):
+        first = self.client.get(self.url)
+        packed = self.client.get(self.url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(packed['Content-Type'], 'application/msgpack')
+        self.assertEqual(unpackb(packed.content)['loan_id'], self.loan.loan_id)
+        again = self.client.get(self.url)
+        self.assertEqual(again['Content-Type'], 'application/json')
+        self.assertEqual(again.content, first.content)
+        self.assertIn('Accept', again['Vary'])
+        self.assertEqual(response_cache_stats()['view_loan']['cache_hits'], 1)
+
+    def test_pinned_customer_version_is_read_again_from_the_primary(self):
+        with mock.patch('loans.caching.replica_configured', return_value=True):
+            with mock.patch('loans.caching.is_customer_pinned', return_value=False), self.assertNumQueries(1):
+                self.assertIsNotNone(loan_version(self.loan.loan_id))
+            with mock.patch('loans.caching.is_customer_pinned', return_value=True) as pinned:
+                with self.assertNumQueries(2):
+                    self.assertIsNotNone(loan_version(self.loan.loan_id))
+            pinned.assert_called_once_with(self.customer.customer_id)
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Every endpoint stays within its query budget in loans/query_budgets.py.
+    Transactions really commit, so on_commit work is counted as in
+    production; timings vary too much between machines to enforce here
+    """
+
+    def test_endpoints_within_query_budgets(self):
+        _, violations = check_budgets(repeat=1, enforce_time=False)
+        self.assertEqual(violations, [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The audit table is only partitioned on Postgres')
+class AuditPartitionTests(TestCase):
+    now = datetime(2031, 1, 15, tzinfo=dt_timezone.utc)
+    partition = f'{AUDIT_TABLE}_2031_01'
+
+    def create_record(self, decided_at):
+        return DecisionAuditRecord.objects.create(
+            decided_at=decided_at, source=DecisionAuditRecord.CHECK_ELIGIBILITY, customer_id=1,
+            loan_amount=Decimal(100000), interest_rate=Decimal(12), tenure=12, credit_score=50,
+            corrected_interest_rate=Decimal(12), monthly_installment=Decimal('8884.88'), approved=True,
+            message='Loan approved', **RULE_THRESHOLDS
+        )
+
+    def partition_count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+            return cursor.fetchone()[0]
+
+    def test_rows_move_out_of_the_default_partition(self):
+        january = self.create_record(self.now)
+        february = self.create_record(self.now + timedelta(days=31))
+        self.assertEqual(self.partition_count(DEFAULT_PARTITION), 2)
+
+        self.assertEqual(create_audit_partitions(months_ahead=0, now=self.now), [self.partition])
+        self.assertEqual(self.partition_count(self.partition), 1)
+        self.assertEqual(self.partition_count(DEFAULT_PARTITION), 1)
+        self.assertEqual(
+            list(DecisionAuditRecord.objects.order_by('decided_at').values_list('id', flat=True)),
+            [january.id, february.id]
+        )
+        # Already attached: nothing to create
+        self.assertEqual(create_audit_partitions(months_ahead=0, now=self.now), [])
+
+
+@override_settings(**TEST_SETTINGS)
+class RepaymentTests(TestCase):
+    """
+    The repayment feed against a 12-month loan of 1 lakh at 12%, whose EMI
+    is 8884.88
+    """
+
+    def setUp(self):
+        self.customer, = create_customers(1, loans_each=1)
+        Customer.objects.filter(pk=self.customer.pk).update(current_debt=Decimal(100000))
+        self.loan = self.customer.loans.get()
+        rebuild_portfolio_counters()
+
+    def events(self, *on_time, prefix='e'):
+        return [
+            {'event_id': f'{prefix}{index}', 'loan_id': self.loan.loan_id, 'on_time': str(int(flag))}
+            for index, flag in enumerate(on_time)
+        ]
+
+    def owed_after(self, payments):
+        return from_paise(outstanding_paise(10000000, 1200, 888488, payments))
+
+    def test_replayed_feed_is_a_no_op(self):
+        feed = self.events(True, False)
+        self.assertEqual(process_repayment_events(feed)['loans_updated'], 1)
+        replay = process_repayment_events(feed)
+        self.assertEqual(replay['duplicates'], 2)
+        self.assertEqual(replay.get('loans_updated', 0), 0)
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.emis_paid, self.loan.emis_paid_on_time), (2, 1))
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_debt, self.owed_after(2))
+
+    def test_several_events_for_one_loan_in_a_batch(self):
+        feed = self.events(True, False, True)
+        feed.append(dict(feed[0]))  # the same event twice in one file
+        totals = process_repayment_events(feed)
+        self.assertEqual((totals['applied'], totals['duplicates'], totals['loans_updated']), (3, 1, 1))
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.emis_paid, self.loan.emis_paid_on_time), (3, 2))
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_debt, self.owed_after(3))
+
+    def test_fully_repaid_loan_is_closed(self):
+        process_repayment_events(self.events(*[True] * 10))
+        totals = process_repayment_events(self.events(True, True, prefix='last'))
+        self.assertEqual(totals['loans_repaid'], 1)
+        self.loan.refresh_from_db()
+        self.assertFalse(self.loan.is_active)
+        self.assertEqual(self.loan.emis_paid, 12)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_debt, 0)
+        self.assertEqual(portfolio_stats()['active_loans'], 0)
+        # Events for a closed loan are recorded but change nothing
+        after = process_repayment_events(self.events(True, prefix='late'))
+        self.assertEqual(after['inactive_loan'], 1)
+
+    def test_outstanding_matches_the_amortized_balance(self):
+        for principal, rate, tenure in [(Decimal(100000), Decimal(12), 12), (Decimal('2500000.50'), Decimal('8.75'), 240)]:
+            installment = decimal_emi(principal, rate, tenure)
+            with localcontext() as context:
+                context.prec = 60
+                monthly_rate = rate / 1200
+                balance = principal
+                for payments in range(1, tenure + 1):
+                    # Month by month: interest accrues, then the installment is paid
+                    balance = balance * (1 + monthly_rate) - installment
+                    expected = max(Decimal(0), balance.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+                    with self.subTest(principal=principal, payments=payments):
+                        self.assertEqual(
+                            from_paise(outstanding_paise(
+                                to_paise(principal), to_basis_points(rate), to_paise(installment), payments
+                            )),
+                            expected
+                        )
+
+
+@override_settings(**TEST_SETTINGS)
+class SalaryRefreshTests(TestCase):
+    def setUp(self):
+        self.customers = create_customers(8, loans_each=1)
+        rebuild_portfolio_counters()
+
+    def refresh(self, salaries):
+        return process_salary_rows([
+            {'customer_id': customer.customer_id, 'monthly_salary': salary}
+            for customer, salary in zip(self.customers, salaries)
+        ])
+
+    def test_sql_limit_rounds_like_registration(self):
+        # 36 * salary lands exactly on half a lakh for the first three, so
+        # they round to even (4, 14 and 22 lakhs); the others sit a paisa away
+        salaries = ['12500.00', '37500.00', '62500.00', '12499.99', '12500.01', '2777.78', '1388.89', '999999.99']
+        self.assertEqual(self.refresh(salaries)['updated'], len(salaries))
+        for customer, salary in zip(self.customers, salaries):
+            customer.refresh_from_db()
+            with self.subTest(salary=salary):
+                self.assertEqual(customer.approved_limit, round(36 * Decimal(salary) / 100000) * 100000)
+        self.assertEqual(
+            [customer.approved_limit for customer in self.customers[:3]],
+            [Decimal(400000), Decimal(1400000), Decimal(2200000)]
+        )
+
+    def test_salary_drop_flags_over_limit(self):
+        customer = self.customers[0]
+        # 36 * 1000 rounds to no limit at all, under the 1 lakh loan
+        totals = process_salary_rows([{'customer_id': customer.customer_id, 'monthly_salary': '1000'}])
+        self.assertEqual(totals['over_limit'], 1)
+        customer.refresh_from_db()
+        self.assertTrue(customer.over_limit)
+        self.assertEqual(customer.approved_limit, 0)
+        # 36 * 2500 rounds up to exactly the loan amount, which is within the limit
+        process_salary_rows([{'customer_id': customer.customer_id, 'monthly_salary': '2500'}])
+        customer.refresh_from_db()
+        self.assertFalse(customer.over_limit)
+        self.assertEqual(customer.approved_limit, Decimal(100000))
+
+
+@override_settings(**TEST_SETTINGS)
+class BulkLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = create_customers(4, loans_each=1)
+        cls.loan_ids = [customer.loans.get().loan_id for customer in cls.customers]
+
+    def post(self, name, ids):
+        return self.client.post(reverse(name), {'ids': ids}, content_type='application/json')
+
+    def test_results_in_request_order_with_missing_ids(self):
+        archived = Loan.objects.get(loan_id=self.loan_ids[0])
+        create_archived_copy(archived)
+        archived.delete()
+        ids = [self.loan_ids[2], 999999, self.loan_ids[0], self.loan_ids[1], 999998]
+        response = self.post('bulk_view_loans', ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['loan_id'] for item in response.json()['results']], [ids[0], ids[2], ids[3]])
+        self.assertEqual(response.json()['missing'], [999999, 999998])
+
+    def test_duplicates_answered_once_at_first_position(self):
+        ids = [self.customers[1].pk, self.customers[0].pk, self.customers[1].pk]
+        response = self.client.get(reverse('bulk_view_customers'), {'ids': ','.join(map(str, ids))})
+        self.assertEqual([item['id'] for item in response.json()['results']], ids[:2])
+
+    @override_settings(BULK_LOOKUP_MAX_IDS=3)
+    def test_id_limit(self):
+        self.assertEqual(self.post('bulk_view_loans', self.loan_ids[:3]).status_code, 200)
+        for name in ('bulk_view_loans', 'bulk_view_customers'):
+            with self.subTest(name):
+                response = self.post(name, self.loan_ids)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ids', response.json())
+
+    def test_invalid_ids(self):
+        for ids in ([], [0], ['x']):
+            with self.subTest(ids=ids):
+                self.assertEqual(self.post('bulk_view_customers', ids).status_code, 400)
+
+    def test_customer_shard_groups_merge_in_request_order(self):
+        ids = [customer.pk for customer in self.customers] + [999999]
+        # Two shards, each holding every other ID, asked in the opposite order
+        groups = {'shard_1': ids[1::2], 'shard_0': ids[0::2]}
+        with mock.patch('loans.views.group_by_shard', return_value=groups):
+            response = self.post('bulk_view_customers', ids)
+        self.assertEqual([item['id'] for item in response.json()['results']], ids[:4])
+        self.assertEqual(response.json()['missing'], [999999])
+
+    def test_loan_shards_are_asked_for_what_the_previous_missed(self):
+        ids = list(reversed(self.loan_ids))
+        asked = []
+
+        def first_shard_holds_the_second_half(requested, *querysets):
+            asked.append(list(requested))
+            if len(asked) == 1:
+                held = requested[len(requested) // 2:]
+                return _fetch_in_order(held, *querysets)[0], [pk for pk in requested if pk not in held]
+            return _fetch_in_order(requested, *querysets)
+
+        with mock.patch('loans.views.shard_aliases', return_value=['shard_0', 'shard_1']), \
+                mock.patch('loans.views._fetch_in_order', first_shard_holds_the_second_half):
+            response = self.post('bulk_view_loans', ids)
+        self.assertEqual([item['loan_id'] for item in response.json()['results']], ids)
+        self.assertEqual(response.json()['missing'], [])
+        # The second shard is only asked for the first half
+        self.assertEqual(asked[2], ids[:2])
+
+
+REPLICA = settings.REPLICA_DATABASE_ALIAS
+
+
+@override_settings(**TEST_SETTINGS, REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    """
+    Reads inside read_from_replica() go to a second, empty SQLite database
+    standing in for a replica that has not caught up, so a row read back shows
+    which database served it
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Added after the runner set up its databases, so the replica stays
+        # outside the per-test transaction; nothing here writes to it
+        super().setUpClass()
+        replica = {**connections.settings['default'], 'NAME': 'file:replica?mode=memory&cache=shared'}
+        connections.settings[REPLICA] = replica
+        cls.enterClassContext(override_settings(DATABASES={**settings.DATABASES, REPLICA: replica}))
+        call_command('migrate', 'loans', database=REPLICA, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.customer, = create_customers(1, loans_each=1)
+        self.loan = self.customer.loans.get()
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_in_the_block_go_to_the_replica(self):
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Loan), REPLICA)
+            self.assertFalse(Loan.objects.filter(pk=self.loan.pk).exists())
+        self.assertIsNone(self.router.db_for_read(Loan))
+        self.assertTrue(Loan.objects.filter(pk=self.loan.pk).exists())
+
+    def test_writes_go_to_the_primary(self):
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_write(Loan), 'default')
+            Loan.objects.filter(pk=self.loan.pk).update(emis_paid=1)
+        self.assertEqual(Loan.objects.using('default').get(pk=self.loan.pk).emis_paid, 1)
+        self.assertFalse(Loan.objects.using(REPLICA).exists())
+
+    def test_pinned_customer_reads_from_the_primary(self):
+        pin_customer_to_primary(self.customer.customer_id)
+        with read_from_replica(self.customer.customer_id):
+            self.assertTrue(Loan.objects.filter(pk=self.loan.pk).exists())
+        with read_from_replica(self.customer.customer_id + 1):
+            self.assertFalse(Loan.objects.filter(pk=self.loan.pk).exists())
+
+    def test_views_fall_back_to_the_primary(self):
+        # A pinned customer's list comes from the primary
+        pin_customer_to_primary(self.customer.customer_id)
+        response = self.client.get(reverse('view_customer_loans', args=[self.customer.customer_id]))
+        self.assertEqual([row['loan_id'] for row in response.json()], [self.loan.loan_id])
+        # Loan detail retries a replica miss on the primary
+        response = self.client.get(reverse('view_loan', args=[self.loan.loan_id]))
+        self.assertEqual(response.status_code, 200)
+
+
+class TaskQueueTests(SimpleTestCase):
+    """
+    enqueue() puts every task on its TASK_QUEUES queue, without Redis
+    """
+
+    def task(self, name):
+        for module in (tasks, archive, offers):
+            if hasattr(module, name):
+                return getattr(module, name)
+        self.fail(f'No task function named {name}')
+
+    @mock.patch('loans.queues.django_rq.get_queue')
+    def test_each_task_goes_to_its_queue(self, get_queue):
+        for name, queue in TASK_QUEUES.items():
+            with self.subTest(name):
+                get_queue.reset_mock()
+                func = self.task(name)
+                enqueue(func, 1, job_timeout=60)
+                get_queue.assert_called_once_with(queue)
+                get_queue.return_value.enqueue.assert_called_once_with(func, 1, job_timeout=60)
+
+    @mock.patch('loans.queues.django_rq.get_queue')
+    def test_unlisted_tasks_go_to_default(self, get_queue):
+        enqueue(_records, [])
+        get_queue.assert_called_once_with('default')
+
+    def test_only_some_workers_take_bulk_jobs(self):
+        latency, everything = list(QUEUE_PRIORITY[:2]), list(QUEUE_PRIORITY)
+        self.assertEqual(worker_queues(1), [everything])
+        self.assertEqual(worker_queues(2), [latency, everything])
+        self.assertEqual(worker_queues(8), [latency] * 6 + [everything] * 2)
+        self.assertEqual(worker_queues(4, bulk_workers=4), [latency] + [everything] * 3)
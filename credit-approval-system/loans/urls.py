@@ -8,6 +8,17 @@ urlpatterns = [
     path('register/', views.register_customer, name='register_customer'),
     path('check-eligibility/', views.check_loan_eligibility_view, name='check_eligibility'),
     path('create-loan/', views.create_loan, name='create_loan'),
+    path('applications/<int:application_id>/', views.view_loan_application, name='view_loan_application'),
     path('view-loan/<int:loan_id>/', views.view_loan, name='view_loan'),
+    path('view-loans/bulk/', views.bulk_view_loans, name='bulk_view_loans'),
+    path('customers/bulk/', views.bulk_view_customers, name='bulk_view_customers'),
+    path('customers/salaries/', views.refresh_salaries, name='refresh_salaries'),
     path('view-loans/<int:customer_id>/', views.view_customer_loans, name='view_customer_loans'),
+    path('customers/<int:customer_id>/score-history/', views.view_score_history, name='view_score_history'),
+    path('customers/<int:customer_id>/decisions/', views.view_decision_audit, name='view_decision_audit'),
+    path('offers/<int:customer_id>/', views.view_offers, name='view_offers'),
+    path('portfolio/stats/', views.portfolio_stats_view, name='portfolio_stats'),
+    path('repayments/', views.process_repayments, name='process_repayments'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('export/<str:dataset>/', views.export_snapshot, name='export_snapshot'),
 ]
\ No newline at end of file
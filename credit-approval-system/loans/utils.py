@@ -1,8 +1,64 @@
 import math
 from decimal import Decimal
 from datetime import datetime, date
-from django.db.models import Sum, Count, Q
-from .models import Customer, Loan
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import F, Sum, Count, Q, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Customer, Loan, LoanOffer
+from .score_history import record_credit_score
+from .portfolio import record_opened_loan
+from .sharding import db_alias
+from .money import (
+    to_paise, from_paise, to_basis_points, from_basis_points,
+    emi_paise, corrected_rate_bp, within_emi_cap, MIN_APPROVAL_SCORE
+)
+
+def credit_score_aggregates(prefix='', include_archived=False):
+    """
+    Aggregate expressions feeding the credit score. Use prefix='loans__' to
+    annotate them onto a Customer queryset instead of aggregating a loan set;
+    include_archived (annotations only) adds the customer's archived-loan totals
+    """
+    aggregates = {
+        'current_loans_sum': Sum(f'{prefix}loan_amount', filter=Q(**{f'{prefix}is_active': True})),
+        'total_emis': Sum(f'{prefix}tenure'),
+        'paid_on_time': Sum(f'{prefix}emis_paid_on_time'),
+        'loan_count': Count(f'{prefix}loan_id'),
+        'current_year_loans': Count(
+            f'{prefix}loan_id', filter=Q(**{f'{prefix}start_date__year': datetime.now().year})
+        ),
+        'total_loan_volume': Sum(f'{prefix}loan_amount'),
+        'current_emis': Sum(f'{prefix}monthly_repayment', filter=Q(**{f'{prefix}is_active': True})),
+    }
+    if include_archived:
+        aggregates['total_emis'] = Coalesce(aggregates['total_emis'], 0) + F('archived_tenure_total')
+        aggregates['paid_on_time'] = Coalesce(aggregates['paid_on_time'], 0) + F('archived_emis_paid_on_time')
+        aggregates['loan_count'] = aggregates['loan_count'] + F('archived_loan_count')
+        aggregates['total_loan_volume'] = Coalesce(
+            aggregates['total_loan_volume'], Value(Decimal(0)), output_field=DecimalField()
+        ) + F('archived_loan_volume')
+    return aggregates
+
+def fold_archived_loans(loan_stats, customer):
+    """
+    Add the customer's archived-loan totals to credit_score_aggregates()
+    values computed over the hot loan table. Archived loans are closed and
+    started before the current year, so they only count towards lifetime totals
+    """
+    if customer.archived_loan_count:
+        loan_stats['total_emis'] = (loan_stats['total_emis'] or 0) + customer.archived_tenure_total
+        loan_stats['paid_on_time'] = (loan_stats['paid_on_time'] or 0) + customer.archived_emis_paid_on_time
+        loan_stats['loan_count'] += customer.archived_loan_count
+        loan_stats['total_loan_volume'] = (loan_stats['total_loan_volume'] or 0) + customer.archived_loan_volume
+    return loan_stats
+
+def customer_loan_stats(customer):
+    """
+    Lifetime credit_score_aggregates() values for a customer in a single query
+    """
+    return fold_archived_loans(customer.loans.aggregate(**credit_score_aggregates()), customer)
 
 def calculate_credit_score(customer):
     """
@@ -15,18 +71,17 @@ def calculate_credit_score(customer):
     """
     
     # Get all loan data in a single query to optimize performance
-    loan_stats = customer.loans.aggregate(
-        current_loans_sum=Sum('loan_amount', filter=Q(is_active=True)),
-        total_emis=Sum('tenure'),
-        paid_on_time=Sum('emis_paid_on_time'),
-        loan_count=Count('loan_id'),
-        current_year_loans=Count('loan_id', filter=Q(start_date__year=datetime.now().year)),
-        total_loan_volume=Sum('loan_amount')
-    )
+    loan_stats = customer_loan_stats(customer)
+    return credit_score_from_stats(loan_stats, customer.approved_limit, customer.monthly_salary)
+
+def credit_score_from_stats(loan_stats, approved_limit, monthly_salary):
+    """
+    Score a customer from precomputed credit_score_aggregates() values
+    """
     
     # Check if current loans exceed approved limit
     current_loans_sum = loan_stats['current_loans_sum'] or 0
-    if current_loans_sum > customer.approved_limit:
+    if current_loans_sum > approved_limit:
         return 0
     
     # Initialize score
@@ -58,7 +113,7 @@ def calculate_credit_score(customer):
     
     # 4. Loan approved volume vs income (25 points max)
     total_loan_volume = loan_stats['total_loan_volume'] or 0
-    annual_income = customer.monthly_salary * 12
+    annual_income = monthly_salary * 12
     
     if annual_income > 0:
         volume_ratio = float(total_loan_volume) / float(annual_income)
@@ -89,19 +144,6 @@ def calculate_monthly_installment(loan_amount, interest_rate, tenure_months):
     
     return round(emi, 2)
 
-def get_corrected_interest_rate(credit_score, original_rate):
-    """
-    Get corrected interest rate based on credit score
-    """
-    if credit_score > 50:
-        return float(original_rate)  # No correction needed
-    elif credit_score > 30:
-        return max(12.0, float(original_rate))  # Minimum 12%
-    elif credit_score > 10:
-        return max(16.0, float(original_rate))  # Minimum 16%
-    else:
-        return float(original_rate)  # Will be rejected anyway
-
 def check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure):
     """
     Check if a loan can be approved based on various criteria
@@ -109,43 +151,59 @@ def check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure):
     try:
         customer = Customer.objects.get(customer_id=customer_id)
     except Customer.DoesNotExist:
-        return {
-            'approval': False,
-            'message': 'Customer not found',
-            'corrected_interest_rate': float(interest_rate),
-            'monthly_installment': 0
-        }
+        return customer_not_found_result(interest_rate)
     
+    # Credit score inputs and current EMIs in a single query
+    loan_stats = customer_loan_stats(customer)
+    return decide_loan(customer, loan_stats, loan_amount, interest_rate, tenure)
+
+def customer_not_found_result(interest_rate):
+    """
+    Decision for a customer ID that does not exist
+    """
+    return {
+        'approval': False,
+        'message': 'Customer not found',
+        'corrected_interest_rate': float(interest_rate),
+        'monthly_installment': 0
+    }
+
+def decide_loan(customer, loan_stats, loan_amount, interest_rate, tenure):
+    """
+    Apply the approval rules to precomputed credit_score_aggregates() values.
+    Money is handled in integer paise and rates in basis points, so the
+    quoted EMI is exact and matches what create_approved_loan() stores
+    """
     # Calculate credit score
-    credit_score = calculate_credit_score(customer)
+    credit_score = credit_score_from_stats(loan_stats, customer.approved_limit, customer.monthly_salary)
+    record_credit_score(customer, loan_stats, credit_score)
     
     # Get corrected interest rate
-    corrected_rate = get_corrected_interest_rate(credit_score, interest_rate)
+    rate_bp = corrected_rate_bp(credit_score, to_basis_points(interest_rate))
+    corrected_rate = from_basis_points(rate_bp)
     
     # Calculate monthly installment with corrected rate
-    monthly_installment = calculate_monthly_installment(loan_amount, corrected_rate, tenure)
+    installment_paise = emi_paise(to_paise(loan_amount), rate_bp, tenure)
+    monthly_installment = from_paise(installment_paise)
     
     # Check credit score based approval
-    if credit_score <= 10:
+    if credit_score <= MIN_APPROVAL_SCORE:
         return {
             'approval': False,
             'message': 'Credit score too low',
+            'credit_score': credit_score,
             'corrected_interest_rate': corrected_rate,
             'monthly_installment': monthly_installment
         }
     
     # Check if sum of all current EMIs > 50% of monthly salary
-    current_emis = customer.loans.filter(is_active=True).aggregate(
-        total=Sum('monthly_repayment')
-    )['total'] or 0
+    total_emis_after_loan = to_paise(loan_stats['current_emis'] or 0) + installment_paise
     
-    total_emis_after_loan = float(current_emis) + monthly_installment
-    max_allowed_emi = float(customer.monthly_salary) * 0.5
-    
-    if total_emis_after_loan > max_allowed_emi:
+    if not within_emi_cap(total_emis_after_loan, to_paise(customer.monthly_salary)):
         return {
             'approval': False,
             'message': 'EMI exceeds 50% of monthly salary',
+            'credit_score': credit_score,
             'corrected_interest_rate': corrected_rate,
             'monthly_installment': monthly_installment
         }
@@ -154,6 +212,54 @@ def check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure):
     return {
         'approval': True,
         'message': 'Loan approved',
+        'credit_score': credit_score,
         'corrected_interest_rate': corrected_rate,
         'monthly_installment': monthly_installment
-    }
\ No newline at end of file
+    }
+
+def create_approved_loan(customer, loan_amount, tenure, corrected_rate, monthly_installment, current_emis=None):
+    """
+    Create an approved loan starting today, add it to the customer's debt and
+    to the portfolio counters. Pass the customer's current_emis when already
+    known to save a query
+    """
+    start_date = datetime.now().date()
+    end_date = start_date + relativedelta(months=tenure)
+    
+    with transaction.atomic(using=db_alias()):
+        if current_emis is None:
+            current_emis = customer.loans.filter(is_active=True).aggregate(
+                current_emis=Sum('monthly_repayment')
+            )['current_emis']
+        loan = Loan.objects.create(
+            customer=customer,
+            loan_amount=loan_amount,
+            tenure=tenure,
+            interest_rate=corrected_rate,
+            monthly_repayment=monthly_installment,
+            start_date=start_date,
+            end_date=end_date,
+            is_active=True
+        )
+        Customer.objects.filter(customer_id=customer.customer_id).update(
+            current_debt=F('current_debt') + loan_amount,
+            updated_at=timezone.now()
+        )
+        record_opened_loan(loan, customer.monthly_salary, current_emis)
+        LoanOffer.invalidate([customer.customer_id])
+    return loan
+
+def add_loan_to_stats(loan_stats, loan):
+    """
+    Fold a newly created loan into credit_score_aggregates() values, so
+    further decisions for the same customer can skip re-aggregating
+    """
+    loan_stats['current_loans_sum'] = (loan_stats['current_loans_sum'] or 0) + loan.loan_amount
+    loan_stats['total_emis'] = (loan_stats['total_emis'] or 0) + loan.tenure
+    loan_stats['paid_on_time'] = loan_stats['paid_on_time'] or 0
+    loan_stats['loan_count'] += 1
+    if loan.start_date.year == datetime.now().year:
+        loan_stats['current_year_loans'] += 1
+    loan_stats['total_loan_volume'] = (loan_stats['total_loan_volume'] or 0) + loan.loan_amount
+    loan_stats['current_emis'] = (loan_stats['current_emis'] or 0) + Decimal(loan.monthly_repayment)
+    return loan_stats
@@ -1,7 +1,12 @@
 import re
 from decimal import Decimal
+from urllib.parse import urlparse
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
+# Largest loan the create path accepts (1 crore)
+MAX_LOAN_AMOUNT = Decimal(10000000)
+
 
 def validate_phone_number(phone_number):
     """
@@ -28,7 +33,7 @@ def validate_loan_amount(amount):
     if amount <= 0:
         raise ValidationError('Loan amount must be greater than 0')
     
-    if amount > 10000000:  # 1 crore limit
+    if amount > MAX_LOAN_AMOUNT:
         raise ValidationError('Loan amount cannot exceed 1 crore')
     
     return amount
@@ -104,3 +109,20 @@ def validate_name(name, field_name):
         raise ValidationError(f'{field_name} can only contain letters, spaces, hyphens, and apostrophes')
     
     return name.strip()
+
+
+def validate_callback_url(url):
+    """
+    Validate that a decision callback targets an allowed host
+    """
+    if not url:
+        return url
+    
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https'):
+        raise ValidationError('Callback URL must use http or https')
+    
+    if parsed.hostname not in settings.LOAN_CALLBACK_ALLOWED_HOSTS:
+        raise ValidationError('Callback URL host is not allowed')
+    
+    return url
@@ -1,20 +1,51 @@
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import logging
 
-from .models import Customer, Loan
+from .models import (
+    Customer, Loan, ArchivedLoan, LoanApplication, CreditScoreSnapshot, LoanOffer, DecisionAuditRecord
+)
 from .serializers import (
     CustomerRegistrationSerializer, CustomerResponseSerializer,
     LoanEligibilitySerializer, LoanEligibilityResponseSerializer,
     LoanCreationSerializer, LoanCreationResponseSerializer,
-    LoanDetailSerializer, LoanListSerializer
+    LoanDetailSerializer, LoanListSerializer, CustomerDetailSerializer, BulkLookupSerializer,
+    LoanApplicationSubmissionSerializer, LoanApplicationResultSerializer,
+    CreditScoreSnapshotSerializer, LoanOfferSerializer, DecisionAuditRecordSerializer
+)
+from .utils import (
+    check_loan_eligibility, create_approved_loan, customer_loan_stats, customer_not_found_result, decide_loan
+)
+from .routers import read_from_replica, pin_customer_to_primary, replica_configured
+from .sharding import (
+    db_alias, for_customer, for_new_customer, group_by_shard, on_shard, shard_aliases, shard_for_id
 )
-from .utils import check_loan_eligibility, calculate_monthly_installment
+from .admission import get_admission_controller
+from .tasks import process_loan_applications, application_result, store_customer_offers
+from .queues import enqueue
+from .portfolio import portfolio_stats, record_loan_decision
+from .audit import get_decision_audit_writer, record_decision
+from .repayments import process_repayment_events, read_csv_events
+from .salaries import process_salary_rows, read_csv_salaries
+from .offers import current_offers
+from .caching import conditional_response, loan_version, customer_loans_version, response_cache_stats
+from .exports import (
+    EXPORT_DATASETS, check_export_format, encode_batches, iter_snapshot_batches, parse_watermark
+)
+
+SCORE_HISTORY_DEFAULT_LIMIT = 100
+SCORE_HISTORY_MAX_LIMIT = 1000
+DECISION_AUDIT_DEFAULT_LIMIT = 100
+DECISION_AUDIT_MAX_LIMIT = 1000
 
 def dashboard(request):
     """
@@ -52,18 +83,72 @@ def api_documentation(request):
             "create_loan": {
                 "url": "/create-loan/",
                 "method": "POST",
-                "description": "Create a new loan if eligible",
+                "description": "Create a new loan if eligible (?async=1 queues it and returns 202 with an application_id)",
                 "required_fields": ["customer_id", "loan_amount", "interest_rate", "tenure"]
             },
+            "view_loan_application": {
+                "url": "/applications/{application_id}/",
+                "method": "GET",
+                "description": "View the decision for a loan submitted with /create-loan/?async=1"
+            },
             "view_loan": {
                 "url": "/view-loan/{loan_id}/",
                 "method": "GET",
                 "description": "View details of a specific loan"
             },
+            "bulk_view_loans": {
+                "url": "/view-loans/bulk/",
+                "method": "POST",
+                "description": "View details of up to BULK_LOOKUP_MAX_IDS loans in one request",
+                "required_fields": ["ids"]
+            },
+            "bulk_view_customers": {
+                "url": "/customers/bulk/",
+                "method": "POST",
+                "description": "View up to BULK_LOOKUP_MAX_IDS customers in one request",
+                "required_fields": ["ids"]
+            },
             "view_customer_loans": {
                 "url": "/view-loans/{customer_id}/",
                 "method": "GET",
                 "description": "View all active loans for a customer"
+            },
+            "view_score_history": {
+                "url": "/customers/{customer_id}/score-history/?from=&to=&at=&limit=",
+                "method": "GET",
+                "description": "Credit scores computed for a customer, newest first"
+            },
+            "view_decision_audit": {
+                "url": "/customers/{customer_id}/decisions/?from=&to=&limit=",
+                "method": "GET",
+                "description": "Audit log of a customer's eligibility decisions, newest first (admin users only)"
+            },
+            "view_offers": {
+                "url": "/offers/{customer_id}/",
+                "method": "GET",
+                "description": "Largest pre-approved loan amount per standard tenure"
+            },
+            "portfolio_stats": {
+                "url": "/portfolio/stats/",
+                "method": "GET",
+                "description": "Portfolio exposure, EMI burden and hourly decision counts for the dashboard"
+            },
+            "process_repayments": {
+                "url": "/repayments/",
+                "method": "POST",
+                "description": "Apply EMI repayment events as CSV or JSON (admin users only)",
+                "required_fields": ["event_id", "loan_id", "on_time"]
+            },
+            "refresh_salaries": {
+                "url": "/customers/salaries/",
+                "method": "POST",
+                "description": "Update salaries as CSV or JSON and recompute approved limits (admin users only)",
+                "required_fields": ["customer_id", "monthly_salary"]
+            },
+            "export_snapshot": {
+                "url": "/export/{customers|loans|archived_loans}/?file_format=csv|parquet&since={iso_timestamp}",
+                "method": "GET",
+                "description": "Stream a consistent snapshot export (admin users only)"
             }
         }
     }
@@ -78,7 +163,9 @@ def register_customer(request):
     serializer = CustomerRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         try:
-            customer = serializer.save()
+            with for_new_customer():
+                customer = serializer.save()
+            pin_customer_to_primary(customer.customer_id)
             logging.info(f"Customer created successfully with ID: {customer.customer_id}")
             response_serializer = CustomerResponseSerializer(customer)
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
@@ -105,12 +192,17 @@ def check_loan_eligibility_view(request):
     if serializer.is_valid():
         data = serializer.validated_data
         
-        eligibility_result = check_loan_eligibility(
-            data['customer_id'],
-            data['loan_amount'],
-            data['interest_rate'],
-            data['tenure']
-        )
+        with for_customer(data['customer_id']), read_from_replica(data['customer_id']):
+            eligibility_result = check_loan_eligibility(
+                data['customer_id'],
+                data['loan_amount'],
+                data['interest_rate'],
+                data['tenure']
+            )
+            record_decision(
+                DecisionAuditRecord.CHECK_ELIGIBILITY, data['customer_id'], data['loan_amount'],
+                data['interest_rate'], data['tenure'], eligibility_result
+            )
         logging.info(f"Eligibility result for customer {data['customer_id']}: {eligibility_result['approval']}")
         
         response_data = {
@@ -130,108 +222,245 @@ def check_loan_eligibility_view(request):
 @api_view(['POST'])
 def create_loan(request):
     """
-    Create a new loan if eligible
+    Create a new loan if eligible. With ?async=1 the application is queued
+    and 202 Accepted is returned with its ID
     """
     logging.info(f"Loan creation request received: {request.data}")
+    if request.query_params.get('async') == '1':
+        return submit_loan_application(request)
     serializer = LoanCreationSerializer(data=request.data)
     if serializer.is_valid():
         data = serializer.validated_data
-        
-        # Check eligibility first
-        eligibility_result = check_loan_eligibility(
-            data['customer_id'],
-            data['loan_amount'],
-            data['interest_rate'],
-            data['tenure']
-        )
-        logging.info(f"Eligibility check for loan creation: {eligibility_result['approval']}")
-        
-        if not eligibility_result['approval']:
-            response_data = {
-                'loan_id': None,
-                'customer_id': data['customer_id'],
-                'loan_approved': False,
-                'message': eligibility_result['message'],
-                'monthly_installment': None
-            }
-            response_serializer = LoanCreationResponseSerializer(response_data)
-            return Response(response_serializer.data, status=status.HTTP_200_OK)
-        
-        try:
-            # Get customer
-            customer = get_object_or_404(Customer, customer_id=data['customer_id'])
-            
-            # Use corrected interest rate
-            corrected_rate = eligibility_result['corrected_interest_rate']
-            monthly_installment = eligibility_result['monthly_installment']
-            
-            # Calculate loan dates
-            start_date = datetime.now().date()
-            end_date = start_date + relativedelta(months=data['tenure'])
-            
-            # Use transaction to ensure data consistency
-            with transaction.atomic():
-                # Create loan
-                loan = Loan.objects.create(
-                    customer=customer,
-                    loan_amount=data['loan_amount'],
-                    tenure=data['tenure'],
-                    interest_rate=corrected_rate,
-                    monthly_repayment=monthly_installment,
-                    start_date=start_date,
-                    end_date=end_date,
-                    is_active=True
+        # Every read and write behind the decision goes to the customer's shard
+        with for_customer(data['customer_id']):
+            return _decide_and_create_loan(data)
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+def _decide_and_create_loan(data):
+    """
+    Decide a validated create-loan request and create the loan if approved.
+    The customer row is locked first, so concurrent requests for the same
+    customer are decided one at a time against current aggregates, like the
+    application workers do
+    """
+    try:
+        with transaction.atomic(using=db_alias()):
+            customer = Customer.objects.select_for_update().filter(customer_id=data['customer_id']).first()
+            if customer is None:
+                eligibility_result = customer_not_found_result(data['interest_rate'])
+            else:
+                loan_stats = customer_loan_stats(customer)
+                eligibility_result = decide_loan(
+                    customer, loan_stats, data['loan_amount'], data['interest_rate'], data['tenure']
                 )
-                
-                # Update customer's current debt
-                customer.current_debt += data['loan_amount']
-                customer.save()
-            
-            response_data = {
-                'loan_id': loan.loan_id,
-                'customer_id': data['customer_id'],
-                'loan_approved': True,
-                'message': 'Loan approved successfully',
-                'monthly_installment': monthly_installment
-            }
-            
-            logging.info(f"Loan created successfully with ID: {loan.loan_id} for customer: {data['customer_id']}")
-            response_serializer = LoanCreationResponseSerializer(response_data)
-            return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+            logging.info(f"Eligibility check for loan creation: {eligibility_result['approval']}")
             
-        except Customer.DoesNotExist:
-            return Response(
-                {'error': 'Customer not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        except ValueError as e:
-            return Response(
-                {'error': 'Invalid data provided', 'details': str(e)},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        except Exception as e:
-            logging.error(f"Unexpected error creating loan: {str(e)}")
-            return Response(
-                {'error': 'Failed to create loan', 'details': 'Internal server error'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+            loan = None
+            if eligibility_result['approval']:
+                # Create the loan at the corrected rate and update the customer's current debt
+                loan = create_approved_loan(
+                    customer, data['loan_amount'], data['tenure'],
+                    eligibility_result['corrected_interest_rate'], eligibility_result['monthly_installment'],
+                    current_emis=loan_stats['current_emis']
+                )
+    except ValueError as e:
+        return Response(
+            {'error': 'Invalid data provided', 'details': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        logging.error(f"Unexpected error creating loan: {str(e)}")
+        return Response(
+            {'error': 'Failed to create loan', 'details': 'Internal server error'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
     
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    record_loan_decision(loan is not None, eligibility_result.get('credit_score'))
+    if loan is None:
+        record_decision(
+            DecisionAuditRecord.CREATE_LOAN, data['customer_id'], data['loan_amount'],
+            data['interest_rate'], data['tenure'], eligibility_result
+        )
+        response_data = {
+            'loan_id': None,
+            'customer_id': data['customer_id'],
+            'loan_approved': False,
+            'message': eligibility_result['message'],
+            'monthly_installment': None
+        }
+        response_serializer = LoanCreationResponseSerializer(response_data)
+        return Response(response_serializer.data, status=status.HTTP_200_OK)
+    
+    pin_customer_to_primary(customer.customer_id)
+    record_decision(
+        DecisionAuditRecord.CREATE_LOAN, data['customer_id'], data['loan_amount'],
+        data['interest_rate'], data['tenure'], eligibility_result,
+        message='Loan approved successfully', loan_id=loan.loan_id
+    )
+    
+    response_data = {
+        'loan_id': loan.loan_id,
+        'customer_id': data['customer_id'],
+        'loan_approved': True,
+        'message': 'Loan approved successfully',
+        'monthly_installment': eligibility_result['monthly_installment']
+    }
+    
+    logging.info(f"Loan created successfully with ID: {loan.loan_id} for customer: {data['customer_id']}")
+    response_serializer = LoanCreationResponseSerializer(response_data)
+    return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+def submit_loan_application(request):
+    """
+    Store a loan application for the RQ worker pool to decide
+    """
+    serializer = LoanApplicationSubmissionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    # On the customer's shard, with an ID that routes back to it
+    with for_customer(data['customer_id']):
+        application = LoanApplication.objects.create(
+            customer_id=data['customer_id'],
+            loan_amount=data['loan_amount'],
+            interest_rate=data['interest_rate'],
+            tenure=data['tenure'],
+            callback_url=data.get('callback_url', '')
+        )
+    
+    try:
+        # Any worker's batch picks up every pending application, so a
+        # failed enqueue is recovered by the next submission's job
+        enqueue(process_loan_applications)
+    except Exception as e:
+        logging.error(f"Failed to enqueue loan application {application.application_id}: {str(e)}")
+    
+    logging.info(f"Loan application {application.application_id} queued for customer: {data['customer_id']}")
+    status_url = f"/applications/{application.application_id}/"
+    response = Response({
+        'application_id': application.application_id,
+        'status': application.status,
+        'status_url': status_url
+    }, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = status_url
+    return response
 
+@api_view(['GET'])
+def view_loan_application(request, application_id):
+    """
+    View the status and decision of an asynchronously submitted loan application
+    """
+    with on_shard(shard_for_id(application_id)):
+        application = get_object_or_404(LoanApplication, application_id=application_id)
+    response_serializer = LoanApplicationResultSerializer(application_result(application))
+    return Response(response_serializer.data, status=status.HTTP_200_OK)
+
+def loan_detail_data(loan):
+    """
+    LoanDetailSerializer output adjusted to the required response format
+    """
+    data = LoanDetailSerializer(loan).data
+    data['monthly_installment'] = data.pop('monthly_repayment')
+    return data
+
+def _bulk_ids(request):
+    """
+    Validated IDs from a {"ids": [...]} body or an ?ids=1,2,3 query string
+    """
+    if request.method == 'GET':
+        data = {'ids': [value for value in request.query_params.get('ids', '').split(',') if value]}
+    else:
+        data = request.data
+    serializer = BulkLookupSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['ids']
+
+def _fetch_in_order(ids, *querysets):
+    """
+    Resolve ids with one IN query per queryset, each queryset only asked for
+    the ids the previous ones missed. Returns the objects in input order and
+    the ids that were not found
+    """
+    found = {}
+    for queryset in querysets:
+        remaining = [pk for pk in ids if pk not in found]
+        if not remaining:
+            break
+        found.update(queryset.in_bulk(remaining))
+    return [found[pk] for pk in ids if pk in found], [pk for pk in ids if pk not in found]
+
+@api_view(['GET', 'POST'])
+def bulk_view_loans(request):
+    """
+    View details of many loans at once, in the order requested. With
+    sharding, each shard is asked for the loans the previous ones missed
+    """
+    loan_ids = _bulk_ids(request)
+    loans = Loan.objects.select_related('customer')
+    found_by_id = {}
+    missing = loan_ids
+    for alias in shard_aliases():
+        if not missing:
+            break
+        with on_shard(alias):
+            with read_from_replica():
+                found, missing = _fetch_in_order(missing, loans)
+            # Recently created loans may not have reached the replica yet, and
+            # closed ones may have moved to the archive
+            fallbacks = [loans] if missing and replica_configured() else []
+            fallbacks.append(ArchivedLoan.objects.select_related('customer'))
+            more, missing = _fetch_in_order(missing, *fallbacks)
+        found_by_id.update((loan.loan_id, loan) for loan in found + more)
+    
+    ordered = [found_by_id[loan_id] for loan_id in loan_ids if loan_id in found_by_id]
+    results = LoanDetailSerializer(ordered, many=True).data
+    for data in results:
+        data['monthly_installment'] = data.pop('monthly_repayment')
+    return Response({'results': results, 'missing': missing}, status=status.HTTP_200_OK)
+
+@api_view(['GET', 'POST'])
+def bulk_view_customers(request):
+    """
+    View many customers at once, in the order requested
+    """
+    customer_ids = _bulk_ids(request)
+    found_by_id = {}
+    for alias, shard_ids in group_by_shard(customer_ids).items():
+        with on_shard(alias):
+            with read_from_replica():
+                found, missing = _fetch_in_order(shard_ids, Customer.objects.all())
+            if missing and replica_configured():
+                more, missing = _fetch_in_order(missing, Customer.objects.all())
+                found += more
+        found_by_id.update((customer.customer_id, customer) for customer in found)
+    found = [found_by_id[pk] for pk in customer_ids if pk in found_by_id]
+    missing = [pk for pk in customer_ids if pk not in found_by_id]
+    serializer = CustomerDetailSerializer(found, many=True)
+    return Response({'results': serializer.data, 'missing': missing}, status=status.HTTP_200_OK)
+
+@conditional_response(loan_version, 'view_loan')
 @api_view(['GET'])
 def view_loan(request, loan_id):
     """
     View details of a specific loan
     """
     try:
-        loan = get_object_or_404(Loan, loan_id=loan_id)
-        serializer = LoanDetailSerializer(loan)
-        
-        # Adjust the response to match the required format
-        data = serializer.data
-        data['monthly_installment'] = data.pop('monthly_repayment')
-        
-        return Response(data, status=status.HTTP_200_OK)
+        # Loans loaded with IDs from before sharding may be on another shard
+        for alias in shard_aliases(first=shard_for_id(loan_id)):
+            with on_shard(alias):
+                with read_from_replica():
+                    loan = Loan.objects.select_related('customer').filter(loan_id=loan_id).first()
+                if loan is None:
+                    # A just-created loan may not have reached the replica yet
+                    loan = Loan.objects.select_related('customer').filter(loan_id=loan_id).first()
+                if loan is None:
+                    # Closed loans move to the archive under the same loan_id
+                    loan = ArchivedLoan.objects.select_related('customer').filter(loan_id=loan_id).first()
+            if loan is not None:
+                return Response(loan_detail_data(loan), status=status.HTTP_200_OK)
+        raise Loan.DoesNotExist
     except Loan.DoesNotExist:
         return Response(
             {'error': 'Loan not found'},
@@ -244,16 +473,19 @@ def view_loan(request, loan_id):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@conditional_response(customer_loans_version, 'view_customer_loans')
 @api_view(['GET'])
 def view_customer_loans(request, customer_id):
     """
     View all current loans for a customer
     """
     try:
-        customer = get_object_or_404(Customer, customer_id=customer_id)
-        loans = customer.loans.filter(is_active=True).select_related('customer')
-        serializer = LoanListSerializer(loans, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        with for_customer(customer_id), read_from_replica(customer_id):
+            customer = get_object_or_404(Customer, customer_id=customer_id)
+            loans = customer.loans.filter(is_active=True).select_related('customer')
+            serializer = LoanListSerializer(loans, many=True)
+            data = serializer.data
+        return Response(data, status=status.HTTP_200_OK)
     except Customer.DoesNotExist:
         return Response(
             {'error': 'Customer not found'},
@@ -264,4 +496,225 @@ def view_customer_loans(request, customer_id):
         return Response(
             {'error': 'Internal server error'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+@api_view(['GET'])
+def view_score_history(request, customer_id):
+    """
+    Credit scores computed for a customer, newest first. ?from= (inclusive)
+    and ?to= (exclusive) bound computed_at; page by passing the returned
+    next_to as ?to=. ?at= returns only the score in effect at that time
+    """
+    try:
+        since = parse_watermark(request.query_params.get('from'))
+        until = parse_watermark(request.query_params.get('to'))
+        at = parse_watermark(request.query_params.get('at'))
+        limit = int(request.query_params.get('limit', SCORE_HISTORY_DEFAULT_LIMIT))
+    except ValueError as e:
+        return Response({'error': 'Invalid query parameter', 'details': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, SCORE_HISTORY_MAX_LIMIT))
+    
+    # Every filter is a range on the (customer_id, computed_at) index
+    history = CreditScoreSnapshot.objects.filter(customer_id=customer_id).order_by('-computed_at')
+    if at is not None:
+        history = history.filter(computed_at__lte=at)
+        limit = 1
+    if since is not None:
+        history = history.filter(computed_at__gte=since)
+    if until is not None:
+        history = history.filter(computed_at__lt=until)
+    
+    with for_customer(customer_id), read_from_replica(customer_id):
+        snapshots = list(history[:limit])
+    
+    serializer = CreditScoreSnapshotSerializer(snapshots, many=True)
+    next_to = snapshots[-1].computed_at if len(snapshots) == limit and at is None else None
+    return Response({
+        'customer_id': customer_id,
+        'results': serializer.data,
+        'next_to': next_to
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def view_decision_audit(request, customer_id):
+    """
+    Eligibility decisions recorded for a customer (admin users only), newest
+    first. ?from= (inclusive) and ?to= (exclusive) bound decided_at, which
+    on Postgres also limits the scan to those months' partitions; page by
+    passing the returned next_to as ?to=
+    """
+    try:
+        since = parse_watermark(request.query_params.get('from'))
+        until = parse_watermark(request.query_params.get('to'))
+        limit = int(request.query_params.get('limit', DECISION_AUDIT_DEFAULT_LIMIT))
+    except ValueError as e:
+        return Response({'error': 'Invalid query parameter', 'details': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, DECISION_AUDIT_MAX_LIMIT))
+    
+    records = DecisionAuditRecord.objects.filter(customer_id=customer_id).order_by('-decided_at')
+    if since is not None:
+        records = records.filter(decided_at__gte=since)
+    if until is not None:
+        records = records.filter(decided_at__lt=until)
+    
+    with for_customer(customer_id), read_from_replica(customer_id):
+        records = list(records[:limit])
+    
+    next_to = records[-1].decided_at if len(records) == limit else None
+    return Response({
+        'customer_id': customer_id,
+        'results': DecisionAuditRecordSerializer(records, many=True).data,
+        'next_to': next_to
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+def view_offers(request, customer_id):
+    """
+    Pre-approved offers of a customer: the largest loan approved at each
+    standard tenure, read from the precomputed rows. If the customer's loans
+    changed since, they are computed here and stored by a background job
+    """
+    with for_customer(customer_id), read_from_replica(customer_id):
+        offers = list(LoanOffer.objects.filter(customer_id=customer_id).order_by('tenure'))
+        if not offers:
+            offers = current_offers(customer_id)
+            if offers:
+                _enqueue_offer_refresh(customer_id)
+    if offers is None:
+        return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
+    # No offers at all when OFFER_TENURES is empty
+    return Response({
+        'customer_id': customer_id,
+        'credit_score': offers[0].credit_score if offers else None,
+        'offers': LoanOfferSerializer(offers, many=True).data,
+        'computed_at': offers[0].computed_at if offers else None
+    }, status=status.HTTP_200_OK)
+
+def _enqueue_offer_refresh(customer_id):
+    # At most one job a minute per customer, however often the offers are read
+    if not cache.add(f"loans:offer-refresh:{customer_id}", 1, timeout=60):
+        return
+    try:
+        enqueue(store_customer_offers, customer_id)
+    except Exception as e:
+        # Offers are still computed on every read until the next refresh_offers run
+        logging.error(f"Failed to enqueue offer refresh for customer {customer_id}: {str(e)}")
+
+@api_view(['GET'])
+def portfolio_stats_view(request):
+    """
+    Portfolio totals and decision rates, read from incrementally maintained
+    counters so the dashboard can poll cheaply
+    """
+    return Response(portfolio_stats(), status=status.HTTP_200_OK)
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_snapshot(request, dataset):
+    """
+    Stream a consistent snapshot of customers (with credit scores) or loans
+    as CSV or Parquet (?file_format=), optionally only rows updated after ?since=
+    """
+    if dataset not in EXPORT_DATASETS:
+        return Response({'error': 'Unknown dataset'}, status=status.HTTP_404_NOT_FOUND)
+
+    fmt = request.query_params.get('file_format', 'csv')
+    try:
+        check_export_format(fmt)
+        since = parse_watermark(request.query_params.get('since'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def stream():
+        # Each snapshot transaction lives as long as its part of the response is streaming
+        yield from encode_batches(dataset, iter_snapshot_batches(dataset, since=since), fmt)
+
+    logging.info(f"Streaming {dataset} export as {fmt} (since={since})")
+    response = StreamingHttpResponse(stream(), content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def process_repayments(request):
+    """
+    Apply EMI repayment events (admin users only): a text/csv body with
+    event_id,loan_id,on_time columns, streamed, or JSON {"events": [...]}.
+    Replayed event IDs are skipped
+    """
+    try:
+        if request.content_type.startswith('text/csv'):
+            if request.stream is None:
+                return Response({'error': 'Empty body'}, status=status.HTTP_400_BAD_REQUEST)
+            lines = (line.decode('utf-8') for line in request.stream)
+            totals = process_repayment_events(read_csv_events(lines))
+        else:
+            events = request.data.get('events')
+            if not isinstance(events, list) or not events:
+                return Response({'error': 'events must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(events) > settings.REPAYMENT_MAX_REQUEST_EVENTS:
+                return Response(
+                    {'error': f"At most {settings.REPAYMENT_MAX_REQUEST_EVENTS} events per JSON request; post CSV for more"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            totals = process_repayment_events(events)
+    except (ValueError, UnicodeDecodeError) as e:
+        return Response({'error': 'Invalid repayment feed', 'details': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    logging.info(f"Repayment events processed: {totals}")
+    return Response(totals, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def refresh_salaries(request):
+    """
+    Update monthly salaries (admin users only): a text/csv body with
+    customer_id,monthly_salary columns, streamed, or JSON {"salaries": [...]}.
+    approved_limit is recomputed and customers now over it are flagged
+    """
+    try:
+        if request.content_type.startswith('text/csv'):
+            if request.stream is None:
+                return Response({'error': 'Empty body'}, status=status.HTTP_400_BAD_REQUEST)
+            lines = (line.decode('utf-8') for line in request.stream)
+            totals = process_salary_rows(read_csv_salaries(lines))
+        else:
+            salaries = request.data.get('salaries')
+            if not isinstance(salaries, list) or not salaries:
+                return Response({'error': 'salaries must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(salaries) > settings.SALARY_REFRESH_MAX_REQUEST_ROWS:
+                return Response(
+                    {'error': f"At most {settings.SALARY_REFRESH_MAX_REQUEST_ROWS} salaries per JSON request; post CSV for more"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            totals = process_salary_rows(salaries)
+    except (ValueError, UnicodeDecodeError) as e:
+        return Response({'error': 'Invalid salary refresh', 'details': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    logging.info(f"Salary refresh processed: {totals}")
+    return Response(totals, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """
+    Operational counters (admin users only)
+    """
+    audit_writer = get_decision_audit_writer()
+    data = {
+        'response_cache': response_cache_stats(),
+        # Per worker process, like admission below
+        'decision_audit': {
+            'written': audit_writer.written,
+            'dropped': audit_writer.dropped,
+            'pending': audit_writer.pending(),
+        },
+    }
+    if settings.ADMISSION_CONTROL['ENABLED']:
+        # Per worker process: this is the process that served the request
+        data['admission'] = get_admission_controller().stats()
+    return Response(data, status=status.HTTP_200_OK)